@@ -0,0 +1,324 @@
+# ---------------------------------------------------------------------------
+# Analytics of a rowing session
+# ---------------------------------------------------------------------------
+# The snapshots of a session as numpy arrays, one per rowing value, and what
+# is computed from them with array operations (no loop over the samples):
+#
+#   Splits()            time of every 500 m, interpolated between samples
+#   MinuteAverages()    mean of a value per minute of the session
+#   Intervals()         the pieces rowed between standstills: start, end,
+#                       distance, strokes, mean power, stroke rate and pace
+#   Distribution()      histogram and percentiles of power or pace
+#   StrokeConsistency() stroke rate and stroke time spread, per stroke
+#
+# Standstill is what DataLogger.pulse decides from the S4 pulses: more than
+# 300 ms without a pulse, PaddleTurning is False and the snapshot carries
+# speed, pace, power and stroke rate 0. A rest shorter than MinRest is part
+# of the interval (a catch missed, a sip of water).
+#
+# SessionSeries collects the snapshots while rowing (the arrays grow by
+# doubling, an append is a few stores) or loads a session recorded with
+# --record, see adapters/recorder/sessionrecorder.py. The snapshots carry
+# stroke_rate in half strokes per minute, as the FTMS rower data; the series
+# keeps it in strokes per minute (SCALE), everything below is in spm.
+# ---------------------------------------------------------------------------
+#
+
+import logging
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+SPLIT = 500  # m
+MINUTE = 60.0
+MIN_REST = 10.0  # s
+
+# snapshot value to the unit of the series
+SCALE = {'stroke_rate': 0.5}
+
+COLUMNS = ('stroke_rate', 'total_strokes', 'total_distance_m', 'instantaneous pace', 'speed', 'watts',
+           'total_kcal', 'heart_rate', 'elapsedtime')
+
+
+class SessionSeries(object):
+    # -----------------------------------------------------------------------
+    # input     Columns     names of the snapshot values to keep
+    #           Capacity    samples allocated first
+    # -----------------------------------------------------------------------
+    def __init__(self, Columns=COLUMNS, Capacity=4096):
+        self.Columns = tuple(Columns)
+        self.Rows = 0
+        self._scales = tuple(SCALE.get(name, 1) for name in self.Columns)
+        self._time = numpy.empty(Capacity, dtype=numpy.float64)
+        self._values = numpy.empty((len(self.Columns), Capacity), dtype=numpy.float32)
+
+    @classmethod
+    def FromArrays(cls, Time, Values):
+        # Values    {name: array} in the units of the snapshot, the arrays as long as Time
+        series = cls(Columns=Values.keys(), Capacity=max(len(Time), 1))
+        series.Rows = len(Time)
+        series._time[:series.Rows] = Time
+        for i, name in enumerate(series.Columns):
+            series._values[i, :series.Rows] = Values[name]
+            if series._scales[i] != 1:
+                series._values[i, :series.Rows] *= series._scales[i]
+        return series
+
+    @classmethod
+    def FromRecording(cls, Path):
+        from ..recorder import sessionrecorder
+        reader = sessionrecorder.SessionReader(Path)
+        try:
+            columns = [name for name in COLUMNS if name in reader.Columns]
+            return cls.FromArrays(reader.Column('time'), {name: reader.Column(name) for name in columns})
+        finally:
+            reader.Close()  # FromArrays copied the columns
+
+    def Append(self, values, At):
+        if self.Rows == len(self._time):
+            capacity = 2 * len(self._time)
+            self._time = numpy.resize(self._time, capacity)
+            values_ = numpy.empty((len(self.Columns), capacity), dtype=numpy.float32)
+            values_[:, :self.Rows] = self._values[:, :self.Rows]
+            self._values = values_
+        self._time[self.Rows] = At
+        column = self._values[:, self.Rows]
+        for i, name in enumerate(self.Columns):
+            value = values.get(name)
+            column[i] = numpy.nan if value is None else value * self._scales[i]
+        self.Rows += 1
+
+    @property
+    def Time(self):
+        return self._time[:self.Rows]
+
+    def Column(self, Name):
+        return self._values[self.Columns.index(Name), :self.Rows]
+
+
+# ---------------------------------------------------------------------------
+# S p l i t s
+# ---------------------------------------------------------------------------
+# returns   split times in s, one per complete Split metres; the time the
+#           distance reached a multiple of Split is interpolated between the
+#           samples around it
+# ---------------------------------------------------------------------------
+def Splits(Time, Distance, Split=SPLIT):
+    distance = numpy.maximum.accumulate(numpy.nan_to_num(Distance))  # the monitor never counts back
+    if len(distance) == 0 or distance[-1] < Split:
+        return numpy.empty(0)
+    marks = numpy.arange(Split, distance[-1] + 1, Split, dtype=numpy.float64)
+    after = numpy.searchsorted(distance, marks, side='left')  # first sample at or past the mark
+    before = numpy.maximum(after - 1, 0)
+    d0 = distance[before]
+    d1 = distance[after]
+    span = numpy.where(d1 > d0, d1 - d0, 1)
+    at = Time[before] + (Time[after] - Time[before]) * numpy.clip((marks - d0) / span, 0, 1)
+    return numpy.diff(numpy.concatenate(([Time[0]], at)))
+
+
+# ---------------------------------------------------------------------------
+# M i n u t e A v e r a g e s
+# ---------------------------------------------------------------------------
+# returns   mean of Values per Minute of the session, NaN for a minute
+#           without a valid sample
+# ---------------------------------------------------------------------------
+def MinuteAverages(Time, Values, Minute=MINUTE):
+    if len(Time) == 0:
+        return numpy.empty(0)
+    # the time is sorted: the first sample of every minute by a binary
+    # search, the sums per minute between them by running sums
+    minutes = int((Time[-1] - Time[0]) // Minute) + 1
+    first = numpy.searchsorted(Time, Time[0] + numpy.arange(minutes + 1) * Minute)
+    first[-1] = len(Time)
+    valid = ~numpy.isnan(Values)
+    summed = numpy.concatenate(([0.0], numpy.cumsum(numpy.where(valid, Values, 0), dtype=numpy.float64)))
+    counted = numpy.concatenate(([0], numpy.cumsum(valid)))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return (summed[first[1:]] - summed[first[:-1]]) / (counted[first[1:]] - counted[first[:-1]])
+
+
+# ---------------------------------------------------------------------------
+# R u n s
+# ---------------------------------------------------------------------------
+# returns   start and end index (exclusive) of every run of True in Mask
+# ---------------------------------------------------------------------------
+def Runs(Mask):
+    edges = numpy.diff(numpy.concatenate(([0], Mask.astype(numpy.int8), [0])))
+    return numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)
+
+
+def Moving(Speed):
+    # PaddleTurning of the snapshots, the standstill values carry speed 0
+    return Speed > 0  # False for NaN
+
+
+# ---------------------------------------------------------------------------
+# I n t e r v a l s
+# ---------------------------------------------------------------------------
+# input     series      SessionSeries
+#           MinRest     a standstill at least this long ends an interval
+# returns   {name: array}, one entry per interval: start, end (s since the
+#           session start), duration, distance, strokes, watts, stroke_rate,
+#           pace (s/500 m), rest (the standstill after it)
+# ---------------------------------------------------------------------------
+INTERVAL = ('start', 'end', 'duration', 'distance', 'strokes', 'watts', 'stroke_rate', 'pace', 'rest')
+
+
+def Intervals(series, MinRest=MIN_REST):
+    time = series.Time
+    moving = Moving(series.Column('speed'))
+    # the runs of moving samples, a standstill shorter than MinRest between
+    # two runs joins them
+    start, end = Runs(moving)
+    if len(start) == 0:
+        return {name: numpy.empty(0) for name in INTERVAL}
+    rest = time[start[1:]] - time[end[:-1]]
+    split = rest >= MinRest
+    start = start[numpy.concatenate(([True], split))]
+    end = end[numpy.concatenate((split, [True]))]
+    last = end - 1
+
+    distance = numpy.nan_to_num(series.Column('total_distance_m'))
+    strokes = numpy.nan_to_num(series.Column('total_strokes'))
+    # mean power and stroke rate over the moving samples of each interval,
+    # from running sums
+    counted = numpy.concatenate(([0], numpy.cumsum(moving)))
+    counts = counted[end] - counted[start]
+
+    def mean(name):
+        summed = numpy.concatenate(([0.0], numpy.cumsum(numpy.nan_to_num(numpy.where(moving, series.Column(name), 0)),
+                                                        dtype=numpy.float64)))
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return (summed[end] - summed[start]) / counts
+
+    rows = {
+        'start': time[start] - time[0],
+        'end': time[last] - time[0],
+        'duration': time[last] - time[start],
+        'distance': distance[last] - distance[numpy.maximum(start - 1, 0)],
+        'strokes': strokes[last] - strokes[numpy.maximum(start - 1, 0)],
+        'watts': mean('watts'),
+        'stroke_rate': mean('stroke_rate'),
+        'rest': numpy.append(time[start[1:]] - time[last[:-1]], 0.0),
+    }
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        rows['pace'] = numpy.where(rows['distance'] > 0, rows['duration'] * SPLIT / rows['distance'], numpy.nan)
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# D i s t r i b u t i o n
+# ---------------------------------------------------------------------------
+# input     Values      power or pace samples, the standstill samples (0)
+#                       and the missing ones (NaN) are left out
+#           Bins        histogram bins, a count or the edges
+# returns   {'counts', 'edges', 'percentiles' {p: value}, 'mean', 'std'}
+# ---------------------------------------------------------------------------
+def Distribution(Values, Bins=20, Percentiles=(10, 25, 50, 75, 90)):
+    values = Values[numpy.nan_to_num(Values) > 0]
+    if len(values) == 0:
+        return {'counts': numpy.empty(0), 'edges': numpy.empty(0), 'percentiles': {}, 'mean': numpy.nan,
+                'std': numpy.nan}
+    counts, edges = numpy.histogram(values, bins=Bins)
+    return {
+        'counts': counts,
+        'edges': edges,
+        'percentiles': dict(zip(Percentiles, numpy.percentile(values, Percentiles))),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+    }
+
+
+# ---------------------------------------------------------------------------
+# S t r o k e C o n s i s t e n c y
+# ---------------------------------------------------------------------------
+# A stroke is where total_strokes counts up; the stroke rate is taken at
+# that sample and the stroke time from one count to the next. Strokes
+# across a standstill are left out.
+#
+# The rate changes with the pieces of a workout; how steady it is held is
+# measured against the mean of the minute the stroke is in.
+#
+# returns   {'strokes', 'rate_mean', 'rate_std', 'rate_cv', 'time_mean',
+#           'time_std', 'time_cv', 'rate_spread', 'within_2spm'},
+#           cv = std / mean, rate_spread the std of the rate off the mean
+#           of its minute, within_2spm the share of strokes at most 2 spm
+#           off it
+# ---------------------------------------------------------------------------
+def StrokeConsistency(series):
+    time = series.Time
+    strokes = numpy.nan_to_num(series.Column('total_strokes'))
+    rate = series.Column('stroke_rate')
+    moving = Moving(series.Column('speed'))
+    counted = numpy.flatnonzero(numpy.diff(strokes) > 0) + 1
+    rowing = counted[moving[counted]]
+    rowing = rowing[rate[rowing] > 0]
+    rates = rate[rowing]
+    stroke_time = numpy.diff(time[rowing]) / numpy.diff(strokes[rowing])
+    stroke_time = stroke_time[(stroke_time < MIN_REST)]  # not across a rest
+    result = {'strokes': len(rowing)}
+    for key, values in (('rate', rates), ('time', stroke_time)):
+        mean = float(values.mean()) if len(values) else numpy.nan
+        std = float(values.std()) if len(values) else numpy.nan
+        result[key + '_mean'] = mean
+        result[key + '_std'] = std
+        result[key + '_cv'] = std / mean if mean else numpy.nan
+    if len(rates):
+        minute = ((time[rowing] - time[0]) // MINUTE).astype(numpy.intp)
+        minute_mean = numpy.bincount(minute, weights=rates) / numpy.maximum(numpy.bincount(minute), 1)
+        off = rates - minute_mean[minute]
+        result['rate_spread'] = float(off.std())
+        result['within_2spm'] = float(numpy.mean(numpy.abs(off) <= 2))
+    else:
+        result['rate_spread'] = result['within_2spm'] = numpy.nan
+    return result
+
+
+# ---------------------------------------------------------------------------
+# A n a l y s e
+# ---------------------------------------------------------------------------
+# returns   everything above for one session
+# ---------------------------------------------------------------------------
+def Analyse(series):
+    time = series.Time
+    pace = series.Column('instantaneous pace')
+    distance = series.Column('total_distance_m')
+    return {
+        'duration': float(time[-1] - time[0]) if series.Rows else 0.0,
+        'distance': float(numpy.nanmax(distance)) if not numpy.isnan(distance).all() else 0.0,  # not sent by the interface
+        'splits': Splits(time, distance),
+        'minutes': {name: MinuteAverages(time, series.Column(name)) for name in ('watts', 'stroke_rate', 'speed')},
+        'intervals': Intervals(series),
+        'power': Distribution(series.Column('watts')),
+        'pace': Distribution(pace[Moving(series.Column('speed'))]),
+        'strokes': StrokeConsistency(series),
+    }
+
+
+def Clock(seconds):
+    if numpy.isnan(seconds):
+        return '-'
+    seconds = round(seconds, 1)
+    return '{0}:{1:04.1f}'.format(int(seconds // 60), seconds % 60)
+
+
+def Report(analysis):
+    # the analysis as text for the log
+    lines = ["session {0} m in {1}".format(int(analysis['distance']), Clock(analysis['duration']))]
+    if len(analysis['splits']):
+        lines.append("500 m splits: " + " ".join(Clock(split) for split in analysis['splits']))
+    intervals = analysis['intervals']
+    for i in range(len(intervals['start'])):
+        lines.append("interval {0}: {1} m in {2}, pace {3}/500 m, {4:.0f} W, {5:.1f} spm, rest {6}".format(
+            i + 1, int(intervals['distance'][i]), Clock(intervals['duration'][i]), Clock(intervals['pace'][i]),
+            intervals['watts'][i], intervals['stroke_rate'][i], Clock(intervals['rest'][i])))
+    power = analysis['power']
+    if power['percentiles']:
+        lines.append("power W: " + ", ".join("p{0} {1:.0f}".format(p, v) for p, v in power['percentiles'].items()))
+    strokes = analysis['strokes']
+    if strokes['strokes']:
+        lines.append("{0} strokes, rate {1:.1f} spm, {2:.1f} spm off the minute's mean, {3:.0%} within 2 spm".format(
+            strokes['strokes'], strokes['rate_mean'], strokes['rate_spread'], strokes['within_2spm']))
+    return "\n".join(lines)
@@ -9,13 +9,23 @@ import os
 import logging
 
 import struct
+import threading
 import usb.core
+import usb.util
 import time
 
+from collections import deque
+
 from . import structconstants as sc
+from . import antframe
+from ..metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+FRAMES_SENT = metrics.Counter('pirowflo_ant_frames_sent_total', "Messages written to the ANT dongle")
+READ_TIMEOUTS = metrics.Counter('pirowflo_ant_usb_read_timeouts_total', "USB reads of the ANT dongle that timed out without data")
+RECONNECTS = metrics.Counter('pirowflo_ant_reconnects_total', "Reconnects of the ANT dongle after it was lost")
+
 # ---------------------------------------------------------------------------
 # Our own choice what channels are used
 #
@@ -45,6 +55,8 @@ logger = logging.getLogger(__name__)
 class clsAntDongle():
     channel_FE = 0  # ANT+ channel for Fitness Equipment
     channel_FE_s = channel_FE  # slave=Cycle Training Program
+    channel_HRM_s = 1  # ANT+ channel for Heart Rate Monitor (slave=heart rate strap)
+    MaxChannels = 8  # channels of a node (ANTUSB2, ANTUSB-m), one FE channel per rower in hub mode
 
     DeviceNumber_FE = 57591  # These are the device-numbers FortiusANT uses and
 
@@ -73,6 +85,7 @@ class clsAntDongle():
     msgID_UnassignChannel = 0x41
     msgID_AssignChannel = 0x42
     msgID_ChannelPeriod = 0x43
+    msgID_ChannelSearchTimeout = 0x44
     msgID_ChannelRfFrequency = 0x45
     msgID_SetNetworkKey = 0x46
     msgID_ResetSystem = 0x4a
@@ -81,6 +94,7 @@ class clsAntDongle():
 
     msgID_ChannelID = 0x51  # Set, but also receive master channel - but how/when?
     msgID_ChannelTransmitPower = 0x60
+    msgID_LowPriorityChannelSearchTimeout = 0x63
 
     msgID_StartUp = 0x6f
 
@@ -88,6 +102,7 @@ class clsAntDongle():
 
     # profile.xlsx: antplus_device_type
     DeviceTypeID_fitness_equipment = 17
+    DeviceTypeID_heart_rate = 120
 
     # Manufacturer ID       see FitSDKRelease_21.20.00 profile.xlsx
     Manufacturer_garmin = 1
@@ -96,7 +111,9 @@ class clsAntDongle():
     Manufacturer_waterrower = 118
 
     DeviceTypeID_FE = DeviceTypeID_fitness_equipment
+    DeviceTypeID_HRM = DeviceTypeID_heart_rate
 
+    TransmissionType_Pairing = 0x00  # wildcard, a slave accepts any transmission type
     TransmissionType_IC = 0x01  # 5.2.3.1   Transmission Type
     TransmissionType_IC_GDP = 0x05  # 0x01 = Independant Channel
     #           0x04 = Global datapages used
@@ -108,14 +125,33 @@ class clsAntDongle():
     Message = ''
     Cycplus = False
     DongleReconnected = True
+    Outages = 0  # Number of times the dongle was lost and reconnected
+    OutageStart = None  # time.time() the current outage started, None when connected
+    LastOutage = 0  # Seconds the last outage lasted, until the dongle was back
+
+    ReadBufferSize = 64  # Frames kept by the reader thread for Read()
+    AckTimeout = 0.5  # Seconds Write() waits for a response when the reader runs
 
     # -----------------------------------------------------------------------
     # _ _ i n i t _ _
     # -----------------------------------------------------------------------
     # Function  Create the class and try to find a dongle
+    #
+    # input     DeviceID    usb idProduct of the dongle to use
+    #           Device      use this pyusb compatible device instead of
+    #                       searching the usb bus, e.g. FakeAntDongle
     # -----------------------------------------------------------------------
-    def __init__(self, DeviceID=None):
+    def __init__(self, DeviceID=None, Device=None):
         self.DeviceID = DeviceID
+        self.Device = Device
+        self.ReadBuffer = deque(maxlen=self.ReadBufferSize)
+        self.Parser = antframe.FrameParser()  # counts the malformed frames as well
+        self.__Handlers = {}
+        self.__ChannelHandlers = {}
+        self.__Waiters = {}
+        self.__WaitersLock = threading.Lock()
+        self.__ReaderThread = None
+        self.__ReaderStop = threading.Event()
         self.OK = True  # Otherwise we're disabled!!
         self.OK = self.__GetDongle()
 
@@ -132,7 +168,7 @@ class clsAntDongle():
     # returns   True/False
     # -----------------------------------------------------------------------
     def __GetDongle(self):
-        print("start search for dongle")
+        logger.info("start search for dongle")
         self.Message = ''
         self.Cycplus = False
         self.DongleReconnected = False
@@ -159,7 +195,10 @@ class clsAntDongle():
                 # Note: filter on idVendor=0x0fcf is removed
                 # -----------------------------------------------------------
                 self.Message = "No (free) ANT-dongle found"
-                devAntDongles = usb.core.find(find_all=True, idProduct=ant_pid)
+                if self.Device is not None:
+                    devAntDongles = [self.Device]
+                else:
+                    devAntDongles = usb.core.find(find_all=True, idProduct=ant_pid)
             except Exception as e:
                 if "AttributeError" in str(e):
                     self.Message = "GetDongle - Could not find dongle: " + str(e)
@@ -201,14 +240,14 @@ class clsAntDongle():
                             self.devAntDongle.write(0x01, reset_string)
                             time.sleep(0.500)  # after reset, 500ms before next action
 
-                            reply = self.Read(False)
+                            reply = self.__ReadDongle()
 
                             self.Message = "No expected reply from dongle"
                             for s in reply:
                                 synch, length, id, _info, _checksum, _rest, _c, _d = self.DecomposeMessage(s)
                                 if synch == 0xa4 and length == 0x01 and id == 0x6f:
                                     found_available_ant_stick = True
-                                    print("Using %s dongle" % self.devAntDongle.manufacturer)  # dongle[1]
+                                    logger.info("Using %s dongle", self.devAntDongle.manufacturer)  # dongle[1]
                                     self.Message = self.Message.replace('\0', '')  # .manufacturer is NULL-terminated
                                     if 'CYCPLUS' in self.Message:
                                         self.Cycplus = True
@@ -252,6 +291,11 @@ class clsAntDongle():
     # function  write all strings to antDongle
     #           read responses from antDongle
     #
+    #           When the reader thread runs, the responses are not read here;
+    #           receive=True then waits (AckTimeout) for the response that
+    #           belongs to each message and receive=False returns immediately
+    #           (fire-and-forget).
+    #
     # returns   rtn         the string-array as received from antDongle
     # -----------------------------------------------------------------------
     def Write(self, messages, receive=True, drop=True):
@@ -262,8 +306,12 @@ class clsAntDongle():
             for message in messages:
                 #print("this is the message: {0}".format(message))
                 # -----------------------------------------------------------
-                # Logging
+                # Register for the response before sending, the reader
+                # thread may receive it before write() returns
                 # -----------------------------------------------------------
+                waiter = None
+                if receive and self.ReaderRunning():
+                    waiter = self.__ExpectResponse(message)
                 # -----------------------------------------------------------
                 # Send the message
                 # No error recovery here, will be done on the subsequent Read()
@@ -272,16 +320,22 @@ class clsAntDongle():
                 try:
                     self.devAntDongle.write(0x01, message)  # input:   endpoint address, buffer, timeout
                     # returns:
+                    FRAMES_SENT.Inc()
                 except Exception as e:
-                    print("error {0}".format(e))
+                    logger.error("ANT write error %s", e)
 
                 # -----------------------------------------------------------
                 # Read all responses
                 # -----------------------------------------------------------
                 if receive:
-                    data = self.Read(drop)
-                    #print("response: {0}".format(data))
-                    for d in data: rtn.append(d)
+                    if self.ReaderRunning():
+                        if waiter is not None:
+                            d = self.__AwaitResponse(waiter)
+                            if d is not None: rtn.append(d)
+                    else:
+                        data = self.Read(drop)
+                        #print("response: {0}".format(data))
+                        for d in data: rtn.append(d)
 
         return rtn
 
@@ -329,10 +383,10 @@ class clsAntDongle():
         # "timeout error" on most systems, "timed out" on Macintosh.
         # ----------------------------------------------------------------------
         except TimeoutError:
-            pass
+            READ_TIMEOUTS.Inc()
         except Exception as e:
             if "timeout error" in str(e) or "timed out" in str(e):
-                pass
+                READ_TIMEOUTS.Inc()
             else:
                 failed = True
         # ----------------------------------------------------------------------
@@ -346,14 +400,34 @@ class clsAntDongle():
         # Still, this recovery is not useless. The dongle is connected again.
         # the caller must redo the channels.
         # ----------------------------------------------------------------------
+        if failed and self.OutageStart is None:
+            self.OutageStart = time.time()
+            logger.warning("ANT dongle lost, reconnecting")
         while failed:
             time.sleep(1)
             if self.__GetDongle():
                 failed = False  # Exception resolved
                 self.DongleReconnected = True
+                self.LastOutage = time.time() - self.OutageStart
+                self.OutageStart = None
+                self.Outages += 1
+                RECONNECTS.Inc()
+                logger.warning("ANT dongle reconnected after %.1f s", self.LastOutage)
         return trv
 
     def Read(self, drop):
+        # -------------------------------------------------------------------
+        # When the reader thread runs, it owns the USB endpoint; return the
+        # frames it received that were not claimed by a handler or a Write()
+        # -------------------------------------------------------------------
+        if self.ReaderRunning():
+            data = []
+            while self.ReadBuffer:
+                data.append(self.ReadBuffer.popleft())
+            return data
+        return self.__ReadDongle()
+
+    def __ReadDongle(self):
         # -------------------------------------------------------------------
         # Read from antDongle untill no more data (timeout), or error
         # Usually, dongle gives one buffer at the time, starting with 0xa4
@@ -366,53 +440,170 @@ class clsAntDongle():
             trv = self.__ReadAndRetry()
             if len(trv) == 0:
                 break
-            # --------------------------------------------------------------------------
-            # Handle content returned by .read()
-            # --------------------------------------------------------------------------
-
-
-            start = 0
-            while start < len(trv):
-                error = False
-                # -------------------------------------------------------
-                # Each message starts with a4; skip characters if not
-                # -------------------------------------------------------
-                skip = start
-                while skip < len(trv) and trv[skip] != 0xa4:
-                    skip += 1
-                if skip != start:
-                    start = skip
-                # -------------------------------------------------------
-                # Second character in the buffer (element in trv) is length of
-                # the info; add four for synch, len, id and checksum
-                # -------------------------------------------------------
-                if start + 1 < len(trv):
-                    length = trv[start + 1] + 4
-                    if start + length <= len(trv):
-                        # -------------------------------------------------------
-                        # Check length and checksum
-                        # Append to return array when correct
-                        # -------------------------------------------------------
-                        d = bytes(trv[start: start + length])
-                        checksum = d[-1:]
-                        expected = self.CalcChecksum(d)
-
-                        if expected != checksum:
-                            error = "error: checksum incorrect"
-                        else:
-                            data.append(d)  # add data to array
-                    else:
-                        error = "error: message exceeds buffer length"
-                        break
-                else:
-                    break
-
-                # -------------------------------------------------------
-                # Next buffer in trv
-                # -------------------------------------------------------
-                start += length
+            data.extend(self.__SplitFrames(trv))
         return data
 
+    def __SplitFrames(self, trv):
+        # --------------------------------------------------------------------------
+        # Handle content returned by .read(), see antframe.FrameParser
+        # --------------------------------------------------------------------------
+        return self.Parser.Parse(trv)
+
+    # ---------------------------------------------------------------------------
+    # R e a d e r   t h r e a d
+    # ---------------------------------------------------------------------------
+    # StartReader       start a daemon thread that continuously reads the
+    #                   dongle and parses the frames. Each frame is routed by
+    #                   message ID:
+    #                   - to a Write() that waits for this response
+    #                   - to the handlers registered with RegisterHandler();
+    #                     channel events (channel response on msgID_RF_EVENT)
+    #                     are routed as msgID_RF_EVENT
+    #                   - otherwise kept in the ring buffer ReadBuffer, the
+    #                     oldest frames are dropped when it is full
+    #
+    # StopReader        stop the thread; Read() reads the dongle itself again
+    #
+    # Release           stop the thread and free the USB device, so another
+    #                   clsAntDongle (a restarted adapter) can claim it
+    #
+    # RegisterHandler   callback(frame) is called in the reader thread, so it
+    #                   must return quickly
+    # ---------------------------------------------------------------------------
+    def StartReader(self):
+        if self.ReaderRunning() or not self.OK:
+            return
+        self.__ReaderStop.clear()
+        self.__ReaderThread = threading.Thread(target=self.__ReaderLoop, name='antreader')
+        self.__ReaderThread.daemon = True
+        self.__ReaderThread.start()
+        logger.info("ANT reader thread started")
+
+    def StopReader(self):
+        if self.__ReaderThread is None:
+            return
+        self.__ReaderStop.set()
+        if self.__ReaderThread is not threading.current_thread():
+            self.__ReaderThread.join(timeout=1)
+        self.__ReaderThread = None
+
+    def Release(self):
+        self.StopReader()
+        if self.devAntDongle is not None and self.Device is None:  # a FakeAntDongle has nothing to free
+            usb.util.dispose_resources(self.devAntDongle)
+        self.devAntDongle = None
+        self.OK = False
+        logger.info("ANT dongle released")
+
+    def ReaderRunning(self):
+        return self.__ReaderThread is not None and self.__ReaderThread.is_alive()
+
+    def RegisterHandler(self, msgID, callback):
+        self.__Handlers.setdefault(msgID, []).append(callback)
+
+    def RemoveHandler(self, msgID, callback):
+        handlers = self.__Handlers.get(msgID, [])
+        if callback in handlers:
+            handlers.remove(callback)
+
+    # ---------------------------------------------------------------------------
+    # RegisterChannelHandler
+    #                   callback(frame) receives the broadcast, acknowledged
+    #                   and burst data of one channel, so every channel of the
+    #                   node (max 8) can have its own consumer. Channel events
+    #                   are not demultiplexed, see RegisterHandler
+    # ---------------------------------------------------------------------------
+    def RegisterChannelHandler(self, Channel, callback):
+        self.__ChannelHandlers.setdefault(Channel, []).append(callback)
+
+    def RemoveChannelHandler(self, Channel, callback):
+        handlers = self.__ChannelHandlers.get(Channel, [])
+        if callback in handlers:
+            handlers.remove(callback)
+
+    def __ReaderLoop(self):
+        while self.OK and not self.__ReaderStop.is_set():
+            trv = self.__ReadAndRetry()  # blocks at most 20ms when the dongle is silent
+            if len(trv) == 0:
+                continue
+            for d in self.__SplitFrames(trv):
+                try:
+                    self.__Dispatch(d)
+                except Exception as e:
+                    logger.error("ANT frame handler failed: %s", e)
+        logger.info("ANT reader thread stopped")
+
+    def __Dispatch(self, d):
+        key = self.__FrameKey(d)
+        with self.__WaitersLock:
+            waiter = self.__Waiters.pop(key, None)
+        if waiter is not None:
+            waiter[1] = d
+            waiter[0].set()
+            return
+
+        id = d[2]
+        if id == self.msgID_ChannelResponse and len(d) > 4 and d[4] == self.msgID_RF_EVENT:
+            id = self.msgID_RF_EVENT
+        elif id in (self.msgID_BroadcastData, self.msgID_AcknowledgedData, self.msgID_BurstData) and len(d) > 3:
+            Channel = d[3]
+            if id == self.msgID_BurstData:
+                Channel = Channel & 0b00011111  # Lower 5 bits, upper 3 are the sequence number
+            handlers = self.__ChannelHandlers.get(Channel)
+            if handlers:
+                for handler in handlers:
+                    handler(d)
+                return
+        handlers = self.__Handlers.get(id)
+        if handlers:
+            for handler in handlers:
+                handler(d)
+        else:
+            self.ReadBuffer.append(d)
+
+    # ---------------------------------------------------------------------------
+    # Match a response to the message that caused it
+    #   ResetSystem      is answered by StartUp
+    #   RequestMessage   is answered by the requested message
+    #   config messages  are answered by a ChannelResponse carrying the
+    #                    initiating message ID and the channel number
+    #   data messages    are not answered (None)
+    # ---------------------------------------------------------------------------
+    def __ResponseKey(self, message):
+        id = message[2]
+        if id == self.msgID_ResetSystem:
+            return (self.msgID_StartUp,)
+        if id == self.msgID_RequestMessage:
+            return (message[4],)
+        if id in (self.msgID_BroadcastData, self.msgID_AcknowledgedData, self.msgID_BurstData):
+            return None
+        return (self.msgID_ChannelResponse, id, message[3])
+
+    def __FrameKey(self, d):
+        id = d[2]
+        if id == self.msgID_ChannelResponse and len(d) > 5:
+            return (id, d[4], d[3])
+        return (id,)
+
+    def __ExpectResponse(self, message):
+        key = self.__ResponseKey(message)
+        if key is None:
+            return None
+        waiter = [threading.Event(), None]
+        with self.__WaitersLock:
+            self.__Waiters[key] = waiter
+        return key, waiter
+
+    def __AwaitResponse(self, expected):
+        key, waiter = expected
+        waiter[0].wait(self.AckTimeout)
+        with self.__WaitersLock:
+            if self.__Waiters.get(key) is waiter:
+                del self.__Waiters[key]
+        if waiter[1] is None:
+            logger.debug("no response from dongle for %s", key)
+        return waiter[1]
+
     # -----------------------------------------------------------------------
     # Standard dongle commands
     # Observation: all commands have two bytes 00 00 for which purpose is unclear
@@ -425,7 +616,7 @@ class clsAntDongle():
     def Calibrate(self):
 
         self.ResetDongle()
-        print("calibration")
+        logger.info("calibration")
 
         messages = [
             self.msg4D_RequestMessage(0, self.msgID_Capabilities),  # request max channels
@@ -450,16 +641,54 @@ class clsAntDongle():
         time.sleep(0.500)  # After Reset, 500ms before next action
 
 
-    def Trainer_ChannelConfig(self):
+    # ---------------------------------------------------------------------------
+    # T r a i n e r _ C h a n n e l C o n f i g
+    # ---------------------------------------------------------------------------
+    # input     Channel         the FE master channel, None = channel_FE
+    #           DeviceNumber    the device number it broadcasts with, None =
+    #                           DeviceNumber_FE; every rower of a hub has its
+    #                           own, so a watch pairs with one machine
+    # ---------------------------------------------------------------------------
+    def Trainer_ChannelConfig(self, Channel=None, DeviceNumber=None):
+        if Channel is None:
+            Channel = self.channel_FE
+        if DeviceNumber is None:
+            DeviceNumber = self.DeviceNumber_FE
         messages = [
-            self.msg42_AssignChannel(self.channel_FE, self.ChannelType_BidirectionalTransmit, NetworkNumber=0x00),
-            self.msg51_ChannelID(self.channel_FE, self.DeviceNumber_FE, self.DeviceTypeID_FE, self.TransmissionType_IC_GDP),
-            self.msg45_ChannelRfFrequency(self.channel_FE, self.RfFrequency_2457Mhz),
-            self.msg43_ChannelPeriod(self.channel_FE, ChannelPeriod=8192),  # 4 Hz
-            self.msg60_ChannelTransmitPower(self.channel_FE, self.TransmitPower_0dBm),
-            self.msg4B_OpenChannel(self.channel_FE)
+            self.msg42_AssignChannel(Channel, self.ChannelType_BidirectionalTransmit, NetworkNumber=0x00),
+            self.msg51_ChannelID(Channel, DeviceNumber, self.DeviceTypeID_FE, self.TransmissionType_IC_GDP),
+            self.msg45_ChannelRfFrequency(Channel, self.RfFrequency_2457Mhz),
+            self.msg43_ChannelPeriod(Channel, ChannelPeriod=8192),  # 4 Hz
+            self.msg60_ChannelTransmitPower(Channel, self.TransmitPower_0dBm),
+            self.msg4B_OpenChannel(Channel)
         ]
-        print("create Channel")
+        logger.info("create Channel %d, device number %d", Channel, DeviceNumber)
+        self.Write(messages)
+
+    # ---------------------------------------------------------------------------
+    # H R M _ C h a n n e l C o n f i g
+    # ---------------------------------------------------------------------------
+    # input     DeviceNumber    0 = pair with any heart rate strap
+    #
+    # function  open a slave channel for an ANT+ heart rate strap next to the
+    #           FE master channel. High priority search is switched off and
+    #           the low priority search never times out, so searching for a
+    #           strap does not disturb the 4 Hz broadcast of the FE channel
+    #
+    # Refer     D00000693_-_ANT+_Device_Profile_-_Heart_Rate_Rev_2.1.pdf
+    #           channel period 8070 (4.06 Hz), RF frequency 57
+    # ---------------------------------------------------------------------------
+    def HRM_ChannelConfig(self, DeviceNumber=0):
+        messages = [
+            self.msg42_AssignChannel(self.channel_HRM_s, self.ChannelType_BidirectionalReceive, NetworkNumber=0x00),
+            self.msg51_ChannelID(self.channel_HRM_s, DeviceNumber, self.DeviceTypeID_HRM, self.TransmissionType_Pairing),
+            self.msg45_ChannelRfFrequency(self.channel_HRM_s, self.RfFrequency_2457Mhz),
+            self.msg43_ChannelPeriod(self.channel_HRM_s, ChannelPeriod=8070),  # 4.06 Hz
+            self.msg44_ChannelSearchTimeout(self.channel_HRM_s, 0),  # no high priority search
+            self.msg63_LowPriorityChannelSearchTimeout(self.channel_HRM_s, 0xff),  # search forever
+            self.msg4B_OpenChannel(self.channel_HRM_s)
+        ]
+        logger.info("create HRM Channel")
         self.Write(messages)
 
     # -------------------------------------------------------------------------------
@@ -505,11 +734,9 @@ class clsAntDongle():
 
 
     def CalcChecksum(self,message):
-        xor_value = 0
         length = message[1]  # byte 1; length of info
         length += 3  # Add synch, len, id
-        for i in range(0, length):  # Process bytes as defined in length
-            xor_value = xor_value ^ message[i]
+        xor_value = antframe.XorChecksum(message[:length])  # Process bytes as defined in length
 
         #   print('checksum', logfile.HexSpace(message), xor_value, bytes([xor_value]))
 
@@ -520,13 +747,7 @@ class clsAntDongle():
     # C o m p o s e   A N T   M e s s a g e
     # -------------------------------------------------------------------------------
     def ComposeMessage(self,id, info):
-        fSynch = sc.unsigned_char
-        fLength = sc.unsigned_char
-        fId = sc.unsigned_char
-        fInfo = str(len(info)) + sc.char_array  # 9 character string
-
-        format = sc.no_alignment + fSynch + fLength + fId + fInfo
-        data = struct.pack(format, 0xa4, len(info), id, info)
+        data = antframe.Header.pack(0xa4, len(info), id) + info
         # -----------------------------------------------------------------------
         # Add the checksum
         # (antifier added \00\00 after each message for unknown reason)
@@ -602,6 +823,18 @@ class clsAntDongle():
         return msg
 
 
+    # ------------------------------------------------------------------------------
+    # A N T   M e s s a g e   44   C h a n n e l S e a r c h T i m e o u t
+    # ------------------------------------------------------------------------------
+    # SearchTimeout in 2.5 seconds, 0 = no high priority search, 255 = infinite
+    # ------------------------------------------------------------------------------
+    def msg44_ChannelSearchTimeout(self, ChannelNumber, SearchTimeout):
+        format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char
+        info = struct.pack(format, ChannelNumber, SearchTimeout)
+        msg = self.ComposeMessage(0x44, info)
+        return msg
+
+
     # ------------------------------------------------------------------------------
     # A N T   M e s s a g e   45   C h a n n e l R f F r e q u e n c y
     # ------------------------------------------------------------------------------
@@ -618,7 +851,7 @@ class clsAntDongle():
     def msg46_SetNetworkKey(self, NetworkNumber=0x00, NetworkKey=0x45c372bdfb21a5b9):
         format = sc.no_alignment + sc.unsigned_char + sc.unsigned_long_long
         info = struct.pack(format, NetworkNumber, NetworkKey)
-        print("set Networkkey:{0}".format(info))
+        logger.debug("set Networkkey:%s", info)
         msg = self.ComposeMessage(0x46, info)
         return msg
 
@@ -686,6 +919,18 @@ class clsAntDongle():
         return msg
 
 
+    # ------------------------------------------------------------------------------
+    # A N T   M e s s a g e   63   L o w P r i o r i t y C h a n n e l S e a r c h T i m e o u t
+    # ------------------------------------------------------------------------------
+    # SearchTimeout in 2.5 seconds, 0 = no low priority search, 255 = infinite
+    # ------------------------------------------------------------------------------
+    def msg63_LowPriorityChannelSearchTimeout(self, ChannelNumber, SearchTimeout):
+        format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char
+        info = struct.pack(format, ChannelNumber, SearchTimeout)
+        msg = self.ComposeMessage(0x63, info)
+        return msg
+
+
     # ------------------------------------------------------------------------------
     # U n m s g 6 4   C h a n n e l R e s p o n s e
     # ------------------------------------------------------------------------------
@@ -719,50 +964,21 @@ class clsAntDongle():
     #           Trainer Road.
     # ------------------------------------------------------------------------------
     def msgPage16_GeneralFEdata(self, Channel, ElapsedTime, DistanceTravelled, Speed, HeartRate):
-        DataPageNumber = 16
-        EquipmentType = 0x16  # Rower
-        ElapsedTime = int(min(0xff, ElapsedTime))
-        DistanceTravelled = int(min(0xff, DistanceTravelled))
-        Speed = int(min(0xffff, Speed))
-        HeartRate = int(min(0xff, HeartRate))
-        #Capabilities = 0x30 | 0x03 | 0x00 | 0x00  # IN_USE | HRM | Distance | Speed
-        Capabilities = 0x34   # IN_USE | HRM | Distance | Speed
-
         # #               bit 7.... ...0
         # HRM =               0b00000011  # 0b____ __xx bits 0-1 0 = hand contact sensor    (2020-12-28 Unclear why option chosen)
         # Distance =          0b00000000  # 0b____ _x__ bit 2    1 = No distance in byte 3  (2020-12-28 Unclear why option chosen)
         # VirtualSpeedFlag =  0b00000000  # 0b____ x___ bit 3    0 = Real speed in byte 4/5 (2020-12-28 Could be virtual speed)
         # FEstate =           0b00110000  # 0b_xxx ____ bits 4-6 3 = IN USE
         # LapToggleBit =      0b00000000  # 0bx___ ____ bit 7    0 = No lap toggle
-
-        fChannel = sc.unsigned_char  # First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # First byte of the ANT+ datapage (payload)
-        fEquipmentType = sc.unsigned_char
-        fElapsedTime = sc.unsigned_char
-        fDistanceTravelled = sc.unsigned_char
-        fSpeed = sc.unsigned_short
-        fHeartRate = sc.unsigned_char
-        fCapabilities = sc.unsigned_char
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fEquipmentType + fElapsedTime + fDistanceTravelled + fSpeed + fHeartRate + fCapabilities
-        info = struct.pack(format, Channel, DataPageNumber, EquipmentType, ElapsedTime, DistanceTravelled, Speed, HeartRate,
-                           Capabilities)
+        #
+        # Layout and field values: antframe.Page16, antframe.Page16Fields
+        info = antframe.Page16.pack(*antframe.Page16Fields(Channel, ElapsedTime, DistanceTravelled, Speed, HeartRate))
 
         return info
 
 
     def msgUnpage16_GeneralFEdata(self,info):
-        fChannel = sc.unsigned_char  # 0 First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # 1 First byte of the ANT+ datapage (payload)
-        fEquipmentType = sc.unsigned_char  # 2
-        fElapsedTime = sc.unsigned_char  # 3
-        fDistanceTravelled = sc.unsigned_char  # 4
-        fSpeed = sc.unsigned_short  # 5
-        fHeartRate = sc.unsigned_char  # 6
-        fCapabilities = sc.unsigned_char  # 7
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fEquipmentType + fElapsedTime + fDistanceTravelled + fSpeed + fHeartRate + fCapabilities
-        tuple = struct.unpack(format, info)
+        tuple = antframe.Page16.unpack(info)
 
         return tuple[0], tuple[1], tuple[2], tuple[3], tuple[4], tuple[5], tuple[6], tuple[7]
 
@@ -791,31 +1007,13 @@ class clsAntDongle():
         # LapToggleBit =      0b00000000  # 0bx___ ____ bit 7    0 = No lap toggle
 
 
-        fChannel = sc.unsigned_char  # First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # First byte of the ANT+ datapage (payload)
-        fEvent = sc.unsigned_char
-        fCadence = sc.unsigned_char
-        fAccPower = sc.unsigned_short
-        fInstPower = sc.unsigned_short  # The first four bits have another meaning!!
-        fFlags = sc.unsigned_char
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fEvent + fCadence + fAccPower + fInstPower + fFlags
-        info = struct.pack(format, Channel, DataPageNumber, EventCounter, Cadence, AccumulatedPower, CurrentPower, Flags)
+        info = antframe.Page25.pack(Channel, DataPageNumber, EventCounter, Cadence, AccumulatedPower, CurrentPower, Flags)
 
         return info
 
 
     def msgUnpage25_TrainerData(self,info):
-        fChannel = sc.unsigned_char  # 0 First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # 1 First byte of the ANT+ datapage (payload)
-        fEvent = sc.unsigned_char  # 2
-        fCadence = sc.unsigned_char  # 3
-        fAccPower = sc.unsigned_short  # 4
-        fInstPower = sc.unsigned_short  # 5 The first four bits have another meaning!!
-        fFlags = sc.unsigned_char  # 6
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fEvent + fCadence + fAccPower + fInstPower + fFlags
-        tuple = struct.unpack(format, info)
+        tuple = antframe.Page25.unpack(info)
 
         return tuple[0], tuple[1], tuple[2], tuple[3], tuple[4], tuple[5], tuple[6]
 
@@ -828,40 +1026,17 @@ class clsAntDongle():
     #           Data page 22 (0x16) Specific Rower Data
     # ------------------------------------------------------------------------------
     def msgPage22_RowingData(self,Channel, StrokeCount, Cadence, InstPower):
-        DataPageNumber = 22
-        Reserved = 0xff
-        Reserved = 0xff
-        StrokeCount = int(min(0xff, StrokeCount))
-        Cadence = int(min(0xfe, Cadence))
-        InstPower = int(min(0xfffe, InstPower))
-        Flags = 0x31  # 00110000 Hmmm.... leave as is but do not understand the value
+        # Flags = 0x31  # 00110000 Hmmm.... leave as is but do not understand the value
         #todo: thin about the lap flag for 500m splits
-
-        fChannel = sc.unsigned_char  # First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # First byte of the ANT+ datapage (payload)
-        fReserved = sc.unsigned_char
-        fStrokeCount = sc.unsigned_char
-        fCadence = sc.unsigned_char
-        fInstPower = sc.unsigned_short  # The first four bits have another meaning!!
-        fFlags = sc.unsigned_char
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fReserved + fReserved + fStrokeCount + fCadence + fInstPower + fFlags
-        info = struct.pack(format, Channel, DataPageNumber, Reserved, Reserved, StrokeCount, Cadence, InstPower, Flags)
+        #
+        # Layout and field values: antframe.Page22, antframe.Page22Fields
+        info = antframe.Page22.pack(*antframe.Page22Fields(Channel, StrokeCount, Cadence, InstPower))
 
         return info
 
 
     def msgUnPage22_RowingData(self,info):
-        fChannel = sc.unsigned_char  # First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # First byte of the ANT+ datapage (payload)
-        fReserved = sc.unsigned_char
-        fStrokeCount = sc.unsigned_char
-        fCadence = sc.unsigned_char
-        fInstPower = sc.unsigned_short
-        fFlags = sc.unsigned_char
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fReserved + fReserved + fStrokeCount + fCadence + fInstPower + fFlags
-        tuple = struct.unpack(format, info)
+        tuple = antframe.Page22.unpack(info)
 
         return tuple[0], tuple[1], tuple[2], tuple[3], tuple[4], tuple[5], tuple[6], tuple[7]
 
@@ -877,14 +1052,6 @@ class clsAntDongle():
     def msgPage80_ManufacturerInfo(self,Channel, Reserved1, Reserved2, HWrevision, ManufacturerID, ModelNumber):
         DataPageNumber = 80
 
-        fChannel = sc.unsigned_char  # First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # First byte of the ANT+ datapage (payload)
-        fReserved1 = sc.unsigned_char
-        fReserved2 = sc.unsigned_char
-        fHWrevision = sc.unsigned_char
-        fManufacturerID = sc.unsigned_short
-        fModelNumber = sc.unsigned_short
-
         # page 28 byte 4,5,6,7- 15=dynastream, 89=tacx
         # antifier used 15 : "a4 09 4e 00 50 ff ff 01 0f 00 85 83 bb"
         # we use 89 (tacx) with the same ModelNumber
@@ -892,23 +1059,13 @@ class clsAntDongle():
         # Should be variable and caller-supplied; perhaps it influences pairing
         # when trainer-software wants a specific device?
         #
-        format = sc.no_alignment + fChannel + fDataPageNumber + fReserved1 + fReserved2 + fHWrevision + fManufacturerID + fModelNumber
-        info = struct.pack(format, Channel, DataPageNumber, Reserved1, Reserved2, HWrevision, ManufacturerID, ModelNumber)
+        info = antframe.Page80.pack(Channel, DataPageNumber, Reserved1, Reserved2, HWrevision, ManufacturerID, ModelNumber)
 
         return info
 
 
     def msgUnpage80_ManufacturerInfo(self,info):
-        fChannel = sc.unsigned_char  # 0 First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # 1 First byte of the ANT+ datapage (payload)
-        fReserved1 = sc.unsigned_char  # 2
-        fReserved2 = sc.unsigned_char  # 3
-        fHWrevision = sc.unsigned_char  # 4
-        fManufacturerID = sc.unsigned_short  # 5
-        fModelNumber = sc.unsigned_short  # 6
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fReserved1 + fReserved2 + fHWrevision + fManufacturerID + fModelNumber
-        tuple = struct.unpack(format, info)
+        tuple = antframe.Page80.unpack(info)
 
         return tuple[0], tuple[1], tuple[2], tuple[3], tuple[4], tuple[5], tuple[6]
 
@@ -923,28 +1080,12 @@ class clsAntDongle():
     def msgPage81_ProductInformation(self,Channel, Reserved1, SWrevisionSupp, SWrevisionMain, SerialNumber):
         DataPageNumber = 81
 
-        fChannel = sc.unsigned_char  # First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # First byte of the ANT+ datapage (payload)
-        fReserved1 = sc.unsigned_char
-        fSWrevisionSupp = sc.unsigned_char
-        fSWrevisionMain = sc.unsigned_char
-        fSerialNumber = sc.unsigned_int
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fReserved1 + fSWrevisionSupp + fSWrevisionMain + fSerialNumber
-        info = struct.pack(format, Channel, DataPageNumber, Reserved1, SWrevisionSupp, SWrevisionMain, SerialNumber)
+        info = antframe.Page81.pack(Channel, DataPageNumber, Reserved1, SWrevisionSupp, SWrevisionMain, SerialNumber)
 
         return info
 
 
     def msgUnpage81_ProductInformation(self,info):
-        fChannel = sc.unsigned_char  # 0 First byte of the ANT+ message content
-        fDataPageNumber = sc.unsigned_char  # 1 First byte of the ANT+ datapage (payload)
-        fReserved1 = sc.unsigned_char  # 2
-        fSWrevisionSupp = sc.unsigned_char  # 3
-        fSWrevisionMain = sc.unsigned_char  # 4
-        fSerialNumber = sc.unsigned_int  # 5
-
-        format = sc.no_alignment + fChannel + fDataPageNumber + fReserved1 + fSWrevisionSupp + fSWrevisionMain + fSerialNumber
-        tuple = struct.unpack(format, info)
+        tuple = antframe.Page81.unpack(info)
 
         return tuple[0], tuple[1], tuple[2], tuple[3], tuple[4], tuple[5]
\ No newline at end of file
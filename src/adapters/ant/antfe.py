@@ -4,10 +4,34 @@
 # ---------------------------------------------------------------------------
 #
 
+import logging
+
+from . import antframe
+from . import antpagescheduler
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Common page 70 (request data page), sent by a display as acknowledged data
+#   a4 09 4f cc 46 s0 s1 d1 d2 tr pg ct xx
+#   slave serial, descriptors, requested transmission response (bits 0-6:
+#   number of times to send), requested page, command type (1 = data page)
+# ---------------------------------------------------------------------------
+PAGE_REQUEST = 70
+REQUEST_DATA_PAGE = 1
+REQUESTABLE_PAGES = (16, 22, 80, 81)  # the pages BroadcastTrainerDataMessage encodes
+
 
 class antFE(object):
-    def __init__(self, ant_dongle):
+    def __init__(self, ant_dongle, Channel=None):
         self._ant_dongle = ant_dongle
+        self.Channel = ant_dongle.channel_FE if Channel is None else Channel  # one FE channel per rower in hub mode
+        self._encoder = antframe.FrameEncoder()
+        # page 80 and 81 only hold constants, compose the frames once
+        self._page80 = self._ant_dongle.ComposeMessage(self._ant_dongle.msgID_BroadcastData, self._ant_dongle.msgPage80_ManufacturerInfo(self.Channel, 0xff, 0xff, self._ant_dongle.HWrevision_FE, self._ant_dongle.Manufacturer_waterrower, self._ant_dongle.ModelNumber_FE))
+        self._page81 = self._ant_dongle.ComposeMessage(self._ant_dongle.msgID_BroadcastData, self._ant_dongle.msgPage81_ProductInformation(self.Channel, 0xff, self._ant_dongle.SWrevisionSupp_FE, self._ant_dongle.SWrevisionMain_FE, self._ant_dongle.SerialNumber_FE))
+        self.Scheduler = antpagescheduler.clsPageScheduler(antpagescheduler.FE_ROWER_PATTERN)
+        self._ant_dongle.RegisterChannelHandler(self.Channel, self.ChannelData)
         self.EventCounter = 0
         self.DistanceTravelled = 0
         self.info = []
@@ -25,7 +49,7 @@ class antFE(object):
         self.ElapsedTime = WaterrowerValuesRaw['elapsedtime'] * 4 # the unit for ant+ is 1 equals to 0.25 sec therfore I need to multipli the elapsedtime by 4.
         self.DistanceTravelled = WaterrowerValuesRaw['total_distance_m']
         self.Speed = (WaterrowerValuesRaw['speed'] * 1000 / 100) #  cm/s to m/s (/100) and multiply by 1000 cause ant+ 0.001 m/s
-        self.Heart = 0
+        self.Heart = WaterrowerValuesRaw.get('heart_rate', 0)
         self.StrokeCount = WaterrowerValuesRaw['total_strokes']
         self.Cadence = WaterrowerValuesRaw['stroke_rate']/2
         self.Cadence = min(253, self.Cadence)  # Limit to 253
@@ -35,26 +59,36 @@ class antFE(object):
 
 
 
-        if self.EventCounter % 64 in (30, 31):  # After 10 blocks of three messages, then 2 = 32 messages
-            self.info = self._ant_dongle.msgPage80_ManufacturerInfo(self._ant_dongle.channel_FE, 0xff, 0xff, self._ant_dongle.HWrevision_FE, self._ant_dongle.Manufacturer_waterrower, self._ant_dongle.ModelNumber_FE)
-            self.fedata = self._ant_dongle.ComposeMessage(self._ant_dongle.msgID_BroadcastData, self.info)
+        self.EventCounter = self.Scheduler.Slot
+        page = self.Scheduler.Next()  # the interleave pattern decides which page goes into this slot
 
-        elif self.EventCounter % 64 in (62, 63):  # After 10 blocks of three messages, then 2 = 32 messages
-            self.info = self._ant_dongle.msgPage81_ProductInformation(self._ant_dongle.channel_FE, 0xff, self._ant_dongle.SWrevisionSupp_FE, self._ant_dongle.SWrevisionMain_FE, self._ant_dongle.SerialNumber_FE)
-            self.fedata = self._ant_dongle.ComposeMessage(self._ant_dongle.msgID_BroadcastData, self.info)
+        if page == 80:
+            self.fedata = self._page80
 
-        elif self.EventCounter % 3 == 0 or self.EventCounter % 4 == 0:
+        elif page == 81:
+            self.fedata = self._page81
 
+        elif page == 22:
             self.AccumlatedStrokecount = self.Rollovercalc(self.StrokeCount,254)
-            self.info = self._ant_dongle.msgPage22_RowingData(self._ant_dongle.channel_FE, self.AccumlatedStrokecount, self.Cadence, self.InstPower)
-            self.fedata = self._ant_dongle.ComposeMessage(self._ant_dongle.msgID_BroadcastData, self.info)
+            self.fedata = self._encoder.Broadcast(antframe.Page22, antframe.Page22Fields(self.Channel, self.AccumlatedStrokecount, self.Cadence, self.InstPower))
 
-        else:
+        elif page == 16:
             self.AccumlatedElapsedTime = self.Rollovercalc(self.ElapsedTime,256)
             self.AccumlatedDistanceTravelled = self.Rollovercalc(self.DistanceTravelled,256)
-            self.info = self._ant_dongle.msgPage16_GeneralFEdata(self._ant_dongle.channel_FE, self.AccumlatedElapsedTime, self.AccumlatedDistanceTravelled, self.Speed, self.Heart)
-            self.fedata = self._ant_dongle.ComposeMessage(self._ant_dongle.msgID_BroadcastData, self.info)
+            self.fedata = self._encoder.Broadcast(antframe.Page16, antframe.Page16Fields(self.Channel, self.AccumlatedElapsedTime, self.AccumlatedDistanceTravelled, self.Speed, self.Heart))
+
 
+    def ChannelData(self, d):
+        # in the reader thread of the dongle: a display asks for a page (common page 70)
+        if len(d) < 13 or d[4] != PAGE_REQUEST or d[11] != REQUEST_DATA_PAGE:
+            return
+        page = d[10]
+        count = d[9] & 0x7f
+        if page not in REQUESTABLE_PAGES:
+            logger.debug("ANT+ page %s requested on channel %s, not supported", page, self.Channel)
+            return
+        logger.debug("ANT+ page %s requested %s times on channel %s", page, count, self.Channel)
+        self.Scheduler.RequestPage(page, count)
 
     def Rollovercalc(self,rollovervar, limit):
         if rollovervar <= limit:
@@ -0,0 +1,184 @@
+# ---------------------------------------------------------------------------
+# Precompiled ANT frame encoding and decoding
+# ---------------------------------------------------------------------------
+# The data page layouts of clsAntDongle.msgPage* compiled once into
+# struct.Struct objects, a FrameEncoder that packs a broadcast data page
+# into a reusable 13-byte frame and a FrameParser that splits what the
+# dongle returns on a read into frames:
+#
+#   a4 09 4e cc p0 p1 p2 p3 p4 p5 p6 p7 xx
+#   synch=a4, len=09, id=4e (BroadcastData), channel, 8 byte page, checksum
+# ---------------------------------------------------------------------------
+#
+
+import functools
+import operator
+import struct
+
+from . import structconstants as sc
+
+SYNCH = 0xa4
+msgID_BroadcastData = 0x4e
+BroadcastInfoLength = 9  # channel + 8 byte data page
+BroadcastFrameLength = BroadcastInfoLength + 4  # synch, length, id and checksum
+
+# ---------------------------------------------------------------------------
+# Page layouts, first byte is the channel, second the data page number
+# ---------------------------------------------------------------------------
+Header = struct.Struct(sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char)  # synch, length, id
+
+# Data page 16 (0x10) General FE Data
+#               channel           page              equipment type    elapsed time      distance          speed              heart rate        capabilities
+Page16 = struct.Struct(sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_char + sc.unsigned_char)
+
+# Data page 22 (0x16) Specific Rower Data
+#               channel           page              reserved          reserved          stroke count      cadence           power              flags
+Page22 = struct.Struct(sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_char)
+
+# Data page 25 (0x19) Specific Trainer/Stationary Bike Data
+#               channel           page              event             cadence           acc power          inst power         flags
+Page25 = struct.Struct(sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_short + sc.unsigned_char)
+
+# Common data page 80 (0x50) Manufacturers Information
+#               channel           page              reserved          reserved          HW revision       manufacturer       model number
+Page80 = struct.Struct(sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_short)
+
+# Common data page 81 (0x51) Product Information
+#               channel           page              reserved          SW revision supp  SW revision main  serial number
+Page81 = struct.Struct(sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_int)
+
+
+# ---------------------------------------------------------------------------
+# X o r C h e c k s u m
+# ---------------------------------------------------------------------------
+# input     data        bytes-like, synch + length + id + info
+#
+# function  xor all bytes, the loop runs in C instead of the interpreter
+#
+# returns   the checksum as int
+# ---------------------------------------------------------------------------
+def XorChecksum(data, initial=0):
+    return functools.reduce(operator.xor, data, initial)
+
+
+# ---------------------------------------------------------------------------
+# Page field values, clamped to the size of the field
+# ---------------------------------------------------------------------------
+def Page16Fields(Channel, ElapsedTime, DistanceTravelled, Speed, HeartRate):
+    return (Channel,
+            16,                              # DataPageNumber
+            0x16,                            # EquipmentType Rower
+            int(min(0xff, ElapsedTime)),
+            int(min(0xff, DistanceTravelled)),
+            int(min(0xffff, Speed)),
+            int(min(0xff, HeartRate)),
+            0x34)                            # Capabilities IN_USE | HRM | Distance | Speed
+
+
+def Page22Fields(Channel, StrokeCount, Cadence, InstPower):
+    return (Channel,
+            22,                              # DataPageNumber
+            0xff,                            # Reserved
+            0xff,                            # Reserved
+            int(min(0xff, StrokeCount)),
+            int(min(0xfe, Cadence)),
+            int(min(0xfffe, InstPower)),
+            0x31)                            # Flags
+
+
+# ---------------------------------------------------------------------------
+# F r a m e E n c o d e r
+# ---------------------------------------------------------------------------
+# function  pack a broadcast data page into one reusable frame buffer; the
+#           header is packed once and its part of the checksum is kept, so
+#           per frame only the 9 info bytes are packed and xor-ed
+#
+# returns   Broadcast() returns an immutable copy of the frame, the buffer
+#           is overwritten by the next call
+# ---------------------------------------------------------------------------
+class FrameEncoder():
+    def __init__(self):
+        self.frame = bytearray(BroadcastFrameLength)
+        Header.pack_into(self.frame, 0, SYNCH, BroadcastInfoLength, msgID_BroadcastData)
+        self._info = memoryview(self.frame)[3:3 + BroadcastInfoLength]
+        self._headerChecksum = XorChecksum(self.frame[:3])
+
+    def Broadcast(self, page, fields):
+        page.pack_into(self.frame, 3, *fields)
+        self.frame[-1] = XorChecksum(self._info, self._headerChecksum)
+        return bytes(self.frame)
+
+
+# ---------------------------------------------------------------------------
+# F r a m e P a r s e r
+# ---------------------------------------------------------------------------
+# function  split the buffer of one dongle read into frames. The synch byte
+#           is located with bytes.find instead of a python loop and the
+#           checksum is validated over the whole frame in one reduce (the
+#           xor of a correct frame including its checksum is 0)
+#
+#           The read is copied to bytes once; the frames are bytes slices of
+#           it. memoryview slices avoid that copy, but for frames of 5..13
+#           bytes creating the view costs more than copying the bytes
+#
+# attributes (counters since creation)
+#           Frames          correct frames
+#           ChecksumErrors  frames with a wrong checksum; the parser
+#                           resynchronizes on the next synch byte
+#           Truncated       the last frame exceeds the buffer, dropped
+#           SkippedBytes    bytes before a synch byte, or dropped
+#
+# functions Parse, Counters
+# ---------------------------------------------------------------------------
+class FrameParser():
+    def __init__(self):
+        self.Frames = 0
+        self.ChecksumErrors = 0
+        self.Truncated = 0
+        self.SkippedBytes = 0
+
+    def Parse(self, data):
+        if not isinstance(data, bytes):
+            data = bytes(data)  # pyusb returns an array
+        find = data.find
+        size = len(data)
+        frames = []
+        start = 0
+        while start < size:
+            synch = find(SYNCH, start)
+            if synch < 0:
+                self.SkippedBytes += size - start
+                break
+            self.SkippedBytes += synch - start
+            start = synch
+            # length of the info, add four for synch, len, id and checksum
+            if start + 1 < size:
+                end = start + data[start + 1] + 4
+            else:
+                end = size + 1  # the length byte is missing
+            if end > size:
+                if find(SYNCH, start + 1) >= 0:
+                    self.SkippedBytes += 1  # a data byte 0xa4, frames follow
+                    start += 1
+                    continue
+                self.Truncated += 1
+                self.SkippedBytes += size - start
+                break
+            frame = data[start:end]
+            if functools.reduce(operator.xor, frame, 0):
+                self.ChecksumErrors += 1
+                self.SkippedBytes += 1
+                start += 1  # may have been a data byte 0xa4, search the next synch
+                continue
+            frames.append(frame)
+            start = end
+        self.Frames += len(frames)
+        return frames
+
+    def Counters(self):
+        return {
+            'frames': self.Frames,
+            'checksum_errors': self.ChecksumErrors,
+            'truncated': self.Truncated,
+            'skipped_bytes': self.SkippedBytes,
+        }
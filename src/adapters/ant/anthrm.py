@@ -0,0 +1,57 @@
+# ---------------------------------------------------------------------------
+# ANT+ heart rate strap receiver
+# ---------------------------------------------------------------------------
+# Refer:    https://www.thisisant.com/developer/resources/downloads#documents_tab
+#  hrm:     D00000693_-_ANT+_Device_Profile_-_Heart_Rate_Rev_2.1.pdf
+#           every data page carries the computed heart rate in byte 7
+#
+#   a4 09 4e cc p0 p1 p2 p3 p4 p5 p6 p7 xx
+#                                     ^^ computed heart rate, 0 = invalid
+# ---------------------------------------------------------------------------
+#
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_RX_FAIL_GO_TO_SEARCH = 0x08  # strap lost, channel searches again
+EVENT_CHANNEL_CLOSED = 0x07
+
+
+class antHRM(object):
+    # -----------------------------------------------------------------------
+    # input     ant_dongle  clsAntDongle with a running reader thread and the
+    #                       HRM channel configured (HRM_ChannelConfig)
+    #           hrm_bus     SnapshotBus that receives the heart rate, 0 when
+    #                       the strap is lost
+    #
+    # function  the callbacks run in the reader thread of the dongle and only
+    #           publish to the bus, so the FE broadcast is never delayed
+    # -----------------------------------------------------------------------
+    def __init__(self, ant_dongle, hrm_bus):
+        self._ant_dongle = ant_dongle
+        self._hrm_bus = hrm_bus
+        self.Channel = ant_dongle.channel_HRM_s
+        self.HeartRate = 0
+        self._ant_dongle.RegisterChannelHandler(self.Channel, self.ChannelData)
+        self._ant_dongle.RegisterHandler(self._ant_dongle.msgID_RF_EVENT, self.ChannelEvent)
+
+    def ChannelData(self, d):
+        if len(d) < 12:
+            return
+        HeartRate = d[11]  # byte 7 of the data page
+        if HeartRate != self.HeartRate:
+            logger.debug("ANT+ heart rate %s", HeartRate)
+        self.HeartRate = HeartRate
+        self._hrm_bus.publish(HeartRate)
+
+    def ChannelEvent(self, d):
+        if d[3] != self.Channel or len(d) < 6:
+            return
+        if d[5] == EVENT_RX_FAIL_GO_TO_SEARCH:
+            logger.info("ANT+ heart rate strap lost, searching")
+            self.HeartRate = 0
+            self._hrm_bus.publish(0)
+        elif d[5] == EVENT_CHANNEL_CLOSED:
+            logger.info("ANT+ heart rate channel closed, reopen")
+            self._ant_dongle.Write([self._ant_dongle.msg4B_OpenChannel(self.Channel)], False)
@@ -0,0 +1,109 @@
+# ---------------------------------------------------------------------------
+# ANT+ data page interleaving
+# ---------------------------------------------------------------------------
+# Refer:    https://www.thisisant.com/developer/resources/downloads#documents_tab
+#  trainer: D000001231_-_ANT+_Device_Profile_-_Fitness_Equipment_-_Rev_5.0_(6).pdf
+#           Transmission pattern: the general FE data page and the equipment
+#           specific page are interleaved, the common pages 80 and 81 are each
+#           sent twice in a row at least every 64 messages
+# common:   D00001198_-_ANT+_Common_Data_Pages_Rev_3.1.pdf
+#           Common page 70 (request data page): the requested page is sent
+#           the requested number of times instead of the normal data pages
+# ---------------------------------------------------------------------------
+#
+
+# ---------------------------------------------------------------------------
+# Interleave pattern of the rower
+#   Period      number of slots after which the pattern repeats
+#   DataPages   (page, weight) the data pages fill all slots not used by the
+#               common pages, spread by weight
+#   CommonPages sent CommonRepeat times in a row, spread evenly; each block
+#               ends at the end of its part of the period
+# ---------------------------------------------------------------------------
+FE_ROWER_PATTERN = {
+    'Period': 64,
+    'DataPages': ((16, 1), (22, 1)),  # General FE data, Specific rower data
+    'CommonPages': (80, 81),  # Manufacturer info, Product information
+    'CommonRepeat': 2,
+}
+
+
+# ---------------------------------------------------------------------------
+# c l s P a g e S c h e d u l e r
+# ---------------------------------------------------------------------------
+# function  Build the slot table of an interleave pattern once and hand out
+#           the page of each slot; Next() wraps at the end of the period so
+#           the pattern is never broken by an external counter rollover
+#
+# attributes
+#           Table       page number of every slot
+#           Slot        the slot Next() hands out next
+#           DataPages   the page numbers that carry live data
+#
+# functions Next, RequestPage
+# ---------------------------------------------------------------------------
+class clsPageScheduler():
+    def __init__(self, Pattern=FE_ROWER_PATTERN):
+        self.Period = Pattern['Period']
+        self.DataPages = [page for page, _weight in Pattern['DataPages']]
+        self.Table = self.__BuildTable(Pattern)
+        self.Slot = 0
+        self.__Requests = []  # [page, remaining count]
+
+    def __BuildTable(self, Pattern):
+        table = [None] * self.Period
+
+        commonPages = Pattern['CommonPages']
+        repeat = Pattern.get('CommonRepeat', 1)
+        for index, page in enumerate(commonPages):
+            end = (index + 1) * self.Period // len(commonPages)
+            for slot in range(end - repeat, end):
+                table[slot] = page
+
+        # -------------------------------------------------------------------
+        # Smooth weighted round robin over the remaining slots, so the data
+        # pages are spread evenly instead of sent in bursts
+        # -------------------------------------------------------------------
+        dataPages = Pattern['DataPages']
+        totalWeight = sum(weight for _page, weight in dataPages)
+        current = [0] * len(dataPages)
+        for slot in range(self.Period):
+            if table[slot] is not None:
+                continue
+            for i, (_page, weight) in enumerate(dataPages):
+                current[i] += weight
+            best = current.index(max(current))
+            current[best] -= totalWeight
+            table[slot] = dataPages[best][0]
+
+        return table
+
+    # -----------------------------------------------------------------------
+    # R e q u e s t P a g e
+    # -----------------------------------------------------------------------
+    # input     Page        page number requested by a display
+    #           Count       number of times the page must be sent
+    #
+    # function  queue the page; it is sent on the next data slots, the common
+    #           pages keep their slots
+    # -----------------------------------------------------------------------
+    def RequestPage(self, Page, Count=1):
+        if Count > 0:
+            self.__Requests.append([Page, Count])
+
+    # -----------------------------------------------------------------------
+    # N e x t
+    # -----------------------------------------------------------------------
+    # returns   the page number to broadcast in the current slot
+    # -----------------------------------------------------------------------
+    def Next(self):
+        page = self.Table[self.Slot]
+        self.Slot = (self.Slot + 1) % self.Period
+
+        if self.__Requests and page in self.DataPages:
+            request = self.__Requests[0]
+            page = request[0]
+            request[1] -= 1
+            if request[1] <= 0:
+                self.__Requests.pop(0)
+        return page
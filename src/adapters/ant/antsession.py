@@ -0,0 +1,108 @@
+# ---------------------------------------------------------------------------
+# Supervised ANT session
+# ---------------------------------------------------------------------------
+# clsAntDongle reconnects a dongle that dropped out (CYCPLUS dongles do) and
+# raises DongleReconnected, but a reconnected dongle has lost its network key
+# and channels. The session configures the node and configures it again in
+# the background after every reconnect, so the broadcast loop keeps
+# consuming data and nothing waits for the dongle.
+# ---------------------------------------------------------------------------
+#
+
+import logging
+import threading
+import time
+
+from . import anthrm as hrm
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# c l s A n t S e s s i o n
+# ---------------------------------------------------------------------------
+# input     ant_dongle  clsAntDongle with a running reader thread
+#           hrm_bus     when given, the HRM channel is configured as well and
+#                       the heart rate is published to it
+#           Channels    [(channel, device number)] of the FE channels, None:
+#                       channel_FE with DeviceNumber_FE; one per rower in
+#                       hub mode
+#
+# attributes
+#           Ready       the channels are configured, broadcasting makes sense
+#           Outages     [(lost, seconds)] per reconnect, time.time() the
+#                       dongle was lost and how long until the channels
+#                       were configured again
+#
+# functions Configure, Supervise
+# ---------------------------------------------------------------------------
+class clsAntSession():
+    def __init__(self, ant_dongle, hrm_bus=None, Channels=None):
+        self._ant_dongle = ant_dongle
+        self._hrm_bus = hrm_bus
+        self._channels = Channels or [(ant_dongle.channel_FE, ant_dongle.DeviceNumber_FE)]
+        self.HeartRate = None
+        if hrm_bus is not None:
+            self.HeartRate = hrm.antHRM(ant_dongle, hrm_bus)  # route the HRM channel data before the channel opens
+        self.Ready = False
+        self.Outages = []
+        self._lost = None
+        self._worker = None
+
+    # -----------------------------------------------------------------------
+    # C o n f i g u r e
+    # -----------------------------------------------------------------------
+    # function  reset the dongle, set the network key and open the channels
+    # -----------------------------------------------------------------------
+    def Configure(self):
+        self.Ready = False
+        self._ant_dongle.ApplicationRestart()  # before the channel-initiating routines, see clsAntDongle
+        self._ant_dongle.Calibrate()  # reset the dongle and defines it as node
+        time.sleep(0.25)
+        for channel, device_number in self._channels:
+            self._ant_dongle.Trainer_ChannelConfig(channel, device_number)  # define the channel needed for fitness equipements
+            time.sleep(0.25)
+        if self._hrm_bus is not None:
+            self._ant_dongle.HRM_ChannelConfig()  # second channel of the node, slave to any heart rate strap
+            time.sleep(0.25)
+        self.Ready = not self._ant_dongle.DongleReconnected  # lost again while configuring, next Supervise retries
+
+    # -----------------------------------------------------------------------
+    # S u p e r v i s e
+    # -----------------------------------------------------------------------
+    # function  call from the broadcast loop; notices a lost or reconnected
+    #           dongle and configures it again in a worker thread
+    #
+    # returns   Ready
+    # -----------------------------------------------------------------------
+    def Supervise(self):
+        dongle = self._ant_dongle
+        if self._lost is None and dongle.OutageStart is not None:
+            self._lost = dongle.OutageStart
+            self.Ready = False
+            logger.warning("ANT output stopped, dongle lost")
+
+        if dongle.DongleReconnected and not self.__Configuring():
+            if self._lost is None:  # the outage was shorter than a loop
+                self._lost = time.time() - dongle.LastOutage
+            self.Ready = False
+            self._worker = threading.Thread(target=self.__Reconfigure, name='antsession')
+            self._worker.daemon = True
+            self._worker.start()
+        return self.Ready
+
+    def __Configuring(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def __Reconfigure(self):
+        logger.info("ANT dongle reconnected, configure the channels again")
+        try:
+            self.Configure()
+        except Exception as e:
+            logger.error("ANT channel configuration failed: %s", e)
+            return
+        if self.Ready:
+            outage = time.time() - self._lost
+            self.Outages.append((self._lost, outage))
+            self._lost = None
+            logger.warning("ANT output restored after %.1f s", outage)
@@ -0,0 +1,219 @@
+# ---------------------------------------------------------------------------
+# Software ANT dongle
+# ---------------------------------------------------------------------------
+# Implements the part of the pyusb device that clsAntDongle uses (iterate,
+# set_configuration, write, read), so the ANT code can run without a USB
+# stick:
+#
+#   Antdongle = ant.clsAntDongle(Device=fakeantdongle.FakeAntDongle())
+#
+# The dongle keeps the channel configuration it is sent; an open master
+# channel reports EVENT_TX every channel period, an open slave channel
+# receives a heart rate page every period when HeartRate is set. Every
+# broadcast frame written is recorded with its time.monotonic() timestamp.
+#
+# Disconnect() makes every write/read fail with a USBError, like a CYCPLUS
+# dongle that drops out, until Reconnect() is called. A reconnected dongle
+# has lost its channel configuration, like the real one.
+# ---------------------------------------------------------------------------
+#
+
+import queue
+import threading
+import time
+
+import usb.core
+
+from . import antframe
+
+
+class FakeAntDongle(object):
+    manufacturer = 'Fake'
+    product = 'ANT USBStick2'
+    idVendor = 0x0fcf
+    idProduct = 4104
+
+    msgID_ChannelResponse = 0x40
+    msgID_RF_EVENT = 0x01
+    msgID_AssignChannel = 0x42
+    msgID_ChannelPeriod = 0x43
+    msgID_OpenChannel = 0x4b
+    msgID_CloseChannel = 0x4c
+    msgID_ResetSystem = 0x4a
+    msgID_RequestMessage = 0x4d
+    msgID_BroadcastData = 0x4e
+    msgID_AcknowledgedData = 0x4f
+    msgID_BurstData = 0x50
+    msgID_StartUp = 0x6f
+    msgID_Capabilities = 0x54
+    msgID_ANTversion = 0x3e
+
+    EVENT_TX = 0x03
+    EVENT_CHANNEL_CLOSED = 0x07
+    ChannelType_Master = 0x10  # bit of the channel type, the transmit types
+    DefaultPeriod = 8192  # 4 Hz, in 1/32768 s
+
+    # -----------------------------------------------------------------------
+    # input     HeartRate   heart rate the slave channels receive, None = no
+    #                       heart rate strap in range
+    # -----------------------------------------------------------------------
+    def __init__(self, HeartRate=None):
+        self._replies = queue.Queue()
+        self._lock = threading.Lock()
+        self._ticker = None
+        self._stop = threading.Event()
+        self.HeartRate = HeartRate
+        self.Connected = True
+        self.Disconnects = 0
+        self.Channels = {}  # channel: {'Type', 'Period', 'Open', 'Next'}
+        self.Writes = []  # every frame written while connected
+        self.Broadcasts = []  # (time.monotonic(), frame) of every broadcast data frame
+        self.Events = 0  # EVENT_TX sent
+
+    # -----------------------------------------------------------------------
+    # pyusb device surface
+    # -----------------------------------------------------------------------
+    def __iter__(self):
+        return iter([])  # no configurations, no kernel driver to detach
+
+    def set_configuration(self):
+        self.__CheckConnected()
+
+    def write(self, endpoint, data, timeout=None):
+        self.__CheckConnected()
+        message = bytes(data)
+        with self._lock:
+            self.Writes.append(message)
+            if len(message) > 2 and message[2] == self.msgID_BroadcastData:
+                self.Broadcasts.append((time.monotonic(), message))
+        self.Answer(message)
+        return len(message)
+
+    def read(self, endpoint, length, timeout=None):
+        self.__CheckConnected()
+        try:
+            return self._replies.get(timeout=(timeout or 1000) / 1000)
+        except queue.Empty:
+            raise usb.core.USBTimeoutError('Operation timed out')
+
+    # -----------------------------------------------------------------------
+    # Test control
+    # -----------------------------------------------------------------------
+    def Disconnect(self):
+        self.Connected = False
+        self.Disconnects += 1
+        with self._lock:
+            self.Channels = {}  # a dongle that lost power forgets its channels
+        self.__Clear()
+
+    def Reconnect(self):
+        self.__Clear()
+        self.Connected = True
+
+    def Close(self):
+        # stop the channel timer
+        self._stop.set()
+        if self._ticker is not None:
+            self._ticker.join(timeout=1)
+            self._ticker = None
+
+    def Inject(self, raw):
+        # queue raw bytes as one read, e.g. noise to fuzz the frame parser
+        self._replies.put(bytes(raw))
+
+    def Reply(self, id, info):
+        # queue an inbound frame, e.g. a page from another ANT device
+        message = antframe.Header.pack(antframe.SYNCH, len(info), id) + bytes(info)
+        self._replies.put(message + bytes([antframe.XorChecksum(message)]))
+
+    # -----------------------------------------------------------------------
+    # A n s w e r
+    # -----------------------------------------------------------------------
+    # function  queue the response a dongle gives on a message
+    #   ResetSystem      StartUp
+    #   RequestMessage   the requested message
+    #   data messages    nothing
+    #   others           ChannelResponse RESPONSE_NO_ERROR
+    # The channel messages update the channel configuration
+    # -----------------------------------------------------------------------
+    def Answer(self, message):
+        id = message[2]
+        if id not in (self.msgID_ResetSystem, self.msgID_RequestMessage):
+            self.__Configure(id, message)
+
+        if id == self.msgID_ResetSystem:
+            with self._lock:
+                self.Channels = {}
+            self.Reply(self.msgID_StartUp, b'\x00')
+        elif id == self.msgID_RequestMessage:
+            requested = message[4]
+            if requested == self.msgID_Capabilities:
+                self.Reply(requested, bytes([8, 3, 0, 0x3a, 0, 0]))  # 8 channels, 3 networks
+            elif requested == self.msgID_ANTversion:
+                self.Reply(requested, b'AP2USB1.05\x00')
+            else:
+                self.Reply(self.msgID_ChannelResponse, bytes([message[3], id, 0x28]))  # INVALID_MESSAGE
+        elif id not in (self.msgID_BroadcastData, self.msgID_AcknowledgedData, self.msgID_BurstData):
+            self.Reply(self.msgID_ChannelResponse, bytes([message[3], id, 0x00]))  # RESPONSE_NO_ERROR
+
+        if id == self.msgID_CloseChannel:
+            self.Reply(self.msgID_ChannelResponse, bytes([message[3], self.msgID_RF_EVENT, self.EVENT_CHANNEL_CLOSED]))
+
+    def __Configure(self, id, message):
+        if len(message) < 5:
+            return
+        with self._lock:
+            channel = self.Channels.get(message[3])
+            if id == self.msgID_AssignChannel:
+                self.Channels[message[3]] = {'Type': message[4], 'Period': self.DefaultPeriod, 'Open': False, 'Next': 0}
+            elif channel is None:
+                return
+            elif id == self.msgID_ChannelPeriod and len(message) > 6:
+                channel['Period'] = message[4] | message[5] << 8
+            elif id == self.msgID_OpenChannel:
+                channel['Open'] = True
+                channel['Next'] = time.monotonic() + channel['Period'] / 32768
+            elif id == self.msgID_CloseChannel:
+                channel['Open'] = False
+        if id == self.msgID_OpenChannel and self._ticker is None:
+            self._stop.clear()
+            self._ticker = threading.Thread(target=self.__Ticker, name='fakeantdongle')
+            self._ticker.daemon = True
+            self._ticker.start()
+
+    # -----------------------------------------------------------------------
+    # Channel timer, per open channel and channel period
+    #   master  EVENT_TX, the dongle is ready for the next broadcast
+    #   slave   a heart rate page (page 4) when HeartRate is set
+    # -----------------------------------------------------------------------
+    def __Ticker(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            wakeup = now + 0.25
+            with self._lock:
+                channels = list(self.Channels.items())
+            for number, channel in channels:
+                if not channel['Open']:
+                    continue
+                if channel['Next'] <= now:
+                    channel['Next'] += channel['Period'] / 32768
+                    if not self.Connected:
+                        pass
+                    elif channel['Type'] & self.ChannelType_Master:
+                        self.Events += 1
+                        self.Reply(self.msgID_ChannelResponse, bytes([number, self.msgID_RF_EVENT, self.EVENT_TX]))
+                    elif self.HeartRate is not None:
+                        self.Reply(self.msgID_BroadcastData, bytes([number, 4, 0, 0, 0, 0, 0, 0, int(self.HeartRate) & 0xff]))
+                wakeup = min(wakeup, channel['Next'])
+            self._stop.wait(max(0, wakeup - time.monotonic()))
+
+    def __CheckConnected(self):
+        if not self.Connected:
+            raise usb.core.USBError('No such device (it may have been disconnected)', errno=19)
+
+    def __Clear(self):
+        while True:
+            try:
+                self._replies.get_nowait()
+            except queue.Empty:
+                return
@@ -3,39 +3,51 @@ from time import sleep
 
 from . import antdongle as ant
 from . import antfe as fe
+from . import antsession
+from ..bus import jittermeter
+from ..bus import latencytrace
 
 from collections import deque
 
-def main(ant_in_q):
-    EventCounter = 0
+# in_bus: the snapshot bus of the rower, or a list of buses in hub mode, each
+# rower is broadcast on its own FE channel with its own device number
+# (DeviceNumber_FE + rower); the channel of the heart rate strap is skipped
+def main(in_bus, hrm_bus=None, Device=None):
     messages = []       # messages to be sent to
-    Antdongle = ant.clsAntDongle() # define the ANt+ dongle
-    Antdongle.Calibrate()   # reset the dongle and defines it as node
-    sleep(0.25)
-    Antdongle.Trainer_ChannelConfig() # define the channel needed for fitness equipements
-    sleep(0.25)
-    Waterrower = fe.antFE(Antdongle) # hand over the class to antfe to give acces to the dongle
+    in_buses = in_bus if isinstance(in_bus, (list, tuple)) else [in_bus]
+    Antdongle = ant.clsAntDongle(Device=Device) # define the ANt+ dongle, Device replaces the usb dongle e.g. for a FakeAntDongle
+    channels = [c for c in range(Antdongle.MaxChannels) if hrm_bus is None or c != Antdongle.channel_HRM_s]
+    if len(in_buses) > len(channels):
+        raise ValueError("%d rowers, the ANT dongle has channels for %d" % (len(in_buses), len(channels)))
+    channels = [(c, Antdongle.DeviceNumber_FE + i) for i, c in enumerate(channels[:len(in_buses)])]
+    Antdongle.StartReader() # read and route the dongle responses in the background so writes do not wait for them
+    try:
+        Session = antsession.clsAntSession(Antdongle, hrm_bus, channels) # configures the channels again when the dongle reconnects
+        Session.Configure()
+        Waterrowers = [fe.antFE(Antdongle, c) for c, _ in channels] # hand over the class to antfe to give acces to the dongle
 
-    while True:
-        if len(ant_in_q) != 0: #as long as the deque data from WR are not empty
-            WaterrowerValuesRaw = ant_in_q.pop() # remove it from the deque and put in variable
+        Snapshots = [bus.subscribe() for bus in in_buses]
+        Jitter = jittermeter.JitterMeter("ant broadcast", 0.25)
+        Latencies = [latencytrace.LatencyTracer("ant" if i == 0 else "ant%d" % i) for i in range(len(in_buses))]
+        while True:
+            Jitter.Tick()
+            if Session.Supervise():
+                sent = []
+                for Waterrower, Snapshot, Latency in zip(Waterrowers, Snapshots, Latencies):
+                    WaterrowerValuesRaw = Snapshot.latest() # the most recent values from the WR, None until the first publish
+                    if WaterrowerValuesRaw is not None: # every slot is sent, with the most recent data when the deque had nothing new
+                        Waterrower.BroadcastTrainerDataMessage(WaterrowerValuesRaw) # insert data into instance, the page scheduler of the instance picks the page and wraps by itself
+                        messages.append(Waterrower.fedata) # depending on the slot load the message arrey with the either Fitness equipement, rowerdata, manu data or product data
+                        sent.append((Latency, WaterrowerValuesRaw))
+                if messages:
+                    Antdongle.Write(messages, False) # fire-and-forget, the reader thread takes the responses, all channels in one go
+                    for Latency, WaterrowerValuesRaw in sent:
+                        Latency.Observe(WaterrowerValuesRaw)
+                    messages = []
 
-            if EventCounter < 255:  # This is important as after 256 message the counter must set to zero as a rollover occures for ant+ data
-                Waterrower.EventCounter = EventCounter # set the eventcounter of the instance
-                Waterrower.BroadcastTrainerDataMessage(WaterrowerValuesRaw) # insert data into instance
-                messages.append(Waterrower.fedata) # depending on the event counter value load the message arrey with the either Fitness equipement, rowerdata, manu data or product data
-                if len(messages) > 0:
-                    Antdongle.Write(messages, True, False) # check if length of array is greater than 0 if yes then send data over Ant+
-                EventCounter += 1
-                #print(EventCounter)
-                messages = []
-            else:
-                 EventCounter = 0
-                 messages = []
-        else:
-            pass
-
-        sleep(0.25) # Ant+ defines to send a message every 25 ms
+            sleep(0.25) # Ant+ defines to send a message every 25 ms
+    finally:
+        Antdongle.Release() # the supervisor restarts main with a new dongle instance, the reader of this one must not compete with it
 
 
 def FakeRower(WRValues_test):
@@ -11,8 +11,11 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
-import struct
 
+from ..bus import jittermeter
+from ..bus import latencytrace
+from ..bus import rowingrecord
+from ..metrics import metrics
 from .ble import (
     Advertisement,
     Characteristic,
@@ -50,6 +53,8 @@ GATT_MANAGER_IFACE = "org.bluez.GattManager1"
 
 logger = logging.getLogger(__name__)
 
+NOTIFICATIONS = metrics.Counter('pirowflo_ble_notifications_total', "FTMS rower data notifications, sent or suppressed for lack of data", ('result',))
+
 mainloop = None
 
 class InvalidArgsException(dbus.exceptions.DBusException):
@@ -86,34 +91,10 @@ def register_app_error_cb(error):
 def request_reset_ble():
     out_q_reset.put("reset_ble")
 
-def Convert_Waterrower_raw_to_byte():
-
-    WaterrowerValuesRaw = ble_in_q_value.pop()
-    WRBytearray = []
-    #print("Ble Values: {0}".format(WaterrowerValuesRaw))
-    for keys in WaterrowerValuesRaw:
-        WaterrowerValuesRaw[keys] = int(WaterrowerValuesRaw[keys])
-    #todo refactor this part with the correct struct.pack e.g. 2 bytes use "H" instand of bitshifiting ?
-    #print(WaterrowerValuesRaw)
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['stroke_rate'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_strokes'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_strokes'] & 0xff00) >> 8))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_distance_m'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_distance_m'] & 0xff00) >> 8))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_distance_m'] & 0xff0000) >> 16))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['instantaneous pace'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['instantaneous pace'] & 0xff00) >> 8))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['watts'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['watts'] & 0xff00) >> 8))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_kcal'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_kcal'] & 0xff00) >> 8))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_kcal_hour'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_kcal_hour'] & 0xff00) >> 8))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['total_kcal_min'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['heart_rate'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['elapsedtime'] & 0xff)))
-    WRBytearray.append(struct.pack("B", (WaterrowerValuesRaw['elapsedtime'] & 0xff00) >> 8))
-    return WRBytearray
+def Convert_Waterrower_raw_to_byte(WaterrowerValues):
+    # the FTMS rowing data after the flags, the same record the live
+    # telemetry server sends, see bus/rowingrecord.py
+    return rowingrecord.Pack(WaterrowerValues)
 
 
 class DeviceInformation(Service):
@@ -144,7 +125,7 @@ class ManufacturerNameString(Characteristic):
 
 
     def ReadValue(self, options):
-        print('ManufacturerNameString: ' + repr(self.value))
+        logger.debug('ManufacturerNameString: %r', self.value)
         return self.value
 
 class ModelNumberString(Characteristic):
@@ -162,7 +143,7 @@ class ModelNumberString(Characteristic):
 
 
     def ReadValue(self, options):
-        print('ModelNumberString: ' + repr(self.value))
+        logger.debug('ModelNumberString: %r', self.value)
         return self.value
 
 class SerialNumberSring(Characteristic):
@@ -180,7 +161,7 @@ class SerialNumberSring(Characteristic):
 
 
     def ReadValue(self, options):
-        print('SerialNumberSring: ' + repr(self.value))
+        logger.debug('SerialNumberSring: %r', self.value)
         return self.value
 
 class HardwareRevisionString(Characteristic):
@@ -198,7 +179,7 @@ class HardwareRevisionString(Characteristic):
 
 
     def ReadValue(self, options):
-        print('HardwareRevisionString: ' + repr(self.value))
+        logger.debug('HardwareRevisionString: %r', self.value)
         return self.value
 
 class FirmwareRevisionString(Characteristic):
@@ -216,7 +197,7 @@ class FirmwareRevisionString(Characteristic):
 
 
     def ReadValue(self, options):
-        print('FirmwareRevisionString: ' + repr(self.value))
+        logger.debug('FirmwareRevisionString: %r', self.value)
         return self.value
 
 class SoftwareRevisionString(Characteristic):
@@ -238,7 +219,7 @@ class SoftwareRevisionString(Characteristic):
         #self.value[3] = 0x30
 
     def ReadValue(self, options):
-        print('SoftwareRevisionString: ' + repr(self.value))
+        logger.debug('SoftwareRevisionString: %r', self.value)
         return self.value
 
 class FTMservice(Service):
@@ -279,7 +260,7 @@ class FitnessMachineFeature(Characteristic):
 
 
     def ReadValue(self, options):
-        print('Fitness Machine Feature: ' + repr(self.value))
+        logger.debug('Fitness Machine Feature: %r', self.value)
         return self.value
 
 class RowerData(Characteristic):
@@ -293,31 +274,30 @@ class RowerData(Characteristic):
             service)
         self.notifying = False
         self.iter = 0
+        self.Jitter = jittermeter.JitterMeter("ble notify", 0.2)
+        self.Latency = latencytrace.LatencyTracer("ble")
 
     def Waterrower_cb(self):
+        self.Jitter.Tick()
+        WaterrowerValues = ble_in_q_value.latest()
 
-        if ble_in_q_value:
+        if WaterrowerValues is not None:
 
-            Waterrower_byte_values = Convert_Waterrower_raw_to_byte()
+            Waterrower_byte_values = Convert_Waterrower_raw_to_byte(WaterrowerValues)
 
-            value = [dbus.Byte(0x2C), dbus.Byte(0x0B),
-                     dbus.Byte(Waterrower_byte_values[0]), dbus.Byte(Waterrower_byte_values[1]), dbus.Byte(Waterrower_byte_values[2]),
-                     dbus.Byte(Waterrower_byte_values[3]), dbus.Byte(Waterrower_byte_values[4]), dbus.Byte(Waterrower_byte_values[5]),
-                     dbus.Byte(Waterrower_byte_values[6]), dbus.Byte(Waterrower_byte_values[7]),
-                     dbus.Byte(Waterrower_byte_values[8]), dbus.Byte(Waterrower_byte_values[9]),
-                     dbus.Byte(Waterrower_byte_values[10]), dbus.Byte(Waterrower_byte_values[11]),dbus.Byte(Waterrower_byte_values[12]),dbus.Byte(Waterrower_byte_values[13]),dbus.Byte(Waterrower_byte_values[14]),
-                     dbus.Byte(Waterrower_byte_values[15]),
-                     dbus.Byte(Waterrower_byte_values[16]), dbus.Byte(Waterrower_byte_values[17]),
-                     ]
+            value = [dbus.Byte(0x2C), dbus.Byte(0x0B)] + [dbus.Byte(byte) for byte in Waterrower_byte_values]
 
             self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': value }, [])
+            self.Latency.Observe(WaterrowerValues)
+            NOTIFICATIONS.Inc('sent')
             return self.notifying
         else:
+            NOTIFICATIONS.Inc('suppressed')
             logger.warning("no data from s4 interface")
-            pass
+            return self.notifying # keep the timer, the interface may not be ready yet
 
     def _update_Waterrower_cb_value(self):
-        print('Update Waterrower Data')
+        logger.debug('Update Waterrower Data')
 
         if not self.notifying:
             return
@@ -326,7 +306,7 @@ class RowerData(Characteristic):
 
     def StartNotify(self):
         if self.notifying:
-            print('Already notifying, nothing to do')
+            logger.debug('Already notifying, nothing to do')
             return
 
         self.notifying = True
@@ -334,7 +314,7 @@ class RowerData(Characteristic):
 
     def StopNotify(self):
         if not self.notifying:
-            print('Not notifying, nothing to do')
+            logger.debug('Not notifying, nothing to do')
             return
 
         self.notifying = False
@@ -358,8 +338,7 @@ class FitnessMachineControlPoint(Characteristic):
         self.out_q = None
 
     def fmcp_cb(self, byte):
-        print('fmcp_cb activate')
-        print(byte)
+        logger.debug('fmcp_cb activate %s', byte)
         if byte == 0:
             value = [dbus.Byte(128), dbus.Byte(0), dbus.Byte(1)]
         elif byte == 1:
@@ -370,14 +349,13 @@ class FitnessMachineControlPoint(Characteristic):
 
     def WriteValue(self, value, options):
         self.value = value
-        print(value)
         byte = self.value[0]
-        print('Fitness machine control point: ' + repr(self.value))
+        logger.debug('Fitness machine control point: %r', self.value)
         if byte == 0:
-            print('Request control')
+            logger.info('Request control')
             self.fmcp_cb(byte)
         elif byte == 1:
-            print('Reset')
+            logger.info('Reset')
             self.fmcp_cb(byte)
 
 # class HeartRate(Service):
@@ -447,12 +425,12 @@ def sigint_handler(sig, frame):
 AGENT_PATH = "/com/inonoob/agent"
 
 
-def main(out_q,ble_in_q): #out_q
+def main(out_q,in_bus): #out_q
     global mainloop
     global out_q_reset
     global ble_in_q_value
     out_q_reset = out_q
-    ble_in_q_value = ble_in_q
+    ble_in_q_value = in_bus.subscribe()
 
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
 
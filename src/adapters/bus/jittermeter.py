@@ -0,0 +1,60 @@
+# ---------------------------------------------------------------------------
+# Timing jitter of a periodic loop
+# ---------------------------------------------------------------------------
+# Tick() is called once per period (a BLE notification, an ANT+ broadcast);
+# the intervals between the ticks are kept and every ReportEvery seconds the
+# deviation from the nominal interval is logged:
+#
+#   ble notify jitter: 300 ticks, interval 200.4 ms, stdev 1.2 ms, p99 +4.1 ms, max +9.8 ms
+#
+# Run with and without --multiprocess to compare the two modes.
+# ---------------------------------------------------------------------------
+#
+
+import logging
+import statistics
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JitterMeter(object):
+    def __init__(self, Name, Interval, ReportEvery=60):
+        self.Name = Name
+        self.Interval = Interval  # nominal seconds between ticks
+        self.ReportEvery = ReportEvery
+        self.Intervals = []
+        self._last = None
+        self._reported = time.monotonic()
+
+    def Tick(self):
+        now = time.monotonic()
+        if self._last is not None:
+            self.Intervals.append(now - self._last)
+        self._last = now
+        if now - self._reported >= self.ReportEvery and self.Intervals:
+            logger.info(self.Report())
+            self.Intervals = []
+            self._reported = now
+
+    def Stats(self):
+        # seconds; p99 and max are the deviation from the nominal interval
+        intervals = sorted(self.Intervals)
+        if not intervals:
+            return None
+        deviation = [abs(i - self.Interval) for i in intervals]
+        deviation.sort()
+        return {
+            'ticks': len(intervals),
+            'mean': statistics.mean(intervals),
+            'stdev': statistics.pstdev(intervals),
+            'p99': deviation[min(len(deviation) - 1, int(len(deviation) * 0.99))],
+            'max': deviation[-1],
+        }
+
+    def Report(self):
+        stats = self.Stats()
+        if stats is None:
+            return "{0} jitter: no ticks".format(self.Name)
+        return "{0} jitter: {1} ticks, interval {2:.1f} ms, stdev {3:.1f} ms, p99 +{4:.1f} ms, max +{5:.1f} ms".format(
+            self.Name, stats['ticks'], stats['mean'] * 1000, stats['stdev'] * 1000, stats['p99'] * 1000, stats['max'] * 1000)
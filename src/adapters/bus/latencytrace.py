@@ -0,0 +1,166 @@
+# ---------------------------------------------------------------------------
+# Latency of the rowing values from the sensor to the radio
+# ---------------------------------------------------------------------------
+# The producers stamp time.monotonic() into the snapshot as it passes the
+# stages; the stamps travel with the values over the bus (also the shared
+# memory bus, CLOCK_MONOTONIC is the same in every process):
+#
+#   trace_sensor   the S4 event left Rower.notify_callbacks, or the SmartRow
+#                  notification reached DataLogger.on_row_event
+#   trace_logger   the DataLogger updated its values with it
+#   trace_publish  the snapshot was published on the bus
+#
+# A consumer (BLE notification, ANT+ broadcast) calls Observe() after it
+# handed the values to the radio. Every sensor stamp is recorded once, the
+# first time a consumer sees it, in a histogram per hop:
+#
+#   sensor>logger  logger>publish  publish>ble  sensor>ble (end to end)
+#
+# The histograms have log2 buckets of microseconds, recording is a few
+# additions, so the tracing stays on. The tracers are kept by name, the
+# tracer of a restarted adapter replaces the one of its last run. Report()
+# summarises the histograms of this process, they are logged on SIGUSR1
+# (InstallDumpSignal):
+#
+#   kill -USR1 <pid>     (in multi-process mode every process reports its own)
+#
+# The signal handler only sets a flag, logging takes locks the interrupted
+# thread may hold. The main program logs the report from its loop with
+# LogRequested(), a forked worker process from a thread of its own.
+# ---------------------------------------------------------------------------
+#
+
+import logging
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('sensor', 'logger', 'publish')
+KEYS = tuple('trace_' + stage for stage in STAGES)
+
+_tracers = {}  # name: LatencyTracer
+_lock = threading.Lock()
+_requested = False  # SIGUSR1 arrived, the report is to be logged
+_installed = False
+
+
+def Stamp(values, Stage, At=None):
+    values['trace_' + Stage] = time.monotonic() if At is None else At
+
+
+class Histogram(object):
+    Buckets = 32  # bucket i counts latencies below 2**i microseconds, the last one all above
+
+    def __init__(self):
+        self.Counts = [0] * self.Buckets
+        self.Count = 0
+        self.Sum = 0.0
+        self.Max = 0.0
+
+    def Record(self, Seconds):
+        us = int(Seconds * 1000000)
+        self.Counts[min(max(us, 0).bit_length(), self.Buckets - 1)] += 1
+        self.Count += 1
+        self.Sum += Seconds
+        if Seconds > self.Max:
+            self.Max = Seconds
+
+    def Percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile, in seconds
+        if self.Count == 0:
+            return 0.0
+        rank = p / 100 * self.Count
+        seen = 0
+        for i, count in enumerate(self.Counts):
+            seen += count
+            if seen >= rank:
+                return min((1 << i) / 1000000, self.Max)
+        return self.Max
+
+    def Summary(self):
+        if self.Count == 0:
+            return "no samples"
+        return "{0} samples, mean {1:.2f} ms, p50 <{2:.2f} ms, p99 <{3:.2f} ms, max {4:.2f} ms".format(
+            self.Count, self.Sum / self.Count * 1000, self.Percentile(50) * 1000, self.Percentile(99) * 1000,
+            self.Max * 1000)
+
+
+class LatencyTracer(object):
+    def __init__(self, Name):
+        self.Name = Name
+        self.Hops = {}  # 'sensor>logger': Histogram
+        self._last = None  # sensor stamp recorded last
+        with _lock:
+            _tracers[Name] = self
+
+    def Observe(self, values):
+        sensor = values.get('trace_sensor')
+        if sensor is None or sensor == self._last:
+            return
+        self._last = sensor
+        now = time.monotonic()
+        previous, at = 'sensor', sensor
+        for stage, key in zip(STAGES[1:], KEYS[1:]):
+            stamp = values.get(key)
+            if stamp is not None:
+                self.__Record(previous + '>' + stage, stamp - at)
+                previous, at = stage, stamp
+        self.__Record(previous + '>' + self.Name, now - at)
+        self.__Record('sensor>' + self.Name, now - sensor)
+
+    def __Record(self, hop, seconds):
+        histogram = self.Hops.get(hop)
+        if histogram is None:
+            histogram = self.Hops[hop] = Histogram()
+        histogram.Record(seconds)
+
+    def Report(self):
+        return "\n".join("{0} {1:16s} {2}".format(self.Name, hop, histogram.Summary())
+                         for hop, histogram in self.Hops.items())
+
+
+def Tracers():
+    # {name: LatencyTracer} of this process
+    with _lock:
+        return dict(_tracers)
+
+
+def Report():
+    tracers = Tracers().values()
+    lines = [tracer.Report() for tracer in tracers if tracer.Hops]
+    return "latency sensor to radio\n" + "\n".join(lines) if lines else "latency sensor to radio: no samples"
+
+
+def LogRequested():
+    # logs the report once after SIGUSR1, call it from a loop
+    global _requested
+    if _requested:
+        _requested = False
+        logger.info(Report())
+
+
+def _Request(signum, frame):
+    global _requested
+    _requested = True
+
+
+def _Reporter():
+    while True:
+        time.sleep(1.0)
+        LogRequested()
+
+
+def _StartReporter():
+    threading.Thread(target=_Reporter, name='latency-report', daemon=True).start()
+
+
+def InstallDumpSignal():
+    # from the main thread, forked processes inherit the handler
+    global _installed
+    signal.signal(signal.SIGUSR1, _Request)
+    if not _installed and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_StartReporter)
+    _installed = True
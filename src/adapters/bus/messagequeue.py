@@ -0,0 +1,82 @@
+# ---------------------------------------------------------------------------
+# Message queue between the SmartRow interface and the passthrough
+# ---------------------------------------------------------------------------
+# The SmartRow passthrough forwards every message of the real SmartRow to
+# the app, a stream and not a snapshot: the messages are kept in order in a
+# bounded queue. When the queue is full the oldest message is dropped and
+# counted, the producer never waits.
+#
+# The consumer does not poll. It registers a wakeup callback, which the
+# producer calls on the first message put after the consumer found the
+# queue empty; a burst of messages costs one wakeup and is drained at once:
+#
+#   q = MessageQueue(maxlen=32)
+#   q.on_ready(lambda: GLib.idle_add(drain))     # consumer
+#   q.put('a 00012 00100   A5\r')                # producer, calls the wakeup
+#   q.get()                                      # 'a 00012 ...', None when empty
+#
+# The wakeup runs in the thread of the producer: it only schedules the
+# consumer (GLib.idle_add is safe from any thread), it never drains itself.
+# ---------------------------------------------------------------------------
+#
+
+import threading
+from collections import deque
+
+
+class MessageQueue(object):
+    def __init__(self, maxlen=32):
+        self.maxlen = maxlen
+        self.received = 0
+        self.dropped = 0  # the oldest messages, dropped for a full queue
+        self._messages = deque()
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._woken = False  # the consumer was woken and did not find the queue empty yet
+
+    def __len__(self):
+        return len(self._messages)
+
+    def put(self, message):
+        with self._lock:
+            if len(self._messages) >= self.maxlen:
+                self._messages.popleft()
+                self.dropped += 1
+            self._messages.append(message)
+            self.received += 1
+            wakeup = self._wakeup if not self._woken else None
+            self._woken = self._woken or wakeup is not None
+        if wakeup is not None:
+            wakeup()
+
+    def get(self):
+        # the oldest message, None when the queue is empty; the next put wakes the consumer again
+        with self._lock:
+            if self._messages:
+                return self._messages.popleft()
+            self._woken = False
+            return None
+
+    def clear(self):
+        # drops the queued messages, returns how many
+        with self._lock:
+            count = len(self._messages)
+            self._messages.clear()
+            self._woken = False
+            return count
+
+    def on_ready(self, wakeup):
+        # wakeup() is called when messages are put, None to stop; called at once when messages are queued
+        with self._lock:
+            self._wakeup = wakeup
+            self._woken = woken = wakeup is not None and len(self._messages) > 0
+        if woken:
+            wakeup()
+
+    def wake(self):
+        # wakes the consumer without a message, e.g. for a message of its own to send
+        wakeup = self._wakeup
+        if wakeup is not None:
+            with self._lock:
+                self._woken = True
+            wakeup()
@@ -0,0 +1,104 @@
+# ---------------------------------------------------------------------------
+# Binary record of the rowing values
+# ---------------------------------------------------------------------------
+# The 18 bytes the BLE FTMS rowing data characteristic carries after its
+# flags (0x2C 0x0B), little endian, the values as integers:
+#
+#   stroke_rate         uint8   half strokes per minute, 48 = 24 spm
+#   total_strokes       uint16
+#   total_distance_m    uint24, as uint16 low + uint8 high
+#   instantaneous pace  uint16  s/500 m
+#   watts               uint16
+#   total_kcal          uint16
+#   total_kcal_hour     uint16
+#   total_kcal_min      uint8
+#   heart_rate          uint8
+#   elapsedtime         uint16  s
+#
+# The BLE server, the live telemetry server and the UDP telemetry send the
+# same record. A delta carries a mask of the record fields that changed
+# (bit n = field n) and only those fields, in order.
+# ---------------------------------------------------------------------------
+#
+
+import struct
+
+RECORD = struct.Struct('<BHHBHHHHBBH')
+
+#           (snapshot key, struct format, shift, mask) per record field
+FIELDS = (
+    ('stroke_rate', 'B', 0, 0xff),
+    ('total_strokes', 'H', 0, 0xffff),
+    ('total_distance_m', 'H', 0, 0xffff),
+    ('total_distance_m', 'B', 16, 0xff),
+    ('instantaneous pace', 'H', 0, 0xffff),
+    ('watts', 'H', 0, 0xffff),
+    ('total_kcal', 'H', 0, 0xffff),
+    ('total_kcal_hour', 'H', 0, 0xffff),
+    ('total_kcal_min', 'B', 0, 0xff),
+    ('heart_rate', 'B', 0, 0xff),
+    ('elapsedtime', 'H', 0, 0xffff),
+)
+
+KEYS = tuple(dict.fromkeys(key for key, _, _, _ in FIELDS))  # the snapshot values, in record order
+
+MASK = struct.Struct('<H')
+_FIELD = [struct.Struct('<' + format) for _, format, _, _ in FIELDS]
+
+
+def Integers(values):
+    # the values of a snapshot as the record carries them, missing ones 0
+    return {key: int(values.get(key) or 0) for key in KEYS}
+
+
+def Fields(integers):
+    # the record fields of Integers()
+    return tuple((integers[key] >> shift) & mask for key, _, shift, mask in FIELDS)
+
+
+def Pack(values):
+    # the 18 byte record of a snapshot
+    return RECORD.pack(*Fields(Integers(values)))
+
+
+def Unpack(data):
+    # the values of a record, total_distance_m put together again
+    fields = RECORD.unpack(data)
+    values = {}
+    for (key, _, shift, _), field in zip(FIELDS, fields):
+        values[key] = values.get(key, 0) | (field << shift)
+    return values
+
+
+# ---------------------------------------------------------------------------
+# D e l t a
+# ---------------------------------------------------------------------------
+# input     old     record fields sent last (Fields()), None for the first
+#           new     record fields to send
+# returns   mask of the changed fields + the changed fields, b'' when
+#           nothing changed
+# ---------------------------------------------------------------------------
+def Delta(old, new):
+    if old is None:
+        return MASK.pack((1 << len(FIELDS)) - 1) + RECORD.pack(*new)
+    mask = 0
+    data = b''
+    for i, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            mask |= 1 << i
+            data += _FIELD[i].pack(b)
+    if mask == 0:
+        return b''
+    return MASK.pack(mask) + data
+
+
+def ApplyDelta(old, delta):
+    # the record fields after a delta, the inverse of Delta()
+    mask, = MASK.unpack_from(delta, 0)
+    fields = list(old) if old is not None else [0] * len(FIELDS)
+    offset = MASK.size
+    for i, field in enumerate(_FIELD):
+        if mask & (1 << i):
+            fields[i], = field.unpack_from(delta, offset)
+            offset += field.size
+    return tuple(fields)
@@ -0,0 +1,161 @@
+# ---------------------------------------------------------------------------
+# Snapshot bus between processes
+# ---------------------------------------------------------------------------
+# Same interface as snapshotbus.SnapshotBus, for the multi-process mode of
+# waterrowerthreads: the snapshot is a fixed-layout record in a
+# multiprocessing.shared_memory block, guarded by a seqlock:
+#
+#   seq      uint64   odd while the publisher writes, +2 per publish
+#   present  uint64   bit i set = field i was in the published dict
+#   fields   double   one per name in Fields
+#
+# The publisher makes seq odd, writes the record and makes seq even again.
+# A reader copies the record and retries when seq was odd or changed while
+# copying, so it never sees half a publish and never blocks the publisher.
+# There is one publisher per bus.
+#
+# A reader in another process can not be notified cheaply, wait_next polls
+# the seq every PollInterval seconds.
+#
+# Values come back as int when they are whole numbers, like the producers
+# publish them; keys not in Fields are not transported.
+# ---------------------------------------------------------------------------
+#
+
+import struct
+import time
+from multiprocessing import shared_memory
+
+# The rowing values of the S4 and the SmartRow interface
+FIELDS = (
+    'stroke_rate',
+    'total_strokes',
+    'total_distance_m',
+    'instantaneous pace',
+    'speed',
+    'watts',
+    'total_kcal',
+    'total_kcal_hour',
+    'total_kcal_min',
+    'heart_rate',
+    'elapsedtime',
+    'work',
+    'stroke_length',
+    'force',
+    'watts_avg',
+    'pace_avg',
+    'trace_sensor',  # latency trace stamps, see latencytrace.py
+    'trace_logger',
+    'trace_publish',
+)
+
+Seq = struct.Struct('<Q')
+
+
+class SharedSnapshotBus(object):
+    PollInterval = 0.005
+
+    # -----------------------------------------------------------------------
+    # input     Fields  names of the dict fields to transport; None for a bus
+    #                   that carries a single number (e.g. the heart rate)
+    #           Name    attach to the block of an existing bus
+    # -----------------------------------------------------------------------
+    def __init__(self, Fields=FIELDS, Name=None):
+        self.Fields = Fields
+        count = 1 if Fields is None else len(Fields)
+        self._record = struct.Struct('<QQ' + 'd' * count)
+        self._owner = Name is None
+        if Name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=self._record.size)
+            self._record.pack_into(self._shm.buf, 0, 0, 0, *([0.0] * count))
+        else:
+            self._shm = shared_memory.SharedMemory(name=Name)
+        self.Name = self._shm.name
+        self.Retries = 0  # reads that overlapped a publish, in this process
+        self._seq = 0
+
+    def __getstate__(self):
+        # a process started with spawn attaches to the same block
+        return {'Fields': self.Fields, 'Name': self.Name}
+
+    def __setstate__(self, state):
+        self.__init__(state['Fields'], state['Name'])
+
+    def publish(self, value):
+        if self.Fields is None:
+            present, values = 1, (float(value),)
+        else:
+            present = 0
+            values = []
+            for i, name in enumerate(self.Fields):
+                field = value.get(name)
+                if field is None:
+                    values.append(0.0)
+                else:
+                    present |= 1 << i
+                    values.append(float(field))
+        buf = self._shm.buf
+        seq = Seq.unpack_from(buf, 0)[0]
+        Seq.pack_into(buf, 0, seq + 1)  # odd: writing
+        self._record.pack_into(buf, 0, seq + 1, present, *values)
+        Seq.pack_into(buf, 0, seq + 2)
+        return (seq + 2) // 2
+
+    def latest(self):
+        while True:
+            record = self._record.unpack_from(self._shm.buf, 0)
+            seq = record[0]
+            if seq & 1 == 0 and Seq.unpack_from(self._shm.buf, 0)[0] == seq:
+                break
+            self.Retries += 1
+        if seq == 0:
+            return (0, None)
+        present = record[1]
+        if self.Fields is None:
+            return (seq // 2, self.__Number(record[2]))
+        value = {}
+        for i, name in enumerate(self.Fields):
+            if present >> i & 1:
+                value[name] = self.__Number(record[2 + i])
+        return (seq // 2, value)
+
+    def subscribe(self):
+        return Subscription(self)
+
+    def seq(self):
+        return Seq.unpack_from(self._shm.buf, 0)[0] // 2  # a publish in progress counts when done
+
+    def close(self):
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    @staticmethod
+    def __Number(field):
+        return int(field) if field.is_integer() else field
+
+
+class Subscription(object):
+    def __init__(self, bus):
+        self._bus = bus
+        self.seq = 0
+
+    def latest(self):
+        self.seq, value = self._bus.latest()
+        return value
+
+    def changed(self):
+        return self._bus.seq() != self.seq
+
+    def poll(self):
+        if self._bus.seq() == self.seq:
+            return None
+        return self.latest()
+
+    def wait_next(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._bus.seq() == self.seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self._bus.PollInterval)
+        return self.latest()
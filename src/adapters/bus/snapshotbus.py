@@ -0,0 +1,75 @@
+# ---------------------------------------------------------------------------
+# Snapshot bus between the rower interfaces and the broadcasters
+# ---------------------------------------------------------------------------
+# The producers (S4, SmartRow) publish a complete snapshot of the rowing
+# values; the consumers (BLE, ANT+, ...) only ever need the most recent one.
+#
+# The bus keeps a single (seq, value) tuple. Publishing replaces the tuple,
+# which is one atomic assignment, and notifies the readers blocked in
+# wait_next. Reading never takes a lock and never consumes the value, so any
+# number of readers can share one bus and publishing costs the same for 1 or
+# 100 polling readers; only readers blocked in wait_next add a wakeup each.
+#
+#   bus = SnapshotBus()
+#   sub = bus.subscribe()
+#   bus.publish({'watts': 150, ...})     # producer
+#   sub.changed()                        # True, seq is newer than sub.seq
+#   sub.latest()                         # {'watts': 150, ...}, marks it seen
+#   sub.wait_next(timeout=1)             # blocks until the next publish
+#
+# A published value is shared by all readers: publish a new object instead
+# of changing one that was published, and do not change what you read.
+# ---------------------------------------------------------------------------
+#
+
+import threading
+
+
+class SnapshotBus(object):
+    def __init__(self):
+        self._slot = (0, None)  # (seq, value), replaced as a whole
+        self._changed = threading.Condition(threading.Lock())  # publishers and readers in wait_next only
+
+    def publish(self, value):
+        with self._changed:
+            seq = self._slot[0] + 1
+            self._slot = (seq, value)
+            self._changed.notify_all()
+        return seq
+
+    def latest(self):
+        return self._slot
+
+    def subscribe(self):
+        return Subscription(self)
+
+
+class Subscription(object):
+    # -----------------------------------------------------------------------
+    # A reader of the bus, remembers the seq it has seen last. A new
+    # subscription sees the value already on the bus as new.
+    # -----------------------------------------------------------------------
+    def __init__(self, bus):
+        self._bus = bus
+        self.seq = 0
+
+    def latest(self):
+        # the most recent value, None when nothing was published yet
+        self.seq, value = self._bus._slot
+        return value
+
+    def changed(self):
+        return self._bus._slot[0] != self.seq
+
+    def poll(self):
+        # the most recent value when it is new, otherwise None
+        if self._bus._slot[0] == self.seq:
+            return None
+        return self.latest()
+
+    def wait_next(self, timeout=None):
+        # the next new value, None after timeout seconds without one
+        if self._bus._slot[0] == self.seq:
+            with self._bus._changed:
+                self._bus._changed.wait_for(self.changed, timeout)
+        return self.poll()
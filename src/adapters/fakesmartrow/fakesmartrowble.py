@@ -10,8 +10,6 @@ from operator import truediv
 import signal
 import threading
 import random
-import time
-import datetime
 import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
@@ -29,6 +27,8 @@ from .ble import (
     Descriptor,
     Agent,
 )
+from .smartrowtranscoder import Transcoder
+from ..metrics import metrics
 
 MainLoop = None
 
@@ -61,12 +61,10 @@ mainloop = None
 AppConnectState = None
 AppKeylockReceiveCount = 0
 ble_command_q = None
-DistanceOffset = 0
-CurrentDistance = 0
-StrokeOffset = 0
-CurrentStrokes = 0
-StartTime = None
-PendingReset = False
+transcoder = Transcoder()
+DroppedCounted = 0
+
+PASSTHROUGH = metrics.Counter('pirowflo_smartrow_passthrough_messages_total', "SmartRow messages to the app, sent, dropped for a full queue, discarded before the app connected or malformed", ('result',))
 
 class AppConnectStateEnum(Enum):
     Start=1
@@ -131,6 +129,7 @@ class WriteToSmartRow(Characteristic):
         sval = ''.join([str(v) for v in value])
         #print('WriteValue(1235): ' + sval)
         ManageConnection(sval)
+        ble_in_q_value.wake() # the answer of the fake SmartRow, if any
 
     def ReadValue(self, options):
         #print('ReadValue(1235): '+str(options))
@@ -149,73 +148,29 @@ class SmartRowData(Characteristic):
         self.iter = 0
 
     def Waterrower_cb(self):
-        global AppConnectState
-        global PendingReset
-        global ble_command_q
-        global ble_in_q_value
-        global StartTime
-
-        smartRowFakeData = None
-        value = dbus.Byte(0)
-
-        if (AppConnectState == AppConnectStateEnum.Connected):
-            if (len(ble_command_q) > 0):
-                #print('Command queue length='+str(len(ble_command_q)))
-                smartRowFakeData = ble_command_q.popleft()
-
-            elif ble_in_q_value:
-                try:
-                    smartRowFakeData = ble_in_q_value.popleft()
-                    if (not 'V3.00' in smartRowFakeData and not 'V@' in smartRowFakeData):
-                        if (StartTime is None and smartRowFakeData[0] == 'f' and smartRowFakeData[11] != '!'):
-                            logger.info('Starting rowing timer!')
-                            StartTime = time.time()
-
-                        distance = GetDistance(smartRowFakeData)
-                        smartRowFakeData = smartRowFakeData[0] + distance + smartRowFakeData[6:14]
-
-                        if (smartRowFakeData[0] == 'a'):
-                            smartRowFakeData = AddTime(smartRowFakeData)
-
-                        if (smartRowFakeData[0] == 'd'):
-                            smartRowFakeData = AddStrokeCount(smartRowFakeData)
-
-                        cksum  =f'{(sum(ord(ch) for ch in smartRowFakeData)):0>4X}'
-                        smartRowFakeData = smartRowFakeData + cksum[-2:] + '\r'
-
-                        if PendingReset:
-                            smartRowFakeData = '\rV@\r' + smartRowFakeData
-                            PendingReset = False
-                except:
-                    logger.warn('Exception when processing ble_in_q_value')
-                    smartRowFakeData = None
-
-        elif (AppConnectState == AppConnectState.WaitKeylockResponse and len(ble_command_q) > 0):
-            smartRowFakeData = ble_command_q.popleft()
-
-        elif (AppConnectState == AppConnectState.ReceivedKeylockResponse):
-            smartRowFakeData = '\r'
-            AppConnectState = AppConnectStateEnum.Connected
-            logger.info("Connect state=4: Connected")
-
-        if (smartRowFakeData is not None): 
-            value = [dbus.Byte(ord(b)) for b in smartRowFakeData]
-            #logger.info('Sending: '+str(smartRowFakeData).replace('\r', '\\r'))
+        # sends everything there is to send, in order; called on the GLib
+        # main loop when the passthrough queue or ManageConnection wakes it
+        while self.notifying:
+            smartRowFakeData = NextMessage()
+            if smartRowFakeData is None:
+                break
+            if isinstance(smartRowFakeData, str):
+                smartRowFakeData = smartRowFakeData.encode('latin-1')
+            value = dbus.Array(smartRowFakeData, signature='y')
+            #logger.info('Sending: '+str(smartRowFakeData).replace(b'\r', b'\\r'))
             self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': value }, [])
-            
-        else:
-            #logger.warning("no data from SmartRow interface")
-            pass
+            PASSTHROUGH.Inc('sent')
 
-        return self.notifying
+        if AppConnectState != AppConnectStateEnum.Connected:
+            discarded = ble_in_q_value.clear() # the app does not get the rowing before it is connected
+            if discarded:
+                PASSTHROUGH.Inc('discarded', Amount=discarded)
+        CountDropped()
+        return False # an idle source, added again by the next wakeup
 
-    def _update_Waterrower_cb_value(self):
-        #print('Update Smartrow Data ' + self.notifying)
-
-        if not self.notifying:
-            return
-
-        GLib.timeout_add(50, self.Waterrower_cb)
+    def Wakeup(self):
+        # from the thread of the SmartRow interface
+        GLib.idle_add(self.Waterrower_cb)
 
     def StartNotify(self):
         if self.notifying:
@@ -224,10 +179,10 @@ class SmartRowData(Characteristic):
 
         self.notifying = True
 
-        GLib.timeout_add(50, self.Waterrower_cb)
         #print("STARTING NOTIFICATION!")
         self.PropertiesChanged(GATT_CHRC_IFACE, { 'Value': [dbus.Byte(13)] }, [])
         #print("DONE 2 STARTING NOTIFICATION!")
+        ble_in_q_value.on_ready(self.Wakeup)
         logger.info('Starting notification')
 
     def StopNotify(self):
@@ -237,6 +192,7 @@ class SmartRowData(Characteristic):
 
         logger.info('Ending notification')
         self.notifying = False
+        ble_in_q_value.on_ready(None)
         ResetConnection()
 
     def ReadValue(self, options):
@@ -263,42 +219,64 @@ class SmartRowAdvertisement(Advertisement):
 def ResetConnection():
     global AppConnectState
     global AppKeylockReceiveCount
-    global DistanceOffset
-    global StrokeOffset
     global ble_command_q
-    global PendingReset
-    global CurrentDistance
-    global CurrentStrokes
-    global StartTime
 
     logger.info('Resetting app connection')
     AppConnectState = AppConnectStateEnum.Start
     AppKeylockReceiveCount = 0
-    DistanceOffset = CurrentDistance
-    StrokeOffset = CurrentStrokes
-    PendingReset = False
-    StartTime = None
+    transcoder.Reset()
     ble_command_q.clear()
 
+def NextMessage():
+    # the next message to send to the app, None when there is nothing to send
+    global AppConnectState
+    global ble_command_q
+    global ble_in_q_value
+
+    if (AppConnectState == AppConnectStateEnum.Connected):
+        if (len(ble_command_q) > 0):
+            #print('Command queue length='+str(len(ble_command_q)))
+            return ble_command_q.popleft()
+
+        message = ble_in_q_value.get()
+        while message is not None:
+            try:
+                smartRowFakeData = transcoder.Transcode(message)
+                if smartRowFakeData is not None:
+                    return smartRowFakeData
+                PASSTHROUGH.Inc('malformed')
+            except Exception as e:
+                logger.warning('Exception when processing the SmartRow message %r: %s', message, e)
+            message = ble_in_q_value.get()
+
+    elif (AppConnectState == AppConnectStateEnum.WaitKeylockResponse and len(ble_command_q) > 0):
+        return ble_command_q.popleft()
+
+    elif (AppConnectState == AppConnectStateEnum.ReceivedKeylockResponse):
+        AppConnectState = AppConnectStateEnum.Connected
+        logger.info("Connect state=4: Connected")
+        return '\r'
+
+    return None
+
+def CountDropped():
+    global DroppedCounted
+    dropped = ble_in_q_value.dropped
+    if dropped != DroppedCounted:
+        logger.debug('SmartRow passthrough queue full, %d messages dropped', dropped - DroppedCounted)
+        PASSTHROUGH.Inc('dropped', Amount=dropped - DroppedCounted)
+        DroppedCounted = dropped
+
 def ManageConnection(value):
     global AppConnectState
     global AppKeylockReceiveCount
     global ble_command_q
-    global PendingReset
-    global DistanceOffset
-    global CurrentDistance
-    global StrokeOffset
-    global CurrentStrokes
-    global StartTime
 
     if(AppConnectState == AppConnectStateEnum.Connected):
         if 'V@' in value:
             # Handle reset
             logger.info('Resetting time, distance and stroke count on reset')
-            PendingReset = True
-            DistanceOffset = CurrentDistance
-            StrokeOffset = CurrentStrokes
-            StartTime = None  # Wait for rowing to start before starting timer
+            transcoder.Reset(Announce=True)
             return
 
     else:
@@ -329,63 +307,6 @@ def ManageConnection(value):
             ble_command_q.append('\r')
             AppConnectState = AppConnectStateEnum.ReceivedKeylockResponse
 
-def DecryptDistance(data):
-    try:
-        s = ''
-        for c in data[1:6]:
-            s += chr(int(ord(c) & 15 | 0x30))
-        return s
-
-    except Exception as e:
-        print(e)
-        print(data)
-        return data
-
-def GetDistance(data):
-    global DistanceOffset
-    global CurrentDistance
-
-    d = int(DecryptDistance(data))
-
-    # Store incoming distance
-    CurrentDistance = d
-
-    d = d - DistanceOffset
-    if (d < 0):
-        d = 0
-
-    strDist = f'{d:05}'
-    s = ''
-    for c in strDist[0:5]:
-            s += chr(int(ord(c) + 0x10))
-
-    return s
-
-def AddTime(data):
-    global StartTime
-    elapsed = 0
-
-    if (StartTime is not None):
-        elapsed = int(time.time() - StartTime)
-
-    # Time format is hmmss. Null out the milliseconds. 
-    elapsedStr = str(datetime.timedelta(seconds=elapsed)).replace(':', '')
-    return data[:6] + elapsedStr + '   ' + data[14:]
-
-def AddStrokeCount(data):
-    global CurrentStrokes
-    global StrokeOffset
-
-   # Get and store current stroke count
-    CurrentStrokes = int(data[9:13].replace(' ', '0'))
-    c = CurrentStrokes - StrokeOffset
-    if (c < 0):
-        c = 0
-
-    # Stroke count is space padded
-    strCount = f'{c: 4}'
-    return data[:9] + strCount + data[13:]
-
 def MakeKeylockChallenge():
     rnd = random.randint(8388608, 16777215)
     result='KEYLOCK=' + f'{rnd:0>6X}'
@@ -0,0 +1,148 @@
+# ---------------------------------------------------------------------------
+# SmartRow passthrough transcoder
+# ---------------------------------------------------------------------------
+# The fake SmartRow (fakesmartrowble.py) forwards the messages of the real
+# SmartRow to the app, with the distance, time and stroke count counted
+# from the last reset of the app instead of from the start of the rower:
+#
+#   a 00012 00100   A5\r
+#   type, distance, 8 characters of the message type, checksum, CR
+#
+# The distance is obfuscated by the SmartRow V3: the low nibble of each of
+# the 5 characters is the digit (the app gets the digits + 0x10 back). The
+# checksum is the low byte of the sum of the 14 characters in hex.
+#
+# The tables and field layouts are built once; Transcode() writes the fields
+# of a message into one reusable buffer:
+#
+#   transcoder = Transcoder()
+#   data = transcoder.Transcode(message)    # bytes to notify, None
+#   transcoder.Reset(Announce=True)         # the app reset the rower
+# ---------------------------------------------------------------------------
+#
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Message layout, [start, end) of the characters
+# ---------------------------------------------------------------------------
+TYPE = 0
+DISTANCE = slice(1, 6)
+TIME = slice(6, 11)             # a: hmmss
+TIME_PAD = slice(11, 14)
+STROKES = slice(9, 13)          # d: space padded
+HALT = 11                       # f: '!' while the rower stands still
+CHECKSUM = slice(14, 16)
+MESSAGE_LENGTH = 14             # without checksum and CR
+TRANSCODED_LENGTH = 17
+
+RESET_PREFIX = b'\rV@\r'        # sent before the first message after a reset
+
+# ---------------------------------------------------------------------------
+# Translation tables
+#   DECRYPT     V3 obfuscated character to its digit, anything without a
+#               digit in the low nibble to 'x' so that int() fails
+#   ENCRYPT     digit to the character the app expects (+ 0x10)
+#   SPACE_ZERO  the space padding of the counters to '0'
+# ---------------------------------------------------------------------------
+DECRYPT = bytes((0x30 | b & 15) if b & 15 < 10 else ord('x') for b in range(256))
+ENCRYPT = bytes.maketrans(b'0123456789', bytes(range(0x40, 0x4a)))
+SPACE_ZERO = bytes.maketrans(b' ', b'0')
+HEX = [b'%02X' % b for b in range(256)]
+
+PASSED_AS_IS = (b'V3.00', b'V@')
+
+
+# ---------------------------------------------------------------------------
+# T r a n s c o d e r
+# ---------------------------------------------------------------------------
+# function  Count the distance, time and stroke count of the messages of the
+#           real SmartRow from the last reset of the app
+#
+# attributes
+#           CurrentDistance, CurrentStrokes     as sent by the SmartRow
+#           DistanceOffset, StrokeOffset        CurrentDistance and
+#                                               CurrentStrokes at the reset
+#           StartTime   time.monotonic() of the first stroke after the
+#                       reset, None before
+#           Announce    send RESET_PREFIX before the next message
+#           Transcoded, Dropped                 message counters
+#
+# functions Transcode, Reset
+# ---------------------------------------------------------------------------
+class Transcoder(object):
+    def __init__(self):
+        self.CurrentDistance = 0
+        self.DistanceOffset = 0
+        self.CurrentStrokes = 0
+        self.StrokeOffset = 0
+        self.StartTime = None
+        self.Announce = False
+        self.Transcoded = 0
+        self.Dropped = 0
+        self._buffer = bytearray(TRANSCODED_LENGTH)
+        self._buffer[-1] = 13
+
+    def Reset(self, Announce=False):
+        # Announce  the app reset the rower, tell it before the next message
+        self.Announce = Announce
+        self.DistanceOffset = self.CurrentDistance
+        self.StrokeOffset = self.CurrentStrokes
+        self.StartTime = None  # wait for rowing to start before starting the timer
+
+    def Transcode(self, Message, Now=None):
+        # -------------------------------------------------------------------
+        # Message   a message of the real SmartRow (str), V3 decrypted or not
+        # Now       time.monotonic(), for the elapsed time of the a message
+        # returns   the bytes to send to the app, None for a malformed message
+        # -------------------------------------------------------------------
+        try:
+            data = Message.encode('latin-1')
+        except UnicodeEncodeError:
+            data = b''
+        if PASSED_AS_IS[0] in data or PASSED_AS_IS[1] in data:
+            return data
+        try:
+            distance = int(data[DISTANCE].translate(DECRYPT))
+        except ValueError:
+            distance = None
+        if distance is None or len(data) < MESSAGE_LENGTH:
+            self.Dropped += 1
+            logger.debug("SmartRow message not passed through: %r", Message)
+            return None
+
+        kind = data[TYPE]
+        if Now is None:
+            Now = time.monotonic()
+        if self.StartTime is None and kind == 0x66 and data[HALT] != 0x21:  # 'f' not '!'
+            logger.info('Starting rowing timer!')
+            self.StartTime = Now
+
+        buffer = self._buffer
+        buffer[0:MESSAGE_LENGTH] = data[0:MESSAGE_LENGTH]
+        self.CurrentDistance = distance
+        buffer[DISTANCE] = (b'%05d' % max(distance - self.DistanceOffset, 0)).translate(ENCRYPT)
+
+        if kind == 0x61:  # 'a'
+            elapsed = 0 if self.StartTime is None else min(int(Now - self.StartTime), 35999)  # 9:59:59
+            buffer[TIME] = b'%d%02d%02d' % (elapsed // 3600, elapsed // 60 % 60, elapsed % 60)
+            buffer[TIME_PAD] = b'   '
+
+        elif kind == 0x64:  # 'd'
+            try:
+                self.CurrentStrokes = int(data[STROKES].translate(SPACE_ZERO))
+            except ValueError:
+                self.Dropped += 1
+                logger.debug("SmartRow message not passed through: %r", Message)
+                return None
+            buffer[STROKES] = b'%4d' % max(self.CurrentStrokes - self.StrokeOffset, 0)
+
+        buffer[CHECKSUM] = HEX[sum(buffer[0:MESSAGE_LENGTH]) & 0xff]
+        self.Transcoded += 1
+        if self.Announce:
+            self.Announce = False
+            return RESET_PREFIX + buffer
+        return bytes(buffer)
@@ -0,0 +1,296 @@
+# ---------------------------------------------------------------------------
+# Streaming FIT encoder for rowing activities
+# ---------------------------------------------------------------------------
+# Writes a FIT activity file (Garmin Connect, Strava) record by record:
+#
+#   header    14 bytes, the data size and the header CRC are filled in by
+#             Close(); a placeholder until then
+#   data      file_id, event (timer start), one record per Record() call,
+#             event (timer stop), lap, session, activity
+#   CRC       CRC-16 over header and data
+#
+# The definition messages are built once (Message), a data message is one
+# struct.pack. Records are written as they come and only running sums are
+# kept for the lap and session summary, so the memory does not grow with
+# the length of the session. The CRC of the data is updated with every
+# write; the header is only known at the end, Close() combines the CRC of
+# the header with the CRC of the data (CrcCombine, as zlib does for CRC-32)
+# instead of reading the file again.
+#
+# Field numbers and types from the FIT SDK profile (Profile.xlsx).
+# ---------------------------------------------------------------------------
+#
+
+import struct
+import time
+
+FIT_EPOCH = 631065600  # 1989-12-31 00:00 UTC in unix time
+PROTOCOL_VERSION = 0x20  # 2.0
+PROFILE_VERSION = 2132  # 21.32
+
+SPORT_ROWING = 15
+SUB_SPORT_INDOOR_ROWING = 14
+MANUFACTURER_DEVELOPMENT = 255
+
+# base type: (number, struct format, invalid value)
+ENUM = (0x00, 'B', 0xFF)
+UINT8 = (0x02, 'B', 0xFF)
+UINT16 = (0x84, 'H', 0xFFFF)
+UINT32 = (0x86, 'I', 0xFFFFFFFF)
+UINT32Z = (0x8C, 'I', 0x00000000)
+
+# ---------------------------------------------------------------------------
+# C R C
+# ---------------------------------------------------------------------------
+# The FIT CRC is CRC-16/ARC: reflected polynomial 0xA001, initial value 0
+# ---------------------------------------------------------------------------
+CRC_POLY = 0xA001
+
+
+def _CrcTable():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ CRC_POLY if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_TABLE = _CrcTable()
+
+
+def Crc(data, crc=0):
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _Gf2Times(matrix, vector):
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def _Gf2Square(matrix):
+    return [_Gf2Times(matrix, row) for row in matrix]
+
+
+def CrcCombine(crc1, crc2, length2):
+    # -----------------------------------------------------------------------
+    # returns   Crc(a + b) from crc1 = Crc(a), crc2 = Crc(b), length2 = len(b)
+    #           in log(length2) steps: crc1 is advanced over length2 zero
+    #           bytes by squaring the operator of one zero bit
+    # -----------------------------------------------------------------------
+    if length2 == 0:
+        return crc1
+    odd = [CRC_POLY] + [1 << (n - 1) for n in range(1, 16)]  # one zero bit
+    even = _Gf2Square(odd)  # two zero bits
+    odd = _Gf2Square(even)  # four zero bits
+    while True:
+        even = _Gf2Square(odd)  # first time: one zero byte
+        if length2 & 1:
+            crc1 = _Gf2Times(even, crc1)
+        length2 >>= 1
+        if length2 == 0:
+            break
+        odd = _Gf2Square(even)
+        if length2 & 1:
+            crc1 = _Gf2Times(odd, crc1)
+        length2 >>= 1
+        if length2 == 0:
+            break
+    return crc1 ^ crc2
+
+
+# ---------------------------------------------------------------------------
+# M e s s a g e
+# ---------------------------------------------------------------------------
+# A precompiled message type: the definition message and the struct of its
+# data messages
+#
+# input     Local       local message type 0..15
+#           Global      global message number of the profile
+#           Fields      [(field number, base type)]
+# ---------------------------------------------------------------------------
+class Message(object):
+    def __init__(self, Local, Global, Fields):
+        self.Invalid = [base[2] for _, base in Fields]
+        definition = struct.pack('<BBBHB', 0x40 | Local, 0, 0, Global, len(Fields))
+        for number, base in Fields:
+            definition += struct.pack('<BBB', number, struct.calcsize(base[1]), base[0])
+        self.Definition = definition
+        self.Struct = struct.Struct('<B' + ''.join(base[1] for _, base in Fields))
+        self.Local = Local
+
+    def Encode(self, *values):
+        values = [invalid if value is None else value for value, invalid in zip(values, self.Invalid)]
+        return self.Struct.pack(self.Local, *values)
+
+
+FILE_ID = Message(0, 0, [(0, ENUM), (1, UINT16), (2, UINT16), (3, UINT32Z), (4, UINT32)])
+#                type, manufacturer, product, serial number, time created
+EVENT = Message(1, 21, [(253, UINT32), (0, ENUM), (1, ENUM), (4, UINT8)])
+#                timestamp, event, event type, event group
+RECORD = Message(2, 20, [(253, UINT32), (5, UINT32), (6, UINT16), (7, UINT16), (4, UINT8), (3, UINT8)])
+#                timestamp, distance (cm), speed (mm/s), power, cadence, heart rate
+LAP = Message(3, 19, [(253, UINT32), (0, ENUM), (1, ENUM), (2, UINT32), (7, UINT32), (8, UINT32), (9, UINT32),
+                      (10, UINT32), (11, UINT16), (13, UINT16), (14, UINT16), (15, UINT8), (16, UINT8), (17, UINT8),
+                      (18, UINT8), (19, UINT16), (20, UINT16), (24, ENUM), (25, ENUM), (39, ENUM)])
+#                timestamp, event, event type, start time, elapsed (ms), timer (ms), distance (cm), strokes, kcal,
+#                avg/max speed (mm/s), avg/max heart rate, avg/max cadence, avg/max power, lap trigger, sport, sub sport
+SESSION = Message(4, 18, [(253, UINT32), (0, ENUM), (1, ENUM), (2, UINT32), (5, ENUM), (6, ENUM), (7, UINT32),
+                          (8, UINT32), (9, UINT32), (10, UINT32), (11, UINT16), (14, UINT16), (15, UINT16),
+                          (16, UINT8), (17, UINT8), (18, UINT8), (19, UINT8), (20, UINT16), (21, UINT16),
+                          (25, UINT16), (26, UINT16)])
+#                timestamp, event, event type, start time, sport, sub sport, elapsed (ms), timer (ms), distance (cm),
+#                strokes, kcal, avg/max speed, avg/max heart rate, avg/max cadence, avg/max power, first lap, laps
+ACTIVITY = Message(5, 34, [(253, UINT32), (0, UINT32), (1, UINT16), (2, ENUM), (3, ENUM), (4, ENUM), (5, UINT32)])
+#                timestamp, timer (ms), sessions, type, event, event type, local timestamp
+
+EVENT_TIMER = 0
+EVENT_SESSION = 8
+EVENT_LAP = 9
+EVENT_ACTIVITY = 26
+EVENT_TYPE_START = 0
+EVENT_TYPE_STOP = 1
+EVENT_TYPE_STOP_ALL = 4
+
+
+def FitTime(unix):
+    return int(unix) - FIT_EPOCH
+
+
+class Summary(object):
+    # running average and maximum of a value, invalid values are skipped
+    def __init__(self):
+        self.Count = 0
+        self.Sum = 0
+        self.Max = None
+
+    def Add(self, value):
+        if value is None:
+            return
+        self.Count += 1
+        self.Sum += value
+        if self.Max is None or value > self.Max:
+            self.Max = value
+
+    def Avg(self):
+        return int(round(self.Sum / self.Count)) if self.Count else None
+
+
+class FitWriter(object):
+    Product = 1
+    Serial = 1
+
+    # -----------------------------------------------------------------------
+    # input     Path    the .fit file, created
+    #           Start   unix time the activity started, default now
+    # -----------------------------------------------------------------------
+    def __init__(self, Path, Start=None):
+        self.Path = Path
+        self.Start = time.time() if Start is None else Start
+        self.Records = 0
+        self._file = open(Path, 'wb')
+        self._file.write(bytes(14))  # the header, written by Close()
+        self._crc = 0
+        self._size = 0
+        self._last = self.Start
+        self._distance = None
+        self._strokes = None
+        self._kcal = None
+        self._timer = None
+        self._power = Summary()
+        self._heart_rate = Summary()
+        self._cadence = Summary()
+        self._speed = Summary()
+
+        start = FitTime(self.Start)
+        self.__Write(FILE_ID.Definition + FILE_ID.Encode(4, MANUFACTURER_DEVELOPMENT, self.Product, self.Serial, start))
+        self.__Write(EVENT.Definition + EVENT.Encode(start, EVENT_TIMER, EVENT_TYPE_START, 0))
+        self.__Write(RECORD.Definition)
+
+    def __Write(self, data):
+        self._file.write(data)
+        self._crc = Crc(data, self._crc)
+        self._size += len(data)
+
+    # -----------------------------------------------------------------------
+    # R e c o r d
+    # -----------------------------------------------------------------------
+    # input     values  a snapshot of the rowing values as published by the
+    #                   interface: total_distance_m, speed (cm/s), watts,
+    #                   stroke_rate (half strokes per minute, as the FTMS
+    #                   rower data), heart_rate (0 = none), total_strokes,
+    #                   total_kcal, elapsedtime (s)
+    #           At      unix time of the record, default now
+    # -----------------------------------------------------------------------
+    def Record(self, values, At=None):
+        at = time.time() if At is None else At
+        distance = values.get('total_distance_m')
+        speed = values.get('speed')
+        power = values.get('watts')
+        cadence = values.get('stroke_rate')
+        heart_rate = values.get('heart_rate') or None
+
+        distance = None if distance is None else int(distance * 100)
+        speed = None if speed is None else min(int(speed * 10), 0xFFFE)  # cm/s to mm/s
+        power = None if power is None else min(int(power), 0xFFFE)
+        cadence = None if cadence is None else min(int(cadence / 2), 0xFE)  # strokes per minute
+        heart_rate = None if heart_rate is None else min(int(heart_rate), 0xFE)
+
+        self.__Write(RECORD.Encode(FitTime(at), distance, speed, power, cadence, heart_rate))
+        self.Records += 1
+        self._last = at
+        if distance is not None:
+            self._distance = distance
+        self._strokes = values.get('total_strokes', self._strokes)
+        self._kcal = values.get('total_kcal', self._kcal)
+        self._timer = values.get('elapsedtime', self._timer)
+        self._power.Add(power)
+        self._heart_rate.Add(heart_rate)
+        self._cadence.Add(cadence)
+        self._speed.Add(speed)
+
+    # -----------------------------------------------------------------------
+    # C l o s e
+    # -----------------------------------------------------------------------
+    # function  write the summary messages, the header and the CRC
+    # -----------------------------------------------------------------------
+    def Close(self, At=None):
+        end = max(self._last, self.Start) if At is None else At
+        timestamp = FitTime(end)
+        start = FitTime(self.Start)
+        elapsed = int((end - self.Start) * 1000)
+        timer = elapsed if self._timer is None else int(self._timer * 1000)
+        strokes = None if self._strokes is None else int(self._strokes)
+        kcal = None if self._kcal is None else int(self._kcal)
+
+        self.__Write(EVENT.Encode(timestamp, EVENT_TIMER, EVENT_TYPE_STOP_ALL, 0))
+        self.__Write(LAP.Definition + LAP.Encode(
+            timestamp, EVENT_LAP, EVENT_TYPE_STOP, start, elapsed, timer, self._distance, strokes, kcal,
+            self._speed.Avg(), self._speed.Max, self._heart_rate.Avg(), self._heart_rate.Max,
+            self._cadence.Avg(), self._cadence.Max, self._power.Avg(), self._power.Max,
+            0, SPORT_ROWING, SUB_SPORT_INDOOR_ROWING))  # lap trigger manual
+        self.__Write(SESSION.Definition + SESSION.Encode(
+            timestamp, EVENT_SESSION, EVENT_TYPE_STOP, start, SPORT_ROWING, SUB_SPORT_INDOOR_ROWING, elapsed, timer,
+            self._distance, strokes, kcal, self._speed.Avg(), self._speed.Max, self._heart_rate.Avg(),
+            self._heart_rate.Max, self._cadence.Avg(), self._cadence.Max, self._power.Avg(), self._power.Max, 0, 1))
+        local = timestamp - time.timezone if time.localtime(end).tm_isdst == 0 else timestamp - time.altzone
+        self.__Write(ACTIVITY.Definition + ACTIVITY.Encode(
+            timestamp, timer, 1, 0, EVENT_ACTIVITY, EVENT_TYPE_STOP, local))  # type manual
+
+        header = struct.pack('<BBHI4s', 14, PROTOCOL_VERSION, PROFILE_VERSION, self._size, b'.FIT')
+        header += struct.pack('<H', Crc(header))
+        crc = CrcCombine(Crc(header), self._crc, self._size)
+        self._file.write(struct.pack('<H', crc))
+        self._file.seek(0)
+        self._file.write(header)
+        self._file.close()
@@ -0,0 +1,123 @@
+# ---------------------------------------------------------------------------
+# FIT export of the rowing sessions, waterrowerthreads --fit DIR
+# ---------------------------------------------------------------------------
+# Follows the snapshots published by the interface and writes every session
+# to its own activity file, session-YYYYmmdd-HHMMSS.fit in DIR, for an upload
+# to Garmin Connect or Strava:
+#
+#   start     the first snapshot with elapsed time or strokes
+#   records   one per second, straight to the file (fitencoder.FitWriter)
+#   end       the monitor is reset (elapsed time goes back), nothing was
+#             rowed for IdleTimeout seconds, or the program ends
+#
+# The workers are daemons and the processes of the multi-process mode are
+# terminated, so an open file is also closed at exit (atexit, SIGTERM).
+# ---------------------------------------------------------------------------
+#
+
+import atexit
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from . import fitencoder
+
+logger = logging.getLogger(__name__)
+
+
+class FitExporter(object):
+    Interval = 1.0  # seconds between records
+    IdleTimeout = 120.0
+
+    def __init__(self, Directory):
+        self.Directory = Directory
+        self.Writer = None
+        self._lock = threading.Lock()
+        self._elapsed = None
+        self._strokes = None
+        self._active = 0.0
+        self._recorded = 0.0
+        self._idle = False  # the last session ended idle, the monitor still counts
+        self._offset = 0  # elapsed time of the monitor before the session
+        self._pending = None  # (values, at) not recorded yet, the last one is written at the end
+
+    # -----------------------------------------------------------------------
+    # U p d a t e
+    # -----------------------------------------------------------------------
+    # input     values  a snapshot of the rowing values, None when nothing
+    #                   was published for a while
+    #           At      unix time, default now
+    # -----------------------------------------------------------------------
+    def Update(self, values, At=None):
+        at = time.time() if At is None else At
+        with self._lock:
+            if values is None:
+                if self.Writer is not None and at - self._active >= self.IdleTimeout:
+                    self.__Finish(self._active, Idle=True)
+                return
+            elapsed = values.get('elapsedtime') or 0
+            strokes = values.get('total_strokes') or 0
+            if self.Writer is not None:
+                if elapsed < self._elapsed or strokes < self._strokes:
+                    self.__Finish(self._active)  # reset of the monitor
+                elif strokes == self._strokes and at - self._active >= self.IdleTimeout:
+                    self.__Finish(self._active, Idle=True)
+            elif self._idle and (elapsed < self._elapsed or strokes < self._strokes):
+                self._idle = False
+            stroked = strokes != self._strokes
+            if stroked:
+                self._active = at
+            self._elapsed = elapsed
+            self._strokes = strokes
+            if self.Writer is None:
+                if (elapsed <= 0 and strokes <= 0) or (self._idle and not stroked):
+                    return
+                self._offset = elapsed if self._idle else 0
+                self._idle = False
+                path = os.path.join(self.Directory, time.strftime('session-%Y%m%d-%H%M%S.fit', time.localtime(at)))
+                self.Writer = fitencoder.FitWriter(path, Start=at - (elapsed - self._offset))
+                self._active = at
+                self._recorded = 0.0
+                logger.info("FIT export of the session to %s", path)
+            if self._offset:
+                values = dict(values, elapsedtime=elapsed - self._offset)
+            if at - self._recorded >= self.Interval:
+                self.Writer.Record(values, At=at)
+                self._recorded = at
+                self._pending = None
+            else:
+                self._pending = (values, at)
+
+    def __Finish(self, At, Idle=False):
+        writer = self.Writer
+        self.Writer = None
+        self._idle = Idle
+        if self._pending is not None:
+            values, at = self._pending
+            self._pending = None
+            writer.Record(values, At=at)
+        writer.Close(At=max(At, writer.Start))
+        logger.info("FIT export finished, %d records in %s", writer.Records, writer.Path)
+
+    def Close(self):
+        with self._lock:
+            if self.Writer is not None:
+                self.__Finish(self._active)
+
+
+def main(in_bus, Directory):
+    os.makedirs(Directory, exist_ok=True)
+    exporter = FitExporter(Directory)
+    atexit.register(exporter.Close)
+    if threading.current_thread() is threading.main_thread():
+        # a process of the multi-process mode, terminated by the supervisor
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    snapshots = in_bus.subscribe()
+    try:
+        while True:
+            exporter.Update(snapshots.wait_next(timeout=1.0))
+    finally:
+        exporter.Close()
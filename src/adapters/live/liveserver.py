@@ -0,0 +1,325 @@
+# ---------------------------------------------------------------------------
+# Live telemetry server, waterrowerthreads --live PORT
+# ---------------------------------------------------------------------------
+# Pushes the rowing values to any number of dashboards on the LAN (a tablet,
+# a TV, a second display) over WebSocket or server-sent events, without a
+# BLE connection:
+#
+#   ws://pi:8080/ws?rate=10&format=binary   WebSocket, binary deltas
+#   ws://pi:8080/ws?rate=2&format=json      WebSocket, JSON deltas
+#   http://pi:8080/events?rate=1            server-sent events, JSON deltas
+#
+# In hub mode (several S4 monitors) every rower has its own values, a client
+# picks one with rower=N (0, the first, by default):
+#
+#   ws://pi:8080/ws?rower=2&rate=5
+#
+# rate is the messages per second the client wants (up to MaxRate, default
+# DefaultRate); a WebSocket client can change it with {"rate": n}. A
+# message is only sent when a value changed, and it only carries what
+# changed since the last message to that client:
+#
+#   binary  uint16 mask of the changed record fields + those fields, the
+#           first message has all of them (see bus/rowingrecord.py, the
+#           record of the BLE FTMS rowing data)
+#   json    {"seq": n, "stroke_rate": 48, ...} the changed values
+#
+# Both formats carry the values of the record in its units: stroke_rate in
+# half strokes per minute (48 = 24 spm), as the FTMS rowing data.
+#
+# The server only ever reads the latest snapshot of the bus, the producers
+# never wait for it. Every client gets the latest values at its own rate;
+# a client that does not read fast enough skips values (its socket buffer
+# full and more than HighWater queued), one that stays behind for Stalled
+# seconds is closed.
+# A message is encoded once per snapshot and previous state, clients at
+# the same rate share the bytes.
+#
+# The server runs an asyncio loop in its own thread or process.
+# ---------------------------------------------------------------------------
+#
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import socket
+import struct
+import time
+import urllib.parse
+
+from ..bus import rowingrecord
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLIENTS = metrics.Gauge('pirowflo_live_clients', "Connected live telemetry clients by format", ('format',))
+MESSAGES = metrics.Counter('pirowflo_live_messages_total', "Live telemetry messages sent by format", ('format',))
+SKIPPED = metrics.Counter('pirowflo_live_skipped_total', "Live telemetry messages skipped for a slow client")
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def WebSocketFrame(Opcode, Payload):
+    # a final, unmasked frame from the server
+    length = len(Payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | Opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | Opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | Opcode, 127, length)
+    return header + Payload
+
+
+async def ReadWebSocketFrame(reader):
+    # returns   (opcode, payload) of the next frame of a client, masked
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    if length > 4096:
+        raise ValueError("client frame too long")
+    mask = await reader.readexactly(4) if second & 0x80 else b'\0\0\0\0'
+    payload = await reader.readexactly(length)
+    return first & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+class Snapshot(object):
+    # a snapshot of the bus as the clients get it, encoded on demand
+    __slots__ = ('Seq', 'Values', 'Fields', 'Messages')
+
+    def __init__(self, Seq, values):
+        self.Seq = Seq
+        self.Values = rowingrecord.Integers(values)
+        self.Fields = rowingrecord.Fields(self.Values)
+        self.Messages = {}  # (format, seq of the client's last snapshot): message bytes
+
+    def Message(self, Format, Previous):
+        # -------------------------------------------------------------------
+        # input     Format      'binary', 'json' or 'sse'
+        #           Previous    the Snapshot sent last to the client, None
+        # returns   the framed message with the changes since Previous,
+        #           b'' when no value changed
+        # -------------------------------------------------------------------
+        key = (Format, None if Previous is None else Previous.Seq)
+        message = self.Messages.get(key)
+        if message is None:
+            if Format == 'binary':
+                delta = rowingrecord.Delta(None if Previous is None else Previous.Fields, self.Fields)
+                message = WebSocketFrame(OP_BINARY, delta) if delta else b''
+            else:
+                changed = {k: v for k, v in self.Values.items() if Previous is None or Previous.Values[k] != v}
+                if changed:
+                    text = json.dumps(dict(seq=self.Seq, **changed), separators=(',', ':')).encode('utf-8')
+                    message = WebSocketFrame(OP_TEXT, text) if Format == 'json' else b'data: ' + text + b'\n\n'
+                else:
+                    message = b''
+            self.Messages[key] = message
+        return message
+
+
+class Client(object):
+    def __init__(self, Format, Rate, writer, Rower=0):
+        self.Format = Format
+        self.Rate = Rate
+        self.Rower = Rower
+        self.Writer = writer
+        self.Sent = None  # the Snapshot sent last
+        self.Behind = None  # monotonic time the socket buffer went above HighWater
+        self.Closed = False
+
+
+class LiveServer(object):
+    MaxRate = 25.0
+    DefaultRate = 5.0
+    SendBuffer = 32 * 1024  # kernel socket buffer per client, a dead client does not hold more
+    HighWater = 16 * 1024  # bytes queued for a client beyond it before messages are skipped
+    Stalled = 10.0
+
+    # -----------------------------------------------------------------------
+    # input     Bus         the snapshot bus of the interface, a list of
+    #                       buses in hub mode, one per rower
+    #           Address     port (all interfaces), host:port
+    # -----------------------------------------------------------------------
+    def __init__(self, Bus, Address):
+        host, _, port = str(Address).rpartition(':')
+        self.Host = host or None
+        self.Port = int(port)
+        self.Clients = set()
+        self._handlers = set()  # the tasks of the connections, cancelled by Stop
+        self._buses = list(Bus) if isinstance(Bus, (list, tuple)) else [Bus]
+        self._snapshots = [None] * len(self._buses)  # the latest Snapshot per rower
+        self._loop = None
+        self._server = None
+        self._stopped = None
+
+    def __Rate(self, value):
+        rate = float(value)
+        if not math.isfinite(rate):
+            return self.DefaultRate  # nan passes the clamp, the client would sleep forever
+        return max(min(rate, self.MaxRate), 0.1)
+
+    # -----------------------------------------------------------------------
+    # the snapshot tap: the newest snapshot of every bus at MaxRate
+    # -----------------------------------------------------------------------
+    async def __Sample(self):
+        subscriptions = [bus.subscribe() for bus in self._buses]
+        while True:
+            for rower, subscription in enumerate(subscriptions):
+                values = subscription.poll()
+                if values is not None:
+                    self._snapshots[rower] = Snapshot(subscription.seq, values)
+            await asyncio.sleep(1.0 / self.MaxRate)
+
+    async def __Handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SendBuffer)
+        try:
+            request = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            if len(request) < 2 or request[0] != 'GET':
+                writer.write(b'HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n')
+                return
+            url = urllib.parse.urlsplit(request[1])
+            query = urllib.parse.parse_qs(url.query)
+            rate = self.__Rate(query.get('rate', [self.DefaultRate])[0])
+            rower = int(query.get('rower', [0])[0])
+            if not 0 <= rower < len(self._buses):
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+                return
+            if url.path == '/ws' and 'sec-websocket-key' in headers:
+                accept = base64.b64encode(hashlib.sha1(headers['sec-websocket-key'].encode('latin-1') +
+                                                       WEBSOCKET_GUID).digest())
+                writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                             b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+                client = Client('binary' if query.get('format', ['binary'])[0] == 'binary' else 'json', rate, writer,
+                                rower)
+                await self.__Serve(client, reader)
+            elif url.path == '/events':
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                             b'Access-Control-Allow-Origin: *\r\n\r\n')
+                await self.__Serve(Client('sse', rate, writer, rower), reader)
+            else:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug("live client: %s", e)
+        except asyncio.CancelledError:
+            pass  # the server stops, the task ends here instead of as cancelled for asyncio.start_server
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    async def __Serve(self, client, reader):
+        self.Clients.add(client)
+        CLIENTS.Set(sum(1 for c in self.Clients if c.Format == client.Format), client.Format)
+        logger.info("live client %s, rower %d, %s at %.1f/s", client.Writer.get_extra_info('peername'), client.Rower,
+                    client.Format, client.Rate)
+        listener = asyncio.ensure_future(self.__Listen(client, reader))
+        try:
+            while not client.Closed and not listener.done():
+                await asyncio.sleep(1.0 / client.Rate)
+                self.__Send(client)
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+            self.Clients.discard(client)
+            CLIENTS.Set(sum(1 for c in self.Clients if c.Format == client.Format), client.Format)
+
+    def __Send(self, client):
+        snapshot = self._snapshots[client.Rower]
+        if snapshot is None or snapshot is client.Sent:
+            return
+        transport = client.Writer.transport
+        if transport.is_closing():
+            client.Closed = True
+            return
+        if transport.get_write_buffer_size() > self.HighWater:
+            # the client does not keep up: skip, the next message has the
+            # changes since the last one it got
+            SKIPPED.Inc()
+            now = time.monotonic()
+            if client.Behind is None:
+                client.Behind = now
+            elif now - client.Behind >= self.Stalled:
+                logger.info("live client %s stalled, closed", client.Writer.get_extra_info('peername'))
+                client.Closed = True
+            return
+        client.Behind = None
+        message = snapshot.Message(client.Format, client.Sent)
+        if message:
+            transport.write(message)
+            MESSAGES.Inc(client.Format)
+        client.Sent = snapshot
+
+    async def __Listen(self, client, reader):
+        # what a client sends: close, ping, a new rate; EOF ends the client
+        if client.Format == 'sse':
+            await reader.read()
+            return
+        while True:
+            opcode, payload = await ReadWebSocketFrame(reader)
+            if opcode == OP_CLOSE:
+                client.Writer.write(WebSocketFrame(OP_CLOSE, payload[:2]))
+                return
+            if opcode == OP_PING:
+                client.Writer.write(WebSocketFrame(OP_PONG, payload))
+            elif opcode == OP_TEXT:
+                try:
+                    client.Rate = self.__Rate(json.loads(payload.decode('utf-8'))['rate'])
+                except (ValueError, KeyError, TypeError):
+                    logger.debug("live client sent %r", payload)
+
+    async def Serve(self):
+        self._loop = asyncio.get_event_loop()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self.__Handle, self.Host, self.Port)
+        self.Port = self._server.sockets[0].getsockname()[1]  # the port picked for port 0
+        logger.info("live telemetry on port %d", self.Port)
+        sampler = asyncio.ensure_future(self.__Sample())
+        try:
+            await self._stopped.wait()
+        finally:
+            sampler.cancel()
+            self._server.close()
+            for client in list(self.Clients):
+                client.Closed = True
+                client.Writer.close()
+            handlers = list(self._handlers)
+            for handler in handlers:
+                handler.cancel()
+            await asyncio.gather(sampler, *handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+    def Run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.Serve())
+        finally:
+            loop.close()
+
+    def Stop(self):
+        # from any thread
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+
+def main(in_bus, Address):
+    LiveServer(in_bus, Address).Run()
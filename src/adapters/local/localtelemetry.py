@@ -0,0 +1,121 @@
+# ---------------------------------------------------------------------------
+# Local telemetry to the OLED screen, waterrowerthreads --local
+# ---------------------------------------------------------------------------
+# The OLED screen runs as its own service (adapters/screen/oled.py), next to
+# the rowing process supervisord starts. The rowing process sends every
+# snapshot as one datagram to a unix socket the screen binds; nothing
+# touches the SD card, the default address is in the abstract namespace of
+# Linux (no file, gone with the socket):
+#
+#   @pirowflo/telemetry     '@' is the leading NUL of an abstract address
+#
+# The datagram is the packet of the UDP telemetry (udp/udptelemetry.py),
+# seq and timestamp included. Sending never waits: without a screen bound
+# to the address, or with the screen's queue full, the snapshot is dropped.
+#
+# LocalReceiver binds the address and returns the newest packet, the
+# screen reads it at its own frame rate:
+#
+#   receiver = LocalReceiver()
+#   packet = receiver.Latest()      # newest Packet since the last call, None
+# ---------------------------------------------------------------------------
+#
+
+import logging
+import os
+import socket
+import time
+
+from ..udp import udptelemetry
+
+logger = logging.getLogger(__name__)
+
+ADDRESS = '@pirowflo/telemetry'
+
+
+def ParseAddress(Address):
+    # '@name' abstract, a path, or None for ADDRESS; returns the socket address
+    address = Address or ADDRESS
+    return '\0' + address[1:] if address.startswith('@') else address
+
+
+class LocalSender(object):
+    def __init__(self, Address=None):
+        self.Address = ParseAddress(Address)
+        self.Seq = 0
+        self.Sent = 0
+        self.Dropped = 0
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def Send(self, values, At=None):
+        self.Seq += 1
+        try:
+            self._socket.sendto(udptelemetry.Pack(values, self.Seq, 0, At), self.Address)
+            self.Sent += 1
+        except OSError as e:
+            # no screen bound (FileNotFoundError, ConnectionRefusedError) or its queue full (BlockingIOError)
+            self.Dropped += 1
+            logger.debug("local telemetry not sent: %s", e)
+
+    def Close(self):
+        self._socket.close()
+
+
+class LocalReceiver(object):
+    def __init__(self, Address=None):
+        self.Address = ParseAddress(Address)
+        self.Received = 0
+        self.Lost = 0
+        self._seq = None
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if not self.Address.startswith('\0') and os.path.exists(self.Address):
+            os.unlink(self.Address)  # left by a receiver that did not close
+        self._socket.bind(self.Address)
+        self._socket.setblocking(False)
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def Latest(self):
+        # -------------------------------------------------------------------
+        # returns   the newest Packet of the datagrams queued, None when
+        #           nothing came since the last call; never waits
+        # -------------------------------------------------------------------
+        latest = None
+        while True:
+            try:
+                data = self._socket.recv(udptelemetry.PACKET.size + 1)
+            except BlockingIOError:
+                break
+            unpacked = udptelemetry.Unpack(data)
+            if unpacked is None:
+                continue
+            latest = unpacked
+            self.Received += 1
+            seq = unpacked[1]
+            if self._seq is not None and seq > self._seq + 1:
+                self.Lost += seq - self._seq - 1
+            self._seq = seq
+        if latest is None:
+            return None
+        rower, seq, timestamp, values = latest
+        return udptelemetry.Packet(rower, seq, timestamp, values, time.time() - timestamp, None)
+
+    def Close(self):
+        self._socket.close()
+        if not self.Address.startswith('\0'):
+            os.unlink(self.Address)
+
+
+def main(in_bus, Address=None):
+    sender = LocalSender(Address)
+    logger.info("local telemetry to %s", Address or ADDRESS)
+    snapshots = in_bus.subscribe()
+    try:
+        while True:
+            values = snapshots.wait_next(timeout=1.0)
+            if values is not None:
+                sender.Send(values)
+    finally:
+        sender.Close()
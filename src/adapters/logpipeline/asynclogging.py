@@ -0,0 +1,222 @@
+# ---------------------------------------------------------------------------
+# Asynchronous logging, the adapter threads do not wait for the SD card
+# ---------------------------------------------------------------------------
+# logging.conf configures the handlers as before; Install() then moves the
+# handlers of the root logger behind one AsyncHandler:
+#
+#   adapter thread  logger.info()  -> RepeatFilter -> queue      (microseconds)
+#   writer thread   queue -> batch of records -> console, file   (the I/O)
+#
+# AsyncHandler      emit() only formats the message and puts the record on
+#                   a bounded queue; when the queue is full the record is
+#                   dropped and counted, logging never blocks an adapter.
+#                   The writer collects the records of up to FlushInterval
+#                   seconds (an ERROR is written at once) and hands them to
+#                   the handlers as a batch.
+#
+# BatchRotatingFileHandler
+#                   a RotatingFileHandler that writes a batch with a single
+#                   write() and flush(), so the SD card sees one write per
+#                   second instead of one per record. The size check uses
+#                   the file on disk, in multi-process mode the processes
+#                   append to the same file and follow a rotation done by
+#                   another process.
+#
+# RepeatFilter      passes Burst records of the same message (logger, level,
+#                   text) per Interval seconds; the next one that passes
+#                   tells how many were suppressed.
+#
+# A forked process (waterrowerthreads -m) starts its own writer thread. It
+# ends with os._exit and runs no atexit, so the records still queued are
+# written by a multiprocessing finalizer when its target returns.
+# ---------------------------------------------------------------------------
+#
+
+import atexit
+import logging
+import logging.handlers
+import multiprocessing.util
+import os
+import queue
+import threading
+import time
+
+
+class AsyncHandler(logging.Handler):
+    Capacity = 10000  # records in the queue
+    FlushInterval = 1.0  # seconds the writer collects records for a batch
+    BatchSize = 500
+
+    def __init__(self, handlers):
+        logging.Handler.__init__(self)
+        self.Handlers = list(handlers)
+        self.Dropped = 0  # records dropped because the queue was full
+        self.Batches = 0
+        self.__Start()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__Start)
+        multiprocessing.util.register_after_fork(self, AsyncHandler.__CloseAtExit)
+
+    def __CloseAtExit(self):
+        # in a process of multiprocessing, after its finalizers were cleared
+        multiprocessing.util.Finalize(self, self.close, exitpriority=0)
+
+    def __Start(self):
+        # also in a forked child: the writer thread is not inherited and the
+        # queue may have been locked by it at the fork
+        self._queue = queue.Queue(self.Capacity)
+        self._urgent = threading.Event()
+        self._writer = threading.Thread(target=self.__Writer, name='log-writer')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def prepare(self, record):
+        # like logging.handlers.QueueHandler: the message is formatted now,
+        # the arguments may change before the writer gets to it
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self._queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.Dropped += 1
+            return
+        except Exception:
+            self.handleError(record)
+            return
+        if record.levelno >= logging.ERROR:
+            self._urgent.set()
+
+    def __Writer(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.FlushInterval
+            while len(batch) < self.BatchSize and not self._urgent.is_set():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is None:
+                    self.__Write(batch)
+                    return
+                batch.append(record)
+            self._urgent.clear()
+            while len(batch) < self.BatchSize:  # whatever arrived meanwhile
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self.__Write(batch)
+                    return
+                batch.append(record)
+            self.__Write(batch)
+
+    def __Write(self, batch):
+        self.Batches += 1
+        for handler in self.Handlers:
+            records = [r for r in batch if r.levelno >= handler.level]
+            try:
+                if hasattr(handler, 'emitBatch'):
+                    records = [r for r in records if handler.filter(r)]
+                    if records:
+                        handler.emitBatch(records)
+                elif records:
+                    for record in records:
+                        handler.handle(record)
+                    handler.flush()
+            except Exception:
+                handler.handleError(records[0])
+
+    def close(self):
+        # write what is queued, then close the handlers
+        if self._writer.is_alive():
+            try:
+                self._queue.put(None, timeout=1)
+                self._writer.join(5)
+            except queue.Full:
+                pass
+        for handler in self.Handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+
+class BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    def emitBatch(self, records):
+        text = "".join(self.format(record) + self.terminator for record in records)
+        with self.lock:
+            if self.stream is None:
+                self.stream = self._open()
+            self.__FollowRotation()
+            if self.maxBytes > 0 and self.stream.tell() + len(text) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(text)
+            self.stream.flush()
+
+    def __FollowRotation(self):
+        # another process may have rotated the file: write to the new one
+        try:
+            moved = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            moved = True
+        if moved:
+            self.stream.close()
+            self.stream = self._open()
+        self.stream.seek(0, os.SEEK_END)
+
+
+class RepeatFilter(logging.Filter):
+    def __init__(self, Interval=10.0, Burst=5):
+        logging.Filter.__init__(self)
+        self.Interval = Interval
+        self.Burst = Burst
+        self._seen = {}  # (logger, level, text): [window start, passed, suppressed]
+
+    def filter(self, record):
+        record.msg = record.getMessage()  # formatted once, AsyncHandler.prepare finds it done
+        record.args = None
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen is None or now - seen[0] >= self.Interval:
+            suppressed = seen[2] if seen is not None else 0
+            self._seen[key] = [now, 1, 0]
+            if len(self._seen) > 1000:
+                self._seen = {key: self._seen[key]}  # many different messages, start over
+            if suppressed:
+                record.msg = "{0} ({1} similar messages suppressed)".format(record.msg, suppressed)
+            return True
+        if seen[1] < self.Burst:
+            seen[1] += 1
+            return True
+        seen[2] += 1
+        return False
+
+
+def Install(Logger=None, Interval=10.0, Burst=5):
+    # -----------------------------------------------------------------------
+    # move the handlers of Logger (the root logger) behind an AsyncHandler
+    # with a RepeatFilter; call it after logging.config.fileConfig
+    # -----------------------------------------------------------------------
+    if Logger is None:
+        Logger = logging.getLogger()
+    handlers = [h for h in Logger.handlers if not isinstance(h, AsyncHandler)]
+    for handler in handlers:
+        Logger.removeHandler(handler)
+    handler = AsyncHandler(handlers)
+    handler.addFilter(RepeatFilter(Interval, Burst))
+    Logger.addHandler(handler)
+    atexit.register(handler.close)
+    return handler
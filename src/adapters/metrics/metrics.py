@@ -0,0 +1,153 @@
+# ---------------------------------------------------------------------------
+# Counters and gauges of the running adapters
+# ---------------------------------------------------------------------------
+# The adapters create their metrics at import and count on the hot path:
+#
+#   EVENTS = metrics.Counter('pirowflo_s4_events_total', "S4 events", ('type',))
+#   EVENTS.Inc(event['type'])
+#
+# Inc() and Set() are a dict update under the lock of the metric, they are
+# called from several threads (the Ant+ reader, the adapter workers); no
+# I/O, so they are cheap enough for every serial event. Nothing is exported unless waterrowerthreads
+# runs with --metrics, then metricsserver.py serves Collect() in the
+# Prometheus text format. Counters are totals since the start, the scraper
+# derives the rates (events/s) from them.
+#
+# In multi-process mode every process has its own copy of the metrics.
+# Forward() runs in each worker process and sends its samples to the main
+# process once a second, they are exported with a process label.
+# ---------------------------------------------------------------------------
+#
+
+import os
+import threading
+import time
+
+_registry = {}  # name: metric, in the order of creation
+_lock = threading.Lock()
+
+
+class Metric(object):
+    Type = 'untyped'
+
+    def __init__(self, Name, Help, Labels=()):
+        self.Name = Name
+        self.Help = Help
+        self.Labels = Labels
+        self.Values = {}  # tuple of label values: value
+        self._lock = threading.Lock()
+        with _lock:
+            _registry[Name] = self  # a metric created again replaces the old one
+
+    def Samples(self):
+        with self._lock:
+            return list(self.Values.items())
+
+
+class Counter(Metric):
+    Type = 'counter'
+
+    def Inc(self, *LabelValues, Amount=1):
+        with self._lock:
+            self.Values[LabelValues] = self.Values.get(LabelValues, 0) + Amount
+
+
+class Gauge(Metric):
+    Type = 'gauge'
+
+    def Set(self, Value, *LabelValues):
+        with self._lock:
+            self.Values[LabelValues] = Value
+
+
+class GaugeFunction(Metric):
+    # -----------------------------------------------------------------------
+    # input     Function    called on every scrape, returns the value, or
+    #                       with Labels a dict {tuple of label values: value}
+    # -----------------------------------------------------------------------
+    Type = 'gauge'
+
+    def __init__(self, Name, Help, Function, Labels=()):
+        Metric.__init__(self, Name, Help, Labels)
+        self.Function = Function
+
+    def Samples(self):
+        value = self.Function()
+        if value is None:
+            return []
+        if self.Labels:
+            return list(value.items())
+        return [((), value)]
+
+
+def _AfterFork():
+    # a thread of the parent may have held a lock at the fork
+    global _lock
+    _lock = threading.Lock()
+    for metric in _registry.values():
+        metric._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_AfterFork)
+
+
+def Collect(Functions=True):
+    # [(name, type, help, label names, [(label values, value)])]
+    with _lock:
+        registry = list(_registry.values())
+    if not Functions:
+        registry = [m for m in registry if not isinstance(m, GaugeFunction)]
+    return [(m.Name, m.Type, m.Help, m.Labels, m.Samples()) for m in registry]
+
+
+def Exposition(Collected, Processes=None):
+    # -----------------------------------------------------------------------
+    # input     Collected   Collect() of this process
+    #           Processes   {process name: Collect() of that process}, the
+    #                       samples get a process label (multi-process mode)
+    #
+    # returns   the Prometheus text format
+    # -----------------------------------------------------------------------
+    sources = [('main' if Processes else None, Collected)]
+    if Processes:
+        sources.extend(sorted(Processes.items()))
+    metrics = {}  # name: (type, help, [(label names, label values, value)])
+    for process, collected in sources:
+        for name, type, help, labels, samples in collected:
+            entry = metrics.setdefault(name, (type, help, []))
+            for values, value in samples:
+                if process is None:
+                    entry[2].append((labels, values, value))
+                else:
+                    entry[2].append((labels + ('process',), values + (process,), value))
+    lines = []
+    for name, (type, help, samples) in metrics.items():
+        lines.append("# HELP {0} {1}".format(name, help))
+        lines.append("# TYPE {0} {1}".format(name, type))
+        for labels, values, value in samples:
+            if labels:
+                pairs = ",".join('{0}="{1}"'.format(label, _Escape(v)) for label, v in zip(labels, values))
+                lines.append("{0}{{{1}}} {2}".format(name, pairs, value))
+            else:
+                lines.append("{0} {1}".format(name, value))
+    return "\n".join(lines) + "\n"
+
+
+def _Escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def Forward(Name, Queue, Interval=1.0):
+    # -----------------------------------------------------------------------
+    # in a worker process: send the counters and gauges to the main process
+    # every Interval; the gauge functions are left out, a forked process
+    # inherits them with a stale copy of the state of the main process
+    # -----------------------------------------------------------------------
+    def forward():
+        while True:
+            Queue.put((Name, Collect(Functions=False)))
+            time.sleep(Interval)
+    t = threading.Thread(target=forward, name='metrics-' + Name)
+    t.daemon = True
+    t.start()
@@ -0,0 +1,102 @@
+# ---------------------------------------------------------------------------
+# Local metrics endpoint, waterrowerthreads --metrics
+# ---------------------------------------------------------------------------
+# Serves the metrics of metrics.py over HTTP in the Prometheus text format,
+# on a TCP port of the loopback interface or on a unix socket:
+#
+#   --metrics 9101                 curl http://127.0.0.1:9101/metrics
+#   --metrics /run/pirowflo.sock   curl --unix-socket /run/pirowflo.sock http://localhost/metrics
+#
+# A scrape only formats the counters, nothing is logged per request, so a
+# dashboard polling every few seconds costs no SD-card I/O.
+#
+# In multi-process mode the worker processes forward their samples over a
+# multiprocessing queue (metrics.Forward), a thread here keeps the latest
+# of each process.
+# ---------------------------------------------------------------------------
+#
+
+import http.server
+import logging
+import os
+import socketserver
+import threading
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.Metrics.Exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # no log line per scrape
+
+
+class _TCPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ('local', 0)  # BaseHTTPRequestHandler expects a (host, port) client address
+
+
+class MetricsServer(object):
+    # -----------------------------------------------------------------------
+    # input     Address     port number (bound to 127.0.0.1), host:port, or
+    #                       the path of a unix socket
+    #           Queue       multiprocessing queue the worker processes
+    #                       forward their samples on, None with threads
+    # -----------------------------------------------------------------------
+    def __init__(self, Address, Queue=None):
+        self.Address = Address
+        self.Queue = Queue
+        self.Processes = {}  # process name: its latest Collect()
+        self._server = None
+
+    def Start(self):
+        if '/' in self.Address:
+            if os.path.exists(self.Address):
+                os.unlink(self.Address)  # left over by a previous run
+            self._server = _UnixServer(self.Address, _Handler)
+        else:
+            host, _, port = self.Address.rpartition(':')
+            self._server = _TCPServer((host or '127.0.0.1', int(port)), _Handler)
+        self._server.Metrics = self
+        t = threading.Thread(target=self._server.serve_forever, name='metrics')
+        t.daemon = True
+        t.start()
+        if self.Queue is not None:
+            t = threading.Thread(target=self.__Receive, name='metrics-receive')
+            t.daemon = True
+            t.start()
+        logger.info("metrics endpoint on %s", self.Address)
+
+    def Stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if '/' in self.Address and os.path.exists(self.Address):
+                os.unlink(self.Address)
+
+    def Exposition(self):
+        return metrics.Exposition(metrics.Collect(), dict(self.Processes) if self.Queue is not None else None)
+
+    def __Receive(self):
+        while True:
+            name, collected = self.Queue.get()
+            self.Processes[name] = collected
@@ -0,0 +1,240 @@
+# ---------------------------------------------------------------------------
+# Session recorder, waterrowerthreads --record DIR
+# ---------------------------------------------------------------------------
+# Every snapshot published by the interface is appended to a binary file of
+# fixed-width columns, one per rowing value, written through mmap:
+#
+#   header    one page
+#             magic 'PRFSESS1', version, columns, rows per block, rows,
+#             synced rows, start time, closed flag, the column names
+#   blocks    BlockRows rows each, column after column within a block:
+#             time (float64 unix time) | stroke_rate (float32) | ...
+#
+# The file grows by a whole block at a time (ftruncate + a new mapping), so
+# appending a row is a few struct.pack_into into the mapping; the kernel
+# writes the pages back, the SD card does not see a write per snapshot. A
+# one hour session at 10 Hz is 36000 rows of 72 bytes, 2.6 MB.
+#
+# Crash safety: the row is written before the row count in the header, a
+# killed process loses nothing. Every SyncInterval seconds the data is
+# msync'ed first and then the header with synced rows; after a power loss
+# the reader trims the rows whose time was never written.
+#
+# SessionReader maps the file read-only and returns each column as a numpy
+# array viewing the blocks, nothing is parsed. At the end of the session its
+# analysis is logged, see adapters/analytics/sessionanalytics.py.
+#
+# The workers are daemons and the processes of the multi-process mode are
+# terminated, so the file is closed and analysed at exit (atexit, SIGTERM);
+# the crash recovery of the reader is left to real crashes.
+# ---------------------------------------------------------------------------
+#
+
+import atexit
+import logging
+import mmap
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PRFSESS1'
+VERSION = 1
+PAGE = 4096
+NAME_SIZE = 32
+
+# The rowing values of the S4 and the SmartRow interface, see snapshotbus
+COLUMNS = (
+    'stroke_rate',
+    'total_strokes',
+    'total_distance_m',
+    'instantaneous pace',
+    'speed',
+    'watts',
+    'total_kcal',
+    'total_kcal_hour',
+    'total_kcal_min',
+    'heart_rate',
+    'elapsedtime',
+    'work',
+    'stroke_length',
+    'force',
+    'watts_avg',
+    'pace_avg',
+)
+
+#             magic, version, columns, block rows, rows, synced rows, start, closed
+Header = struct.Struct('<8sIIIQQdI')
+Rows = struct.Struct('<Q')
+ROWS_OFFSET = struct.calcsize('<8sIII')
+
+
+class SessionRecorder(object):
+    BlockRows = 4096  # about 7 minutes at 10 Hz
+    SyncInterval = 10.0
+
+    # -----------------------------------------------------------------------
+    # input     Path        the file, created
+    #           Columns     names of the snapshot values to record
+    # -----------------------------------------------------------------------
+    def __init__(self, Path, Columns=COLUMNS):
+        self.Path = Path
+        self.Columns = Columns
+        self.Rows = 0
+        self.Start = time.time()
+        self.Closed = False
+        self._row = struct.Struct('<d')
+        self._value = struct.Struct('<f')
+        self._blockbytes = self.BlockRows * (8 + 4 * len(Columns))
+        if Header.size + NAME_SIZE * len(Columns) > PAGE:
+            raise ValueError("too many columns for the header page")
+
+        self._fd = os.open(Path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self._fd, PAGE)
+        self._header = mmap.mmap(self._fd, PAGE)
+        for i, name in enumerate(Columns):
+            encoded = name.encode('utf-8')[:NAME_SIZE]
+            self._header[Header.size + i * NAME_SIZE:Header.size + i * NAME_SIZE + len(encoded)] = encoded
+        self.__WriteHeader(0, closed=0)
+        self._block = None
+        self._blocks = 0
+        self._synced = time.monotonic()
+
+    def __WriteHeader(self, synced, closed):
+        Header.pack_into(self._header, 0, MAGIC, VERSION, len(self.Columns), self.BlockRows, self.Rows, synced,
+                         self.Start, closed)
+
+    def __Grow(self):
+        if self._block is not None:
+            self._block.flush()
+            self._block.close()
+        offset = PAGE + self._blocks * self._blockbytes
+        os.ftruncate(self._fd, offset + self._blockbytes)
+        self._block = mmap.mmap(self._fd, self._blockbytes, offset=offset)
+        self._blocks += 1
+
+    def Append(self, values, At=None):
+        index = self.Rows % self.BlockRows
+        if index == 0:
+            self.__Grow()
+        block = self._block
+        self._row.pack_into(block, index * 8, time.time() if At is None else At)
+        offset = self.BlockRows * 8 + index * 4
+        pack_into = self._value.pack_into
+        for name in self.Columns:
+            value = values.get(name)
+            pack_into(block, offset, float('nan') if value is None else value)
+            offset += self.BlockRows * 4
+        self.Rows += 1
+        Rows.pack_into(self._header, ROWS_OFFSET, self.Rows)  # after the row itself
+        if time.monotonic() - self._synced >= self.SyncInterval:
+            self.Sync()
+
+    def Sync(self):
+        # data first, then the header that counts it
+        if self._block is not None:
+            self._block.flush()
+        self.__WriteHeader(self.Rows, closed=0)
+        self._header.flush()
+        self._synced = time.monotonic()
+
+    def Close(self):
+        if self.Closed:
+            return
+        self.Closed = True
+        if self._block is not None:
+            self._block.flush()
+            self._block.close()
+            self._block = None
+        self.__WriteHeader(self.Rows, closed=1)
+        self._header.flush()
+        self._header.close()
+        os.close(self._fd)
+
+
+class SessionReader(object):
+    def __init__(self, Path):
+        import numpy  # only the reader needs numpy
+        self._numpy = numpy
+        with open(Path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, columns, self.BlockRows, rows, self.SyncedRows, self.Start, self.Closed = \
+            Header.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{0} is not a session recording".format(Path))
+        self.Columns = tuple(
+            bytes(self._map[Header.size + i * NAME_SIZE:Header.size + (i + 1) * NAME_SIZE]).rstrip(b'\0').decode('utf-8')
+            for i in range(columns))
+        self._blockbytes = self.BlockRows * (8 + 4 * columns)
+        self._blocks = (len(self._map) - PAGE) // self._blockbytes
+        self.Rows = min(rows, self._blocks * self.BlockRows)
+        if not self.Closed:
+            time_column = self.Column('time')
+            written = numpy.flatnonzero(time_column)  # a power loss can leave rows counted but not written
+            self.Rows = int(written[-1]) + 1 if len(written) else 0
+
+    def __View(self, offset, dtype):
+        # the column across the blocks, shape (blocks, BlockRows), no copy
+        itemsize = self._numpy.dtype(dtype).itemsize
+        return self._numpy.ndarray((self._blocks, self.BlockRows), dtype=dtype, buffer=self._map,
+                                   offset=PAGE + offset, strides=(self._blockbytes, itemsize))
+
+    def Column(self, Name):
+        if Name == 'time':
+            view = self.__View(0, '<f8')
+        else:
+            view = self.__View(self.BlockRows * (8 + 4 * self.Columns.index(Name)), '<f4')
+        if self._blocks == 1:
+            return view[0, :self.Rows]  # a view into the file
+        return view.reshape(-1)[:self.Rows]  # the blocks are not adjacent per column, one copy
+
+    def Table(self):
+        return {name: self.Column(name) for name in ('time',) + self.Columns}
+
+    def Close(self):
+        # the arrays returned by Column() must be gone, they view the mapping
+        self._map.close()
+
+
+def main(in_bus, Directory):
+    # the recorder as an adapter: append every publish until the process ends
+    path = os.path.join(Directory, time.strftime('session-%Y%m%d-%H%M%S.prs'))
+    os.makedirs(Directory, exist_ok=True)
+    recorder = SessionRecorder(path)
+    lock = threading.Lock()  # atexit runs while the daemon worker may still append
+
+    def Finish():
+        with lock:
+            if recorder.Closed:
+                return
+            recorder.Close()
+        logger.info("session recorded, %d rows", recorder.Rows)
+        if recorder.Rows:
+            from ..analytics import sessionanalytics
+            try:
+                series = sessionanalytics.SessionSeries.FromRecording(path)
+                logger.info(sessionanalytics.Report(sessionanalytics.Analyse(series)))
+            except Exception:
+                logger.exception("analysis of %s failed", path)
+
+    atexit.register(Finish)
+    if threading.current_thread() is threading.main_thread():
+        # a process of the multi-process mode, terminated by the supervisor
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info("recording the session to %s", path)
+    snapshots = in_bus.subscribe()
+    try:
+        while True:
+            values = snapshots.wait_next(timeout=1.0)
+            if values is not None:
+                with lock:
+                    if recorder.Closed:
+                        return
+                    recorder.Append(values)
+    finally:
+        Finish()
+        atexit.unregister(Finish)  # a restart of the adapter registers its own
@@ -12,8 +12,14 @@ import time
 import serial
 import serial.tools.list_ports
 
+from ..metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+EVENTS = metrics.Counter('pirowflo_s4_events_total', "Events read from the S4 serial line", ('type',))
+POLL_CYCLE = metrics.Gauge('pirowflo_s4_poll_cycle_seconds', "Duration of the last round of S4 memory requests")
+RECONNECTS = metrics.Counter('pirowflo_s4_reconnects_total', "Reopens of the S4 serial port after a write error")
+
 MEMORY_MAP = {'055': {'type': 'total_distance_m', 'size': 'double', 'base': 16},
               '140': {'type': 'total_strokes', 'size': 'double', 'base': 16},
               '088': {'type': 'watts', 'size': 'double', 'base': 16},
@@ -115,23 +121,31 @@ SIZE_PARSE_MAP = {'single': lambda cmd: cmd[6:8],
 
 
 
-def find_port():
+def find_ports(Count=1):
+    # -----------------------------------------------------------------------
+    # input     Count   the S4 monitors to wait for
+    # returns   the paths of all the ports of S4 monitors, sorted, once at
+    #           least Count are connected
+    # -----------------------------------------------------------------------
     attempts = 0
     while True:
         attempts += 1
-        ports = serial.tools.list_ports.comports()
-        for (i, (path, name, _)) in enumerate(ports):
-            if "WR" in name:
-                logger.info("port found: %s" % path)
-                return path
+        ports = sorted(path for (path, name, _) in serial.tools.list_ports.comports() if "WR" in name)
+        if len(ports) >= max(Count, 1):
+            logger.info("port found: %s" % ", ".join(ports))
+            return ports
 
         #print("port not found retrying in 5s")
         if ((attempts - 1) % 360) == 0: # message every ~30 minutes
-          logger.warning("port not found in %d attempts; retrying every 5s",
-              attempts)
+          logger.warning("%d of %d ports found in %d attempts; retrying every 5s",
+              len(ports), max(Count, 1), attempts)
         time.sleep(5)
 
 
+def find_port():
+    return find_ports()[0]
+
+
 def build_daemon(target):
     t = threading.Thread(target=target)
     t.daemon = True
@@ -185,7 +199,7 @@ def event_from(line):
         elif cmd == ERROR_RESPONSE:  # If Waterrower responce with an error
             return build_event(type='error', raw=cmd)  # crate an event with the dict entry error and the raw command
         elif cmd[:2] == STROKE_START_RESPONSE:  # Pluse count count the amount of 25 teeth passed 25teeth passed = P1
-            print(cmd)
+            logger.debug('unknown stroke response %s', cmd)
         else:
             return None
     except Exception as e:
@@ -193,7 +207,12 @@ def event_from(line):
 
 
 class Rower(object):
-    def __init__(self, options=None):
+    # -----------------------------------------------------------------------
+    # input     Port    the serial port of the S4, None: the first one found
+    #                   (one Rower per S4 in hub mode)
+    # -----------------------------------------------------------------------
+    def __init__(self, options=None, Port=None):
+        self._port = Port
         self._callbacks = set()
         self._stop_event = threading.Event()
         self._demo = False
@@ -216,13 +235,13 @@ class Rower(object):
 
     def _find_serial(self):
         if not self._demo:
-            self._serial.port = find_port()
+            self._serial.port = self._port if self._port is not None else find_port()
         try:
             self._serial.open()
             #print("serial open")
             logger.info("serial open")
         except serial.SerialException as e:
-            print("serial open error waiting")
+            logger.warning("serial open error waiting")
             time.sleep(5)
             self._serial.close()
             self._find_serial()
@@ -258,9 +277,9 @@ class Rower(object):
             self._serial.write(str.encode(raw.upper() + '\r\n'))
             self._serial.flush()
         except Exception as e:
-            print(e)
             #print("Serial error try to reconnect")
-            logger.error("Serial error try to reconnect")
+            logger.error("Serial error try to reconnect: %s", e)
+            RECONNECTS.Inc()
             self.open()
 
     def start_capturing(self):
@@ -286,10 +305,12 @@ class Rower(object):
     def start_requesting(self):
         while not self._stop_event.is_set():
             if self._serial.isOpen():
+                cycle = time.monotonic()
                 for address in MEMORY_MAP:
                     if 'not_in_loop' not in MEMORY_MAP[address]:
                         self.request_address(address)
                         self._stop_event.wait(0.025)
+                POLL_CYCLE.Set(time.monotonic() - cycle)
             else:
                 self._stop_event.wait(0.1)
 
@@ -315,6 +336,8 @@ class Rower(object):
         self._callbacks.remove(cb)
 
     def notify_callbacks(self, event):
+        event['sensed'] = time.monotonic()  # start of the latency trace, see bus/latencytrace.py
+        EVENTS.Inc(event['type'])
         for cb in self._callbacks:
             cb(event)
 
@@ -11,6 +11,7 @@ import numpy
 from copy import deepcopy
 
 from . import waterrowerinterface
+from ..bus import latencytrace
 
 logger = logging.getLogger(__name__)
 '''
@@ -138,6 +139,9 @@ class DataLogger(object):
         if event['type'] == 'display_hr':
             self.hoursWR = event['value']
         self.TimeElapsedcreator()
+        if event['value'] is not None:
+            latencytrace.Stamp(self.WRValues, 'sensor', event['sensed'])
+            latencytrace.Stamp(self.WRValues, 'logger')
 
 
     def pulse(self,event):
@@ -205,27 +209,26 @@ class DataLogger(object):
     def SendToANT(self):
         self.ANTvalues = self.get_WRValues()
 
-def main(in_q, ble_out_q,ant_out_q):
-    S4 = waterrowerinterface.Rower()
+def main(in_q, out_bus, hrm_bus=None, Port=None):
+    S4 = waterrowerinterface.Rower(Port=Port) # Port: the S4 of this pipeline in hub mode, None the first one found
     S4.open()
     S4.reset_request()
     WRtoBLEANT = DataLogger(S4)
+    HeartRate = hrm_bus.subscribe() if hrm_bus is not None else None
     logger.info("Waterrower Ready and sending data to BLE and ANT Thread")
     while True:
         if not in_q.empty():
             ResetRequest_ble = in_q.get()
-            print(ResetRequest_ble)
+            logger.info("reset requested: %s", ResetRequest_ble)
             S4.reset_request()
         else:
             pass
-        WRtoBLEANT.SendToBLE()
-        WRtoBLEANT.SendToANT()
-        ble_out_q.append(WRtoBLEANT.BLEvalues)
-        ant_out_q.append(WRtoBLEANT.ANTvalues) # here it is a class deque
-        #print(type(ant_out_q))
-        #print(ant_out_q)
+        WRtoBLEANT.SendToBLE() # a fresh copy, the consumers share it
+        if HeartRate is not None and WRtoBLEANT.BLEvalues['heart_rate'] == 0: # no chest belt on the S4, take the ANT+ heart rate strap
+            WRtoBLEANT.BLEvalues['heart_rate'] = HeartRate.latest() or 0
+        latencytrace.Stamp(WRtoBLEANT.BLEvalues, 'publish')
+        out_bus.publish(WRtoBLEANT.BLEvalues) # one publish for BLE, ANT+ and any other consumer
         #logger.info(WRtoBLEANT.BLEvalues)
-        #ant_out_q.append(WRtoBLEANT.ANTvalues)
         time.sleep(0.1)
 
 
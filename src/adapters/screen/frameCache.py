@@ -0,0 +1,44 @@
+'''
+the frameCache replaces the canvas of luma.core for the screens. The screen loop calls the screen every time it wakes
+up; the screen only draws when what it shows changed (changed), and the frame is only sent over SPI to the display
+when it differs from the one the display shows
+'''
+
+import hashlib
+from contextlib import contextmanager
+from PIL import Image, ImageDraw
+
+
+class frameCache():
+    def __init__(self):
+        self.lastcontent = None # what the screen drawn last shows
+        self.lastframe = None # hash of the frame the display shows
+        self.pushed = 0 # frames sent to the display
+        self.skipped = 0 # frames drawn but unchanged
+
+    def changed(self, content):
+        # content: the values a screen shows e.g. (screen, cursor, status); False when they are on the display already
+        if content == self.lastcontent:
+            return False
+        self.lastcontent = content
+        return True
+
+    @contextmanager
+    def canvas(self, device):
+        # same use as luma.core.render.canvas: with frames.canvas(device) as draw:
+        image = Image.new(device.mode, device.size)
+        yield ImageDraw.Draw(image)
+        frame = hashlib.sha1(image.tobytes()).digest()
+        if frame != self.lastframe:
+            device.display(image)
+            self.lastframe = frame
+            self.pushed += 1
+        else:
+            self.skipped += 1
+
+    def invalidate(self):
+        # the display was changed without the cache, the next frame is drawn and sent in any case
+        self.lastcontent = None
+        self.lastframe = None
+
+frames = frameCache()
@@ -2,6 +2,8 @@ import configparser
 import pathlib
 import time
 import subprocess
+import threading
+from PIL import ImageFont
 
 class globalParameterBuilder():
     def __init__(self):
@@ -14,6 +16,8 @@ class globalParameterBuilder():
         self.blackscreen = False
         self.lastbuttonpressed = time.time()
         self.blackscreen = False
+        self.changed = False # set by notifyChange, the screen loop draws again
+        self.changedCondition = threading.Condition()
         ########
 
         self.loggerconfigpath = str(pathlib.Path(__file__).parent.absolute()) + '/' + 'settings.ini'
@@ -26,12 +30,14 @@ class globalParameterBuilder():
         #get ipaddress
 
         self.ipaddr = ''
+        self.lastipaddrcheck = 0 # no ip address yet: look for one every 30 s, not on every draw
 
         #Set fonts
         print("Loading font configuration")
         self.font_icons = self.config.get("Fonts", "icons") # those are for icons fonts "Font awesome for example
         self.font_text = self.config.get("Fonts", "text") # normal text must be open source for the project
         #self.font_clock = self.config.get("Fonts", "clock") # normal text must be open source for the project
+        self.fonts = {} # (font file, size): loaded font, a TrueType font is loaded once and not on every draw
 
         #Set PiRowFlo setting
         self.SmartRowOn = int(self.config.get("PiRowFloSettings", "SmartRowOn"))
@@ -49,6 +55,28 @@ class globalParameterBuilder():
         self.activemenu = screenid
         self.counter = counter # position of the curser in the menu page
         self.oldcounter = -1
+        self.notifyChange()
+
+    def notifyChange(self):
+        # wake up the screen loop, called by the button callbacks
+        with self.changedCondition:
+            self.changed = True
+            self.changedCondition.notify_all()
+
+    def waitForChange(self, timeout):
+        # returns True when notifyChange was called, False after timeout seconds
+        with self.changedCondition:
+            if not self.changed:
+                self.changedCondition.wait(timeout)
+            changed = self.changed
+            self.changed = False
+            return changed
+
+    def getFont(self, font, size):
+        key = (font, size)
+        if key not in self.fonts:
+            self.fonts[key] = ImageFont.truetype(font, size=size)
+        return self.fonts[key]
 
     def safePiRowFlosettings(self):
         self.config.set("PiRowFloSettings", "SmartRowOn", str(self.SmartRowOn))
@@ -74,8 +102,12 @@ class globalParameterBuilder():
             self.pirowflocmd = ["supervisorctl", "start", "pirowflo_S4_Monitor_AntPlus_only"]
 
     def setipaddress(self):
-        cmd = "hostname -I | cut -d\' \' -f1"
-        ipaddr = subprocess.check_output(cmd, shell = True)
-        self.ipaddr = ipaddr.decode('UTF-8')
+        # the first address of hostname -I, without a shell; no address yet (no network at boot) is tried again after
+        # 30 s
+        if time.time() - self.lastipaddrcheck < 30:
+            return
+        self.lastipaddrcheck = time.time()
+        ipaddr = subprocess.check_output(["hostname", "-I"]).decode('UTF-8').split()
+        self.ipaddr = ipaddr[0] if ipaddr else ''
 
 globalParameters = globalParameterBuilder()
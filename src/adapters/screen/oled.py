@@ -1,5 +1,4 @@
 import threading
-from time import sleep
 from globalParameters import globalParameters
 from setupHandler import device, shutdown
 import time
@@ -8,6 +7,7 @@ import screens.mainmenu
 import screens.pirowflosettings
 import screens.buttonhelp
 import screens.emptyscreen
+import screens.livemetrics
 
 
 
@@ -32,11 +32,22 @@ grace = Graceful()
 
 while grace.run:
     try:
-        sleep(0.2)
-
-        if time.time() - globalParameters.lastbuttonpressed >= 10:
+        # sleep until a button callback notifies a change, at the latest until the screen goes black and once a second
+        # for the status and the ip address. The screens draw every time, a frame goes to the display only when it
+        # changed (frameCache)
+        timeout = 1.0
+        rowing = globalParameters.activemenu == 3 and screens.livemetrics.rowing()
+        if rowing:
+            timeout = screens.livemetrics.FRAME # the live page at its frame budget, it stays on while rowing
+        elif globalParameters.blackscreen == False:
+            timeout = min(timeout, max(globalParameters.lastbuttonpressed + 10 - time.time(), 0))
+        globalParameters.waitForChange(timeout)
+
+        if time.time() - globalParameters.lastbuttonpressed >= 10 and not rowing:
             globalParameters.blackscreen = True
             screens.emptyscreen.draw(device)
+            if globalParameters.activemenu == 3:
+                screens.livemetrics.receive() # new rowing values turn the live page on again
 
 
         elif globalParameters.activemenu == 0:
@@ -48,6 +59,12 @@ while grace.run:
         elif globalParameters.activemenu == 2:
             screens.buttonhelp.draw(device)
 
+        elif globalParameters.activemenu == 3:
+            screens.livemetrics.draw(device)
+
+        if globalParameters.activemenu != 3:
+            screens.livemetrics.stop() # the rowing values are only received for the live page
+
         #Send trigger event to active screen
         if globalParameters.trigger == True:
             globalParameters.trigger = False
@@ -57,9 +74,8 @@ while grace.run:
                 if globalParameters.activemenu == 0: screens.mainmenu.trigger()
                 elif globalParameters.activemenu == 1: screens.pirowflosettings.trigger()
                 elif globalParameters.activemenu == 2: screens.buttonhelp.trigger()
+                elif globalParameters.activemenu == 3: screens.livemetrics.trigger()
 
-
-        sleep(0.2)
     except KeyboardInterrupt:
         print("Exiting...")
         break
@@ -1,17 +1,15 @@
-from PIL import ImageFont
-from luma.core.render import canvas
+from frameCache import frames
 from globalParameters import globalParameters
 
 
 # Main menu (screenid: 1)
 def draw(device):
     #faicons = ImageFont.truetype(globalParameters.font_icons, size=18)
-    font = ImageFont.truetype(globalParameters.font_text, size=10)
-    fontawesome = ImageFont.truetype(globalParameters.font_icons, size=12)
+    font = globalParameters.getFont(globalParameters.font_text, 10)
+    fontawesome = globalParameters.getFont(globalParameters.font_icons, 12)
     counter = globalParameters.counter
-    if counter != globalParameters.oldcounter and counter <= 3 and counter >= 0:
-        globalParameters.oldcounter = counter
-        with canvas(device) as draw:
+    if counter <= 3 and counter >= 0 and frames.changed(("buttonhelp",)):
+        with frames.canvas(device) as draw:
             # rectangle as selection marker
             # if counter < 3:  # currently 3 icons in one row
             #     x = 2
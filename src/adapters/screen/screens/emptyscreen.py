@@ -1,11 +1,13 @@
-from luma.core.render import canvas
+from frameCache import frames
 from globalParameters import globalParameters
 
 
 # display off (screenid: 5)
 def draw(device):
 
-    device.clear()
+    if frames.changed(("emptyscreen",)):
+        with frames.canvas(device): # a blank frame, sent once and not on every loop
+            pass
 
     # can be different depending on the type of display, look at the luma.oled api documentation
     #device.hide()
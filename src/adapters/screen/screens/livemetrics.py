@@ -0,0 +1,79 @@
+import sys
+import pathlib
+import time
+from frameCache import frames
+from globalParameters import globalParameters
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.parent.parent.absolute())) # src, for the adapters package
+from adapters.local import localtelemetry
+
+'''
+live rowing values sent by the rowing process (waterrowerthreads.py --local) over a unix socket. The socket is only
+bound while this screen is shown, the rowing process drops the values when nobody listens. Drawn at most every FRAME
+seconds and only when a shown value changed
+'''
+
+FRAME = 0.2 # the frame budget, 5 frames per second
+IDLE = 10 # seconds without new values before the screen may go black
+
+receiver = None
+values = None
+lastreceived = 0
+
+def clock(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "%d:%02d" % (seconds // 60, seconds % 60)
+
+def rowing():
+    # new values came in the last IDLE seconds
+    return receiver is not None and time.monotonic() - lastreceived < IDLE
+
+def stop():
+    # the screen is not shown anymore
+    global receiver
+    if receiver is not None:
+        receiver.Close()
+        receiver = None
+
+def receive():
+    # the newest values sent since the last call, the socket is bound on the first call
+    global receiver, values, lastreceived
+    if receiver is None:
+        try:
+            receiver = localtelemetry.LocalReceiver()
+        except OSError as e:
+            print("live metrics not available: %s" % e) # another screen is bound to the address
+            return
+    packet = receiver.Latest()
+    if packet is not None:
+        values = packet.values
+        lastreceived = time.monotonic()
+
+# live metrics (screenid: 3)
+def draw(device):
+    receive()
+
+    font = globalParameters.getFont(globalParameters.font_text, 10)
+    fontbig = globalParameters.getFont(globalParameters.font_text, 14)
+    if values is None:
+        content = ("livemetrics",)
+    else:
+        content = ("livemetrics", values['instantaneous pace'], values['watts'], values['stroke_rate'],
+                   values['total_distance_m'], values['elapsedtime'])
+    if frames.changed(content):
+        with frames.canvas(device) as draw:
+            draw.text((5, 2), text="------Live------", font=font, fill="white")
+            if values is None:
+                draw.text((5, 24), text="waiting for PiRowFlo", font=font, fill="white")
+            else:
+                pace = values['instantaneous pace']
+                draw.text((0, 14), text=(clock(pace) if pace else "-:--") + " /500m", font=fontbig, fill="white")
+                draw.text((0, 32), text="%d W" % values['watts'], font=font, fill="white")
+                draw.text((64, 32), text="%d spm" % (values['stroke_rate'] // 2), font=font, fill="white")
+                draw.text((0, 46), text="%d m" % values['total_distance_m'], font=font, fill="white")
+                draw.text((64, 46), text=clock(values['elapsedtime']), font=font, fill="white")
+
+def trigger():
+    globalParameters.setScreen(0)
@@ -1,5 +1,4 @@
-from PIL import ImageFont
-from luma.core.render import canvas
+from frameCache import frames
 from globalParameters import globalParameters
 
 pirowflosettingid = 1
@@ -10,12 +9,11 @@ def draw(device):
         globalParameters.setipaddress()
 
     #faicons = ImageFont.truetype(globalParameters.font_icons, size=18)
-    font = ImageFont.truetype(globalParameters.font_text, size=10)
-    fontawesome = ImageFont.truetype(globalParameters.font_icons, size=15)
+    font = globalParameters.getFont(globalParameters.font_text, 10)
+    fontawesome = globalParameters.getFont(globalParameters.font_icons, 15)
     counter = globalParameters.counter
-    if counter != globalParameters.oldcounter and counter <= 2 and counter >= 0:
-        globalParameters.oldcounter = counter
-        with canvas(device) as draw:
+    if counter <= 2 and counter >= 0 and frames.changed(("mainmenu", counter, globalParameters.status, globalParameters.ipaddr)):
+        with frames.canvas(device) as draw:
             if counter == 0:
                 x = 108
                 y = 9
@@ -37,7 +35,7 @@ def draw(device):
             draw.text((105, 60), text="|", font=font, fill="white")
             draw.text((110, 10), text="\uf04b", font=fontawesome, fill="white")
             draw.text((110, 28), text="\uf1de", font=fontawesome, fill="white")
-            draw.text((110, 48), text="\uf019", font=fontawesome, fill="white")
+            draw.text((110, 48), text="\uf080", font=fontawesome, fill="white") # live metrics
             draw.text((0, 14), text="Status: "+ globalParameters.status, font=font, fill="white")
             # draw.text((0, 26), text="BLE: Online", font=font, fill="white")
             # draw.text((0, 40), text="ANT+: Offline", font=font, fill="white")
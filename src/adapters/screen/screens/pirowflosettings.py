@@ -1,5 +1,4 @@
-from PIL import ImageFont
-from luma.core.render import canvas
+from frameCache import frames
 from globalParameters import globalParameters
 
 pirowflosettingid = 1
@@ -8,12 +7,11 @@ mincounter = 0
 # Main menu (screenid: 1)
 def draw(device):
     #faicons = ImageFont.truetype(globalParameters.font_icons, size=18)
-    font = ImageFont.truetype(globalParameters.font_text, size=10)
-    fontawesome = ImageFont.truetype(globalParameters.font_icons, size=10)
+    font = globalParameters.getFont(globalParameters.font_text, 10)
+    fontawesome = globalParameters.getFont(globalParameters.font_icons, 10)
     counter = globalParameters.counter
-    if counter != globalParameters.oldcounter and counter <= maxcounter and counter >= mincounter:
-        globalParameters.oldcounter = counter
-        with canvas(device) as draw:
+    if counter <= maxcounter and counter >= mincounter and frames.changed(("pirowflosettings", counter, globalParameters.SmartRowOn, globalParameters.S4MonitorOn, globalParameters.BluetoothOn, globalParameters.AntplusOn)):
+        with frames.canvas(device) as draw:
             if counter == 0:
                 x = 0
                 y = 10
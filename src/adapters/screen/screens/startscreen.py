@@ -1,12 +1,11 @@
-from PIL import ImageFont
-from luma.core.render import canvas
+from frameCache import frames
 from globalParameters import globalParameters
 
 #print(globalParameters.font_icons)
 #Functions for startscreen
 def draw(device):
-    with canvas(device) as draw:
-        font = ImageFont.truetype(globalParameters.font_text, size=12)
+    with frames.canvas(device) as draw:
+        font = globalParameters.getFont(globalParameters.font_text, 12)
         # fontawesome = ImageFont.truetype(globalParameters.font_icons, size=35)
 
         draw.text((10, 3), text="Starting", font=font, fill="white")
@@ -10,6 +10,7 @@ try:
 except:
     pass
 from globalParameters import globalParameters
+from supervisorClient import supervisorClient
 import threading
 from luma.oled.device import sh1106
 from luma.core.interface.serial import spi
@@ -51,18 +52,26 @@ GPIO.setup(joystickbutton, GPIO.IN, GPIO.PUD_UP)
 
 Lockbutton = threading.Lock()  # create lock for rotary switch
 
+def supervisor_changed(states):
+    # the worker thread of the supervisorClient got new states from supervisord
+    if globalParameters.currentstarted is None:
+        for name, state in states.items():
+            if name.startswith("pirowflo_") and state == "RUNNING": # started before the screen, e.g. on the web page
+                globalParameters.currentstarted = ["supervisorctl", "start", name]
+    if globalParameters.currentstarted is not None:
+        globalParameters.status = states.get(globalParameters.currentstarted[2], "unknown").lower()
+    globalParameters.notifyChange()
+
+supervisor = supervisorClient(globalParameters.config.get("Supervisor", "url", fallback="http://127.0.0.1:9001/RPC2"),
+                              supervisor_changed)
+
 def button_start_callback(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
     globalParameters.createPiRowFlocmd()
     globalParameters.currentstarted = globalParameters.pirowflocmd
-    globalParameters.activemenu = 0
-    globalParameters.setScreen(0)
-    result = subprocess.run(globalParameters.pirowflocmd,capture_output=True)
-    status = str(result.stdout)
-    status = status[2:-3].strip()
-    status = status.split(' ')
-    globalParameters.status = status[1]
+    supervisor.start(globalParameters.pirowflocmd[2]) # returns at once, the status follows with supervisor_changed
+    globalParameters.status = "starting"
     globalParameters.activemenu = 0
     globalParameters.setScreen(0)
     Lockbutton.release()
@@ -71,18 +80,10 @@ def button_stop_callback(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
     if globalParameters.currentstarted is not None:
-        globalParameters.activemenu = 0
-        globalParameters.setScreen(0)
-        result = subprocess.run(['supervisorctl','stop',globalParameters.currentstarted[2]],capture_output=True)
-        status = str(result.stdout)
-        status = status[2:-3].strip()
-        status = status.split(' ')
-        globalParameters.status = str(status[1])
-        globalParameters.activemenu = 0
-        globalParameters.setScreen(0)
-    else:
-        globalParameters.activemenu = 0
-        globalParameters.setScreen(0)
+        supervisor.stop(globalParameters.currentstarted[2])
+        globalParameters.status = "stopping"
+    globalParameters.activemenu = 0
+    globalParameters.setScreen(0)
     Lockbutton.release()
 
 def button_resetpi_callback(channel):
@@ -101,13 +102,14 @@ def JoyButtonmenuaction(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
     globalParameters.trigger = True
+    globalParameters.notifyChange() # wake up the screen loop
     Lockbutton.release()
 
 def menuback(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
     if globalParameters.activemenu < 1:
-         globalParameters.activemenu = 2# back the main menu
+         globalParameters.activemenu = 3# back the main menu
     else:
         globalParameters.activemenu -= 1
     globalParameters.setScreen(globalParameters.activemenu)
@@ -116,7 +118,7 @@ def menuback(channel):
 def menuforward(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
-    if globalParameters.activemenu > 1:
+    if globalParameters.activemenu > 2:
         globalParameters.activemenu = 0
     else:
         globalParameters.activemenu += 1 # back the main menu
@@ -127,12 +129,14 @@ def menuup(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
     globalParameters.counter -= 1
+    globalParameters.notifyChange() # wake up the screen loop
     Lockbutton.release()
 
 def menudown(channel):
     Lockbutton.acquire()
     globalParameters.lastbuttonpressed = time.time()
     globalParameters.counter += 1 # the menu's always start
+    globalParameters.notifyChange() # wake up the screen loop
     Lockbutton.release()
 
 print("Attaching interrupts")
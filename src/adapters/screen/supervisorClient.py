@@ -0,0 +1,76 @@
+'''
+the supervisorClient starts and stops the PiRowFlo programs of supervisord for the buttons over the XML-RPC interface
+of supervisord (inet_http_server, port 9001). Every call runs in one worker thread with one HTTP connection kept open,
+a button callback only queues the call and returns at once. The state of the programs is cached, the screen reads it
+without asking supervisord; it is refreshed after every call and every refresh seconds
+'''
+
+import queue
+import threading
+import xmlrpc.client
+
+ALREADY_STARTED = 60 # supervisord faults that leave the program in the state asked for
+NOT_RUNNING = 70
+
+
+class supervisorClient():
+    def __init__(self, url="http://127.0.0.1:9001/RPC2", onchange=None, refresh=5.0):
+        self.url = url
+        self.onchange = onchange # called with the states from the worker thread, after a call or a change
+        self.refresh = refresh
+        self.states = {} # program name: state name of supervisord e.g. 'RUNNING', 'STOPPED', empty while not reachable
+        self.calls = 0
+        self.errors = 0
+        self._proxy = None
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='supervisorclient')
+        self._worker.daemon = True
+        self._worker.start()
+
+    def start(self, name):
+        self._requests.put(('startProcess', name))
+
+    def stop(self, name):
+        self._requests.put(('stopProcess', name))
+
+    def state(self, name):
+        # the cached state of the program, 'UNKNOWN' before supervisord answered
+        return self.states.get(name, 'UNKNOWN')
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join(timeout=5)
+
+    def _call(self, method, *args):
+        if self._proxy is None:
+            self._proxy = xmlrpc.client.ServerProxy(self.url) # the connection stays open between the calls
+        self.calls += 1
+        return getattr(self._proxy.supervisor, method)(*args)
+
+    def _run(self):
+        request = ('getAllProcessInfo',)
+        while True:
+            try:
+                if request[0] != 'getAllProcessInfo':
+                    try:
+                        self._call(request[0], request[1], True) # wait until the program started or stopped
+                    except xmlrpc.client.Fault as e:
+                        if e.faultCode not in (ALREADY_STARTED, NOT_RUNNING):
+                            print("supervisor %s %s: %s" % (request[0], request[1], e.faultString))
+                states = {info['name']: info['statename'] for info in self._call('getAllProcessInfo')}
+            except (OSError, xmlrpc.client.Error) as e:
+                if self.errors == 0 or self.states: # once, not every refresh
+                    print("supervisor not reachable: %s" % e)
+                self.errors += 1
+                self._proxy = None # connect again for the next call
+                states = {}
+            if states != self.states or request[0] != 'getAllProcessInfo': # a button waits for the answer
+                self.states = states
+                if self.onchange is not None:
+                    self.onchange(states)
+            try:
+                request = self._requests.get(timeout=self.refresh)
+            except queue.Empty:
+                request = ('getAllProcessInfo',)
+            if request is None:
+                return
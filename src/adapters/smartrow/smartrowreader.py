@@ -4,8 +4,12 @@ import subprocess
 import threading
 from time import sleep
 
+from ..metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+CONNECTS = metrics.Counter('pirowflo_smartrow_connects_total', "Connection attempts to the SmartRow by result", ('result',))
+
 #This SDK requires you to create subclasses of gatt.DeviceManager and gatt.Device. The other two classes gatt.Service and gatt.Characteristic are not supposed to be subclassed.
 
 #The SDK entry point is the DeviceManager class. Check the following example to dicover any Bluetooth Low Energy device nearby.
@@ -29,15 +33,18 @@ class SmartRow(gatt.Device):
       
     def connect_succeeded(self):
         super().connect_succeeded()
+        CONNECTS.Inc('succeeded')
         logger.info("Connected to [{}]".format(self.mac_address))
 
 
     def connect_failed(self, error):
         super().connect_failed(error)
+        CONNECTS.Inc('failed')
         logger.info("Connection failed [{}]: {}".format(self.mac_address, error))
 
     def disconnect_succeeded(self):
         super().disconnect_succeeded()
+        CONNECTS.Inc('disconnected')
         logger.info("Disconnected [{}]".format(self.mac_address))
 
     def find_service(self, uuid):
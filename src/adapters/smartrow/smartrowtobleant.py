@@ -8,6 +8,7 @@ import time
 from copy import deepcopy
 
 from . import smartrowreader
+from ..bus import latencytrace
 
 logger = logging.getLogger(__name__)
 sr_passthrough_q = None
@@ -88,7 +89,7 @@ class DataLogger():
             cksum=f'{(sum(ord(ch) for ch in key)):0>4X}'
 
             if cksum[-2:] == checksum:
-                print("Checksum GOOD")
+                logger.debug("Checksum GOOD")
                 a=(int(keylock[11:15],16) * 17923) // 256
                 result=f'{a:0>6x}'[2:]
                 
@@ -97,13 +98,13 @@ class DataLogger():
                     response.append(ord(c))
                 response.append(0x0d)
                 
-                print(response)
+                logger.debug("challenge response %s", response)
                 return response
             else:
-                print("Checksum BAD")
+                logger.warning("SmartRow challenge checksum BAD")
 
         except Exception as e:
-            print(e)
+            logger.error("SmartRow challenge failed: %s", e)
 
         # return 0x23 on failure
         return [0x23]
@@ -126,12 +127,12 @@ class DataLogger():
             return r
 
         except Exception as e:
-            print(e)
-            print(event)
+            logger.warning("could not decrypt SmartRow V3 message %r: %s", event, e)
             return event
 
     def on_row_event(self, event):
         global sr_passthrough_q
+        sensed = time.monotonic()
 
         #pretty=event.replace('\r', '')
         #print('-->' + str(pretty))
@@ -146,15 +147,14 @@ class DataLogger():
                 key = self.calculate_challenge_response(event)
                 self.send_challenge_response(key)
             except Exception as e:
-                print("Exception in KEYLOCK event!")
-                print(str(e))
+                logger.error("Exception in KEYLOCK event! %s", e)
 
         # Un-obfuscate SmartRow V3 distance data
         if self.SmartRowV3 is True:
             event = self.parse_v3_decrypt(event)
 
         if (sr_passthrough_q is not None):
-            sr_passthrough_q.append(event)
+            sr_passthrough_q.put(event) # wakes the passthrough, no polling
 
         try:
             if event[0] == self.ENERGIE_KCAL_MESSAGE:
@@ -230,10 +230,13 @@ class DataLogger():
 
             else:
                 self._rower_interface.characteristic_write_value(struct.pack("<b", 0x23))
+                return
+
+            latencytrace.Stamp(self.WRValues, 'sensor', sensed)
+            latencytrace.Stamp(self.WRValues, 'logger')
 
         except Exception as e:
-            print(e)
-            print(event)
+            logger.warning("could not parse SmartRow message %r: %s", event, e)
 
         #print(self.WRValues)
 
@@ -257,7 +260,7 @@ def heartbeat(sr):
         sleep(1)
 
 
-def main(in_q, ble_out_q, ant_out_q, passtrhu_q = None, fake_sr_event = None):
+def main(in_q, out_bus, passtrhu_q = None, fake_sr_event = None, hrm_bus = None):
     # this starts discovery, calls manager.run() and returns manager.smartrowmac
     # 
     global sr_passthrough_q
@@ -273,6 +276,7 @@ def main(in_q, ble_out_q, ant_out_q, passtrhu_q = None, fake_sr_event = None):
 
     smartrow = smartrowreader.SmartRow(mac_address=macaddresssmartrower, manager=manager)
     SRtoBLEANT = DataLogger(smartrow)
+    HeartRate = hrm_bus.subscribe() if hrm_bus is not None else None
 
     BC = threading.Thread(target=connectSR, args=(manager,smartrow))
     BC.daemon = True
@@ -283,7 +287,7 @@ def main(in_q, ble_out_q, ant_out_q, passtrhu_q = None, fake_sr_event = None):
 
     logger.info("SmartRow Ready and sending data to BLE and ANT Thread")
 
-    print("starting heart beat")
+    logger.info("starting heart beat")
     HB = threading.Thread(target=heartbeat, args=([smartrow]))
     HB.daemon = True
     HB.start()
@@ -300,12 +304,15 @@ def main(in_q, ble_out_q, ant_out_q, passtrhu_q = None, fake_sr_event = None):
     while True:
         if not in_q.empty():
             ResetRequest_ble = in_q.get()
-            print(ResetRequest_ble)
+            logger.info("reset requested: %s", ResetRequest_ble)
             reset(smartrow)
         else:
             pass
-        ble_out_q.append(SRtoBLEANT.WRValues)
-        ant_out_q.append(SRtoBLEANT.WRValues)
+        WRValues = dict(SRtoBLEANT.WRValues) # the DataLogger keeps updating its dict, the consumers share this copy
+        if HeartRate is not None: # the SmartRow has no heart rate, take the ANT+ heart rate strap
+            WRValues['heart_rate'] = HeartRate.latest() or 0
+        latencytrace.Stamp(WRValues, 'publish')
+        out_bus.publish(WRValues) # one publish for BLE, ANT+ and any other consumer
 
         sleep(0.1)
 
@@ -0,0 +1,53 @@
+# ---------------------------------------------------------------------------
+# Registry of the adapters of waterrowerthreads
+# ---------------------------------------------------------------------------
+# The adapters pull in heavy libraries (dbus and GLib for BLE, gatt for the
+# SmartRow, pyusb for Ant+, pyserial and numpy for the S4). They are only
+# imported when the command line selects them, by the name the supervisor
+# knows them by:
+#
+#   s4    -i s4     S4 monitor over USB, s4-1, s4-2 ... the others of --hub
+#   sr    -i sr     SmartRow over BLE
+#   srpt  -i sr     SmartRow passthrough (without -b)
+#   ble   -b        BLE FTMS server
+#   ant   -a        Ant+ FE-C sender
+#   udp   -u        UDP multicast telemetry
+#   rec   --record  session recorder
+#   fit   --fit     FIT export of the sessions
+#   live  --live    WebSocket / SSE telemetry server
+#   local --local   local telemetry to the OLED screen
+#
+# Load() imports an adapter once, later calls return the same module.
+# ---------------------------------------------------------------------------
+#
+
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ADAPTERS = {
+    's4': 'adapters.s4.wrtobleant',
+    'sr': 'adapters.smartrow.smartrowtobleant',
+    'srpt': 'adapters.fakesmartrow.fakesmartrowble',
+    'ble': 'adapters.ble.waterrowerble',
+    'ant': 'adapters.ant.waterrowerant',
+    'udp': 'adapters.udp.udptelemetry',
+    'rec': 'adapters.recorder.sessionrecorder',
+    'fit': 'adapters.fit.fitexporter',
+    'live': 'adapters.live.liveserver',
+    'local': 'adapters.local.localtelemetry',
+}
+
+_loaded = {}
+
+
+def Load(Name):
+    module = _loaded.get(Name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(ADAPTERS[Name])
+        _loaded[Name] = module
+        logger.debug("adapter %s imported in %.0f ms", Name, (time.perf_counter() - start) * 1000)
+    return module
@@ -0,0 +1,175 @@
+# ---------------------------------------------------------------------------
+# Supervisor of the adapter threads (or processes) of waterrowerthreads
+# ---------------------------------------------------------------------------
+# Every adapter runs in a worker; a watcher thread per worker joins it and
+# reports the exit on a queue the moment the worker ends, so a dead adapter
+# is noticed at once instead of on the next round of join(timeout=10).
+# What happens then depends on the policy of the adapter:
+#
+#   RESTART  start it again after a backoff that doubles with every quick
+#            failure (1 s, 2 s, 4 s ... 60 s); the other adapters keep
+#            running, so the rowing session and its values survive
+#   IGNORE   log it, the program runs on without it
+#   EXIT     stop the program, like before
+#
+# Exceptions of an adapter are logged with their traceback. Per adapter the
+# number of starts, the restarts, the uptime and the last exit are kept and
+# logged on every exit and on shutdown.
+# ---------------------------------------------------------------------------
+#
+
+import logging
+import queue
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+RESTART = 'restart'
+IGNORE = 'ignore'
+EXIT = 'exit'
+
+
+class Adapter(object):
+    def __init__(self, Name, Target, Args, Policy):
+        self.Name = Name
+        self.Target = Target
+        self.Args = Args
+        self.Policy = Policy
+        self.Worker = None
+        self.Generation = 0  # increases with every start, a late exit of an old worker is ignored
+        self.Starts = 0
+        self.Restarts = 0
+        self.Started = None  # time.monotonic() of the running worker, None when not running
+        self.Uptime = 0.0  # seconds, all finished runs
+        self.LastExit = None  # (time.time(), seconds the run lasted)
+        self.Backoff = 0
+        self.RestartAt = None  # time.monotonic() of the scheduled restart
+
+    def Running(self):
+        return self.Started is not None
+
+    def Status(self):
+        uptime = self.Uptime
+        if self.Started is not None:
+            uptime += time.monotonic() - self.Started
+        return {
+            'running': self.Running(),
+            'starts': self.Starts,
+            'restarts': self.Restarts,
+            'uptime': uptime,
+            'last_exit': self.LastExit,
+        }
+
+
+class AdapterSupervisor(object):
+    BackoffInitial = 1.0
+    BackoffMax = 60.0
+    StableAfter = 60.0  # a run longer than this resets the backoff
+
+    # -----------------------------------------------------------------------
+    # input     Worker      threading.Thread or multiprocessing Process class
+    #           WorkerInit  called with the adapter name in the worker before
+    #                       the adapter, e.g. to start a thread in a process
+    # -----------------------------------------------------------------------
+    def __init__(self, Worker=threading.Thread, WorkerInit=None):
+        self.Worker = Worker
+        self.WorkerInit = WorkerInit
+        self.Adapters = {}
+        self.Failed = None  # name of the EXIT adapter that ended
+        self._exits = queue.Queue()
+
+    def Add(self, Name, Target, Args=(), Policy=RESTART):
+        self.Adapters[Name] = Adapter(Name, Target, Args, Policy)
+
+    def Start(self):
+        for adapter in self.Adapters.values():
+            self.__Start(adapter)
+
+    # -----------------------------------------------------------------------
+    # S u p e r v i s e
+    # -----------------------------------------------------------------------
+    # function  wait at most timeout seconds for an adapter to exit, handle
+    #           the exits and start the adapters whose backoff is over
+    #
+    # returns   False when the program has to stop (an EXIT adapter ended)
+    # -----------------------------------------------------------------------
+    def Supervise(self, timeout=1.0):
+        now = time.monotonic()
+        due = [a.RestartAt for a in self.Adapters.values() if a.RestartAt is not None]
+        if due:
+            timeout = max(0, min(timeout, min(due) - now))
+        try:
+            name, generation = self._exits.get(timeout=timeout)
+            self.__Exited(self.Adapters[name], generation)
+            while True:
+                name, generation = self._exits.get_nowait()
+                self.__Exited(self.Adapters[name], generation)
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        for adapter in self.Adapters.values():
+            if adapter.RestartAt is not None and adapter.RestartAt <= now:
+                adapter.RestartAt = None
+                adapter.Restarts += 1
+                self.__Start(adapter)
+        return self.Failed is None
+
+    def Status(self):
+        return {name: adapter.Status() for name, adapter in self.Adapters.items()}
+
+    def LogStatus(self):
+        for name, status in self.Status().items():
+            logger.info("adapter %s: %s, %d starts, %d restarts, uptime %.0f s", name,
+                        "running" if status['running'] else "stopped", status['starts'], status['restarts'], status['uptime'])
+
+    def __Start(self, adapter):
+        adapter.Generation += 1
+        adapter.Starts += 1
+        adapter.Started = time.monotonic()
+        adapter.Worker = self.Worker(target=_Run, args=(adapter.Name, adapter.Target, adapter.Args, self.WorkerInit), name=adapter.Name)
+        adapter.Worker.daemon = True
+        adapter.Worker.start()
+        watcher = threading.Thread(target=self.__Watch, args=(adapter.Name, adapter.Worker, adapter.Generation),
+                                   name='watch-' + adapter.Name)
+        watcher.daemon = True
+        watcher.start()
+        logger.info("adapter %s started (start %d)", adapter.Name, adapter.Starts)
+
+    def __Watch(self, name, worker, generation):
+        worker.join()
+        self._exits.put((name, generation))
+
+    def __Exited(self, adapter, generation):
+        if generation != adapter.Generation or adapter.Started is None:
+            return
+        ran = time.monotonic() - adapter.Started
+        adapter.Uptime += ran
+        adapter.Started = None
+        adapter.LastExit = (time.time(), ran)
+
+        if adapter.Policy == EXIT:
+            logger.error("adapter %s exited after %.1f s - exiting", adapter.Name, ran)
+            self.Failed = adapter.Name
+        elif adapter.Policy == IGNORE:
+            logger.warning("adapter %s exited after %.1f s, not restarted", adapter.Name, ran)
+        else:
+            if ran >= self.StableAfter or adapter.Backoff == 0:
+                adapter.Backoff = self.BackoffInitial
+            else:
+                adapter.Backoff = min(self.BackoffMax, adapter.Backoff * 2)
+            adapter.RestartAt = time.monotonic() + adapter.Backoff
+            logger.warning("adapter %s exited after %.1f s (%d restarts, uptime %.0f s), restart in %.1f s",
+                           adapter.Name, ran, adapter.Restarts, adapter.Uptime, adapter.Backoff)
+
+
+def _Run(name, target, args, init=None):
+    # runs in the worker, an exception of the adapter ends up in the log
+    try:
+        if init is not None:
+            init(name)
+        target(*args)
+    except Exception:
+        logger.error("adapter %s failed:\n%s", name, traceback.format_exc())
@@ -0,0 +1,69 @@
+# ---------------------------------------------------------------------------
+# Import time per module, for waterrowerthreads --profile-startup
+# ---------------------------------------------------------------------------
+# Install() puts the profiler in front of sys.meta_path. It finds nothing
+# itself, it asks the other finders and wraps exec_module of the loader they
+# return, so every module executed from then on is timed:
+#
+#   cumulative  the module with all imports it triggered
+#   self        the module without them
+#
+# Builtin and frozen modules are not timed, their loader is shared by all
+# of them and they load in microseconds.
+# ---------------------------------------------------------------------------
+#
+
+import sys
+import time
+
+
+class ImportProfiler(object):
+    def __init__(self):
+        self.Times = {}  # module name: (cumulative seconds, self seconds)
+        self._children = []  # per module being executed: seconds spent in its imports
+
+    def Install(self):
+        sys.meta_path.insert(0, self)
+
+    def Remove(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, 'exec_module'):
+            loader.exec_module = self.__Timed(fullname, loader.exec_module)
+        return spec
+
+    def __Timed(self, fullname, exec_module):
+        def timed_exec_module(module):
+            self._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                cumulative = time.perf_counter() - start
+                children = self._children.pop()
+                if self._children:
+                    self._children[-1] += cumulative
+                self.Times[fullname] = (cumulative, cumulative - children)
+        return timed_exec_module
+
+    def Total(self):
+        return sum(own for cumulative, own in self.Times.values())
+
+    def Report(self, Top=25):
+        lines = ["{0} modules imported in {1:.0f} ms".format(len(self.Times), self.Total() * 1000),
+                 "cumulative ms    self ms  module"]
+        ranked = sorted(self.Times.items(), key=lambda item: item[1][0], reverse=True)
+        for name, (cumulative, own) in ranked[:Top]:
+            lines.append("{0:13.1f} {1:10.1f}  {2}".format(cumulative * 1000, own * 1000, name))
+        return "\n".join(lines)
@@ -0,0 +1,208 @@
+# ---------------------------------------------------------------------------
+# UDP multicast telemetry, waterrowerthreads -u
+# ---------------------------------------------------------------------------
+# Every snapshot of the interface goes out as one datagram to a multicast
+# group, for scoreboards and loggers on the LAN. Sending is one sendto per
+# snapshot, nothing is kept per receiver; any number of machines can join
+# the group.
+#
+#   36 bytes, little endian
+#   magic       4s      b'PRFU'
+#   version     uint8   1
+#   rower       uint8   the machine, 0 for a single rower
+#   seq         uint32  +1 per snapshot, a gap is a lost packet
+#   timestamp   uint64  µs since the epoch (wall clock) of the snapshot
+#   record      18 B    the BLE FTMS rowing record, see bus/rowingrecord.py
+#
+# Without a new snapshot the last packet is sent again every Heartbeat
+# seconds, with the same seq: a receiver sees the sender is alive and
+# drops the repeat.
+#
+# UdpReceiver joins the group and returns the packets, with the count of
+# lost, repeated and late packets per rower:
+#
+#   receiver = UdpReceiver()
+#   packet = receiver.Receive(timeout=1.0)     # Packet or None
+#   packet.values['watts'], packet.seq, packet.latency
+# ---------------------------------------------------------------------------
+#
+
+import collections
+import logging
+import socket
+import struct
+import time
+
+from ..bus import rowingrecord
+
+logger = logging.getLogger(__name__)
+
+GROUP = '239.255.70.1'  # administratively scoped, stays in the site
+PORT = 7001
+MAGIC = b'PRFU'
+VERSION = 1
+LATE_WINDOW = 256  # seqs behind the highest one a late packet is still matched to its gap
+
+HEADER = struct.Struct('<4sBBIQ')
+PACKET = struct.Struct(HEADER.format + rowingrecord.RECORD.format[1:])
+
+Packet = collections.namedtuple('Packet', ('rower', 'seq', 'timestamp', 'values', 'latency', 'sender'))
+
+
+def ParseAddress(Address):
+    # 'group:port', 'group' or None for the defaults
+    if not Address:
+        return GROUP, PORT
+    group, _, port = Address.partition(':')
+    return group or GROUP, int(port) if port else PORT
+
+
+def Pack(values, Seq, Rower=0, At=None):
+    at = time.time() if At is None else At
+    return PACKET.pack(MAGIC, VERSION, Rower, Seq & 0xFFFFFFFF, int(at * 1e6),
+                       *rowingrecord.Fields(rowingrecord.Integers(values)))
+
+
+def Unpack(data):
+    # returns   (rower, seq, timestamp, values), None for a foreign datagram
+    if len(data) != PACKET.size or data[:4] != MAGIC or data[4] != VERSION:
+        return None
+    rower, seq, timestamp = HEADER.unpack_from(data)[2:]
+    return rower, seq, timestamp / 1e6, rowingrecord.Unpack(data[HEADER.size:])
+
+
+class UdpSender(object):
+    Heartbeat = 1.0
+
+    # -----------------------------------------------------------------------
+    # input     Group, Port     the multicast group
+    #           Rower           number of the machine in the packets
+    #           Ttl             routers the packets may cross, 1: the LAN
+    #           Interface       address of the interface to send on,
+    #                           None: the one of the default route
+    # -----------------------------------------------------------------------
+    def __init__(self, Group=GROUP, Port=PORT, Rower=0, Ttl=1, Interface=None):
+        self.Destination = (Group, Port)
+        self.Rower = Rower
+        self.Seq = 0
+        self.Sent = 0
+        self._last = None
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, Ttl)
+        self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)  # receivers on the Pi itself
+        if Interface is not None:
+            self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(Interface))
+        self._socket.setblocking(False)  # a full send buffer drops the packet, the sender never waits
+
+    def Send(self, values, At=None):
+        self.Seq += 1
+        self._last = Pack(values, self.Seq, self.Rower, At)
+        self.__Send(self._last)
+
+    def Repeat(self):
+        # the last packet again, the heartbeat
+        if self._last is not None:
+            self.__Send(self._last)
+
+    def __Send(self, data):
+        try:
+            self._socket.sendto(data, self.Destination)
+            self.Sent += 1
+        except (BlockingIOError, OSError) as e:
+            logger.debug("udp telemetry not sent: %s", e)  # no network yet, or the buffer is full
+
+    def Close(self):
+        self._socket.close()
+
+
+class UdpReceiver(object):
+    # -----------------------------------------------------------------------
+    # input     Group, Port     the multicast group
+    #           Interface       address of the interface to join on,
+    #                           '0.0.0.0': the one of the default route
+    # -----------------------------------------------------------------------
+    def __init__(self, Group=GROUP, Port=PORT, Interface='0.0.0.0'):
+        self.Received = collections.Counter()  # rower: packets
+        self.Lost = collections.Counter()  # rower: seq numbers never received
+        self.Repeated = collections.Counter()  # rower: heartbeats and duplicates
+        self.Late = collections.Counter()  # rower: packets of a gap received after a newer one
+        self._seq = {}  # rower: highest seq received
+        self._missing = {}  # rower: set of the gap seqs within LATE_WINDOW not received yet
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # several receivers on one machine
+        self._socket.bind(('', Port))
+        self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                socket.inet_aton(Group) + socket.inet_aton(Interface))
+
+    def fileno(self):
+        # for select() with other sockets
+        return self._socket.fileno()
+
+    # -----------------------------------------------------------------------
+    # R e c e i v e
+    # -----------------------------------------------------------------------
+    # returns   the next new Packet, None after timeout seconds without one;
+    #           repeats and late packets are counted and skipped
+    #
+    # A gap counts its seqs as Lost. A late packet of one of those seqs
+    # moves it from Lost to Late, any other old seq (a delayed duplicate, or
+    # a gap more than LATE_WINDOW seqs back) is counted as Repeated.
+    # -----------------------------------------------------------------------
+    def Receive(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._socket.settimeout(None if deadline is None else max(deadline - time.monotonic(), 0))
+            try:
+                data, sender = self._socket.recvfrom(PACKET.size + 1)
+            except (socket.timeout, BlockingIOError):
+                return None
+            received = time.time()
+            unpacked = Unpack(data)
+            if unpacked is None:
+                continue
+            rower, seq, timestamp, values = unpacked
+            last = self._seq.get(rower)
+            missing = self._missing.setdefault(rower, set())
+            if last is not None:
+                if seq == last:
+                    self.Repeated[rower] += 1
+                    continue
+                if seq == 1:
+                    last = None  # the sender restarted
+                    missing.clear()
+                elif (last - seq) & 0xFFFFFFFF < 0x80000000:
+                    if seq in missing:
+                        missing.discard(seq)
+                        self.Late[rower] += 1
+                        self.Lost[rower] -= 1  # counted lost when the gap was seen
+                    else:
+                        self.Repeated[rower] += 1
+                    continue
+            if last is not None:
+                gap = (seq - last - 1) & 0xFFFFFFFF
+                self.Lost[rower] += gap
+                missing.update((seq - back) & 0xFFFFFFFF for back in range(1, min(gap, LATE_WINDOW) + 1))
+                if len(missing) > LATE_WINDOW:
+                    missing.difference_update([s for s in missing if (seq - s) & 0xFFFFFFFF > LATE_WINDOW])
+            self._seq[rower] = seq
+            self.Received[rower] += 1
+            return Packet(rower, seq, timestamp, values, received - timestamp, sender)
+
+    def Close(self):
+        self._socket.close()
+
+
+def main(in_bus, Address=None, Rower=0):
+    group, port = ParseAddress(Address)
+    sender = UdpSender(group, port, Rower)
+    logger.info("udp telemetry to %s:%d", group, port)
+    snapshots = in_bus.subscribe()
+    try:
+        while True:
+            values = snapshots.wait_next(timeout=sender.Heartbeat)
+            if values is None:
+                sender.Repeat()
+            else:
+                sender.Send(values)
+    finally:
+        sender.Close()
@@ -0,0 +1,74 @@
+"""
+Check the adapter supervisor with adapters that fail on purpose, as threads and as processes.
+
+- an adapter that raises is noticed at once, logged with its traceback and restarted with a doubling backoff
+- the other adapters keep running meanwhile
+- an IGNORE adapter is not restarted, an EXIT adapter stops the supervision
+
+python3 adaptersupervisorcheck.py
+"""
+
+import logging
+import multiprocessing
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.supervisor import adaptersupervisor
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+
+def steady():
+    while True:
+        time.sleep(0.05)
+
+
+def flaky():
+    time.sleep(0.05)
+    raise RuntimeError("BLE hiccup")
+
+
+def short():
+    time.sleep(0.1)
+
+
+def check(Worker):
+    supervisor = adaptersupervisor.AdapterSupervisor(Worker)
+    supervisor.BackoffInitial = 0.1
+    supervisor.Add('steady', steady)
+    supervisor.Add('flaky', flaky)
+    supervisor.Add('once', short, Policy=adaptersupervisor.IGNORE)
+    supervisor.Start()
+
+    start = time.monotonic()
+    noticed = None
+    while time.monotonic() - start < 2.0:
+        supervisor.Supervise(timeout=0.05)
+        if noticed is None and supervisor.Adapters['flaky'].LastExit is not None:
+            noticed = time.monotonic() - start
+    status = supervisor.Status()
+    supervisor.LogStatus()
+
+    assert noticed is not None and noticed < 0.5, "exit not noticed at once"
+    assert status['steady']['running'] and status['steady']['starts'] == 1, "steady adapter was disturbed"
+    assert 3 <= status['flaky']['restarts'] <= 5, "backoff did not double"
+    assert status['once']['starts'] == 1 and not status['once']['running'], "IGNORE adapter restarted"
+
+    critical = adaptersupervisor.AdapterSupervisor(Worker)
+    critical.Add('critical', short, Policy=adaptersupervisor.EXIT)
+    critical.Start()
+    while critical.Supervise(timeout=0.05):
+        pass
+    assert critical.Failed == 'critical'
+    print("{0}: exit noticed after {1:.0f} ms, flaky restarted {2} times, ok".format(
+        Worker.__name__, noticed * 1000, status['flaky']['restarts']))
+
+
+if __name__ == '__main__':
+    check(threading.Thread)
+    check(multiprocessing.get_context('fork').Process)
+    print("all checks passed")
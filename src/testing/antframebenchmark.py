@@ -0,0 +1,107 @@
+"""
+Benchmark of the ANT+ FE frame composition, frames per second before and after the precompiled page encoder.
+
+"before" is the composition as antFE.BroadcastTrainerDataMessage did it: build the struct format string of the page,
+pack it, build the format string of the frame, pack it and calculate the checksum in a python loop.
+"after" is antframe.FrameEncoder with the cached page 80/81 frames.
+
+python3 antframebenchmark.py
+"""
+
+import pathlib
+import struct
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.ant import antframe
+from adapters.ant import structconstants as sc
+
+FRAMES = 200000
+# page sequence of one 64 message block as sent by antFE
+PAGES = [80 if i % 64 in (30, 31) else 81 if i % 64 in (62, 63) else 22 if i % 3 == 0 or i % 4 == 0 else 16 for i in range(64)]
+
+
+def old_checksum(message):
+    xor_value = 0
+    length = message[1] + 3
+    for i in range(0, length):
+        xor_value = xor_value ^ message[i]
+    return bytes([xor_value])
+
+
+def old_compose(id, info):
+    format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + str(len(info)) + sc.char_array
+    data = struct.pack(format, 0xa4, len(info), id, info)
+    data += old_checksum(data)
+    return data
+
+
+def old_page16(Channel, ElapsedTime, DistanceTravelled, Speed, HeartRate):
+    format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_char + sc.unsigned_char
+    return struct.pack(format, Channel, 16, 0x16, int(min(0xff, ElapsedTime)), int(min(0xff, DistanceTravelled)), int(min(0xffff, Speed)), int(min(0xff, HeartRate)), 0x34)
+
+
+def old_page22(Channel, StrokeCount, Cadence, InstPower):
+    format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_char
+    return struct.pack(format, Channel, 22, 0xff, 0xff, int(min(0xff, StrokeCount)), int(min(0xfe, Cadence)), int(min(0xfffe, InstPower)), 0x31)
+
+
+def old_page80(Channel):
+    format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_short + sc.unsigned_short
+    return struct.pack(format, Channel, 80, 0xff, 0xff, 1, 118, 2875)
+
+
+def old_page81(Channel):
+    format = sc.no_alignment + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_char + sc.unsigned_int
+    return struct.pack(format, Channel, 81, 0xff, 1, 1, 19590705)
+
+
+def before(n):
+    frames = []
+    for i in range(n):
+        page = PAGES[i % 64]
+        if page == 80:
+            info = old_page80(0)
+        elif page == 81:
+            info = old_page81(0)
+        elif page == 22:
+            info = old_page22(0, i % 254, 12, 150)
+        else:
+            info = old_page16(0, i % 256, i % 256, 3500, 0)
+        frames.append(old_compose(0x4e, info))
+    return frames
+
+
+def after(n):
+    encoder = antframe.FrameEncoder()
+    page80 = old_compose(0x4e, antframe.Page80.pack(0, 80, 0xff, 0xff, 1, 118, 2875))
+    page81 = old_compose(0x4e, antframe.Page81.pack(0, 81, 0xff, 1, 1, 19590705))
+    frames = []
+    for i in range(n):
+        page = PAGES[i % 64]
+        if page == 80:
+            frames.append(page80)
+        elif page == 81:
+            frames.append(page81)
+        elif page == 22:
+            frames.append(encoder.Broadcast(antframe.Page22, antframe.Page22Fields(0, i % 254, 12, 150)))
+        else:
+            frames.append(encoder.Broadcast(antframe.Page16, antframe.Page16Fields(0, i % 256, i % 256, 3500, 0)))
+    return frames
+
+
+def measure(name, fn):
+    start = time.perf_counter()
+    frames = fn(FRAMES)
+    duration = time.perf_counter() - start
+    print("{0:8s} {1:10.0f} frames/s".format(name, FRAMES / duration))
+    return frames, duration
+
+
+if __name__ == '__main__':
+    old_frames, old_duration = measure("before", before)
+    new_frames, new_duration = measure("after", after)
+    assert old_frames == new_frames, "encoders produce different frames"
+    print("speedup  {0:10.2f}x".format(old_duration / new_duration))
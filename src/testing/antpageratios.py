@@ -0,0 +1,77 @@
+"""
+Check the on-air page pattern of the ANT+ FE page scheduler against the fitness equipment profile.
+
+Runs the scheduler of antFE for many periods, with a page request in the middle, and checks:
+- pages 80 and 81 are each sent twice in a row at least every 64 messages
+- the general FE data page 16 and the rower page 22 are each sent at least every 4 messages
+- 16 and 22 share the data slots evenly
+- a requested page is sent the requested number of times, without taking the common page slots
+
+python3 antpageratios.py
+"""
+
+import collections
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.ant import antpagescheduler
+
+PERIODS = 100
+MAX_COMMON_GAP = 64
+MAX_DATA_GAP = 4
+
+
+def run(scheduler, slots, request_at=None):
+    pages = []
+    for slot in range(slots):
+        if slot == request_at:
+            scheduler.RequestPage(71, 4)
+        pages.append(scheduler.Next())
+    return pages
+
+
+def gaps(pages, page):
+    positions = [i for i, p in enumerate(pages) if p == page]
+    return [b - a for a, b in zip(positions, positions[1:])]
+
+
+def check_common(pages, page):
+    runs = [i for i in range(1, len(pages)) if pages[i] == page and pages[i - 1] == page]
+    starts = [i - 1 for i in runs]
+    assert starts, "page {0} never sent twice in a row".format(page)
+    worst = max(b - a for a, b in zip(starts, starts[1:]))
+    assert worst <= MAX_COMMON_GAP, "page {0} repeats after {1} messages".format(page, worst)
+    return worst
+
+
+def check_data(pages, page):
+    worst = max(gaps(pages, page))
+    assert worst <= MAX_DATA_GAP, "page {0} has a gap of {1} messages".format(page, worst)
+    return worst
+
+
+if __name__ == '__main__':
+    scheduler = antpagescheduler.clsPageScheduler(antpagescheduler.FE_ROWER_PATTERN)
+    slots = PERIODS * scheduler.Period
+    pages = run(scheduler, slots)
+
+    counts = collections.Counter(pages)
+    for page in sorted(counts):
+        print("page {0:3d}: {1:6.2f} %".format(page, 100.0 * counts[page] / slots))
+
+    print("max gap page 80: {0}".format(check_common(pages, 80)))
+    print("max gap page 81: {0}".format(check_common(pages, 81)))
+    print("max gap page 16: {0}".format(check_data(pages, 16)))
+    print("max gap page 22: {0}".format(check_data(pages, 22)))
+    assert abs(counts[16] - counts[22]) <= PERIODS, "data pages are not shared evenly"
+
+    # the pattern keeps its position over any number of messages, there is no external rollover
+    assert pages[:scheduler.Period] == pages[-scheduler.Period:]
+
+    requested = run(antpagescheduler.clsPageScheduler(), slots, request_at=29)
+    assert requested.count(71) == 4, "requested page not sent 4 times"
+    assert requested[30:32] == [80, 80], "requested page took a common page slot"
+    print("page request: ok")
+    print("all checks passed")
@@ -0,0 +1,97 @@
+"""
+Benchmark of the split of a dongle read into ANT frames, before and after antframe.FrameParser.
+
+"before" is the byte by byte scan of clsAntDongle.Read with the per byte checksum loop of CalcChecksum.
+"after" is FrameParser.Parse. Both get the same reads: several messages batched into one read, as the dongle does
+under load. The frames must be the same; then the parser counters are shown for a read stream with noise.
+
+python3 antparserbenchmark.py
+"""
+
+import array
+import pathlib
+import random
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.ant import antframe
+
+READS = 20000
+FRAMES_PER_READ = 6
+
+
+def old_checksum(message):
+    xor_value = 0
+    length = message[1] + 3
+    for i in range(0, length):
+        xor_value = xor_value ^ message[i]
+    return bytes([xor_value])
+
+
+def before(trv):
+    data = []
+    start = 0
+    while start < len(trv):
+        skip = start
+        while skip < len(trv) and trv[skip] != 0xa4:
+            skip += 1
+        if skip != start:
+            start = skip
+        if start + 1 < len(trv):
+            length = trv[start + 1] + 4
+            if start + length <= len(trv):
+                d = bytes(trv[start: start + length])
+                if old_checksum(d) == d[-1:]:
+                    data.append(d)
+            else:
+                break
+        else:
+            break
+        start += length
+    return data
+
+
+def frame(id, info):
+    message = antframe.Header.pack(antframe.SYNCH, len(info), id) + bytes(info)
+    return message + bytes([antframe.XorChecksum(message)])
+
+
+def reads(rnd, noise=False):
+    result = []
+    for _ in range(READS):
+        buffer = b''
+        for _ in range(FRAMES_PER_READ):
+            if rnd.random() < 0.5:
+                buffer += frame(0x40, [0, 1, 3])  # EVENT_TX
+            else:
+                buffer += frame(0x4e, [1, 4] + [rnd.randrange(256) for _ in range(7)])  # heart rate page
+            if noise and rnd.random() < 0.2:
+                buffer += bytes(rnd.randrange(256) for _ in range(rnd.randrange(1, 8)))
+        result.append(array.array('B', buffer))  # pyusb returns an array
+    return result
+
+
+def measure(name, fn, data):
+    start = time.perf_counter()
+    frames = [fn(trv) for trv in data]
+    duration = time.perf_counter() - start
+    frames = [bytes(d) for read in frames for d in read]
+    print("{0:8s} {1:10.0f} frames/s".format(name, len(frames) / duration))
+    return frames, duration
+
+
+if __name__ == '__main__':
+    data = reads(random.Random(1))
+    parser = antframe.FrameParser()
+    before(data[0]), parser.Parse(data[0])  # warm up
+    old_frames, old_duration = measure("before", before, data)
+    new_frames, new_duration = measure("after", parser.Parse, data)
+    assert old_frames == new_frames, "parsers return different frames"
+    print("speedup  {0:10.2f}x".format(old_duration / new_duration))
+
+    parser = antframe.FrameParser()
+    for trv in reads(random.Random(2), noise=True):
+        parser.Parse(trv)
+    print("with noise: {0}".format(parser.Counters()))
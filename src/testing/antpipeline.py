@@ -0,0 +1,137 @@
+"""
+Run the whole waterrowerant pipeline headless against a FakeAntDongle, benchmark it and fuzz the reader.
+
+1. broadcast: waterrowerant.main in a thread, fed by a 10 Hz producer like wrtobleant, with a heart rate strap in
+   range. Checks every broadcast frame is a valid 13 byte frame on the FE channel, the broadcast rate and interval
+   jitter, the page mix and that the strap's heart rate reaches page 16. A display then asks for page 80 four
+   times (common page 70, acknowledged): it must go on air in the next data slots.
+2. fuzz: random bytes and broken frames are injected into the dongle reads; the broadcast must go on.
+3. throughput: frames per second clsAntDongle.Write() gets to the dongle, fire-and-forget.
+
+python3 antpipeline.py [seconds]
+"""
+
+import collections
+import pathlib
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.ant import antdongle as ant
+from adapters.ant import antframe
+from adapters.ant import fakeantdongle
+from adapters.ant import waterrowerant
+from adapters.bus import snapshotbus
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+HEART_RATE = 142
+THROUGHPUT_FRAMES = 20000
+
+
+def producer(bus, hrm_bus, stop):
+    values = {'stroke_rate': 24, 'total_strokes': 0, 'total_distance_m': 0, 'speed': 350, 'watts': 150,
+              'heart_rate': 0, 'elapsedtime': 0}
+    start = time.time()
+    HeartRate = hrm_bus.subscribe()
+    while not stop.is_set():
+        values = dict(values)
+        values['elapsedtime'] = int(time.time() - start)
+        values['total_strokes'] = int((time.time() - start) / 2.5)
+        values['total_distance_m'] = int((time.time() - start) * 3.5)
+        values['heart_rate'] = HeartRate.latest() or 0
+        bus.publish(values)
+        time.sleep(0.1)
+
+
+def valid(frame):
+    return (len(frame) == antframe.BroadcastFrameLength and frame[0] == antframe.SYNCH
+            and frame[1] == antframe.BroadcastInfoLength and frame[2] == antframe.msgID_BroadcastData
+            and frame[3] == ant.clsAntDongle.channel_FE and antframe.XorChecksum(frame) == 0)
+
+
+def report(name, broadcasts):
+    times = [t for t, _frame in broadcasts]
+    intervals = [b - a for a, b in zip(times, times[1:])]
+    pages = collections.Counter(frame[4] for _t, frame in broadcasts)
+    print("{0}: {1} frames, {2:.2f} frames/s".format(name, len(broadcasts), (len(broadcasts) - 1) / (times[-1] - times[0])))
+    print("  interval mean {0:.1f} ms, stdev {1:.1f} ms, max {2:.1f} ms".format(
+        statistics.mean(intervals) * 1000, statistics.pstdev(intervals) * 1000, max(intervals) * 1000))
+    print("  pages {0}".format(dict(sorted(pages.items()))))
+    return intervals
+
+
+def noise(device, stop):
+    rnd = random.Random(1)
+    while not stop.is_set():
+        kind = rnd.randrange(4)
+        if kind == 0:
+            raw = bytes(rnd.randrange(256) for _ in range(rnd.randrange(1, 40)))  # garbage
+        elif kind == 1:
+            raw = bytes([0xa4, 0x09, 0x4e, 0x01]) + bytes(rnd.randrange(256) for _ in range(9))  # bad checksum
+        elif kind == 2:
+            raw = bytes([0xa4, 0x20, 0x4e])  # truncated
+        else:
+            raw = bytes([0x00, 0xa4, 0xa4, 0x01])
+        device.Inject(raw)
+        time.sleep(0.01)
+
+
+def throughput():
+    device = fakeantdongle.FakeAntDongle()
+    Antdongle = ant.clsAntDongle(Device=device)
+    Antdongle.StartReader()
+    encoder = antframe.FrameEncoder()
+    start = time.perf_counter()
+    for i in range(THROUGHPUT_FRAMES):
+        Antdongle.Write([encoder.Broadcast(antframe.Page22, antframe.Page22Fields(0, i % 254, 12, 150))], False)
+    duration = time.perf_counter() - start
+    Antdongle.StopReader()
+    assert len(device.Broadcasts) == THROUGHPUT_FRAMES
+    print("throughput: {0:.0f} frames/s".format(THROUGHPUT_FRAMES / duration))
+
+
+if __name__ == '__main__':
+    device = fakeantdongle.FakeAntDongle(HeartRate=HEART_RATE)
+    bus = snapshotbus.SnapshotBus()
+    hrm_bus = snapshotbus.SnapshotBus()
+    stop = threading.Event()
+    for target, args in ((producer, (bus, hrm_bus, stop)), (waterrowerant.main, (bus, hrm_bus, device))):
+        t = threading.Thread(target=target, args=args)
+        t.daemon = True
+        t.start()
+
+    time.sleep(SECONDS)
+    clean = list(device.Broadcasts)
+    assert clean, "nothing broadcast"
+    assert all(valid(frame) for _t, frame in clean), "invalid broadcast frame"
+    intervals = report("broadcast", clean)
+    assert max(intervals) < 0.5, "broadcast stalled"
+    heart = [frame[10] for _t, frame in clean if frame[4] == 16]
+    assert heart[-1] == HEART_RATE, "heart rate of the strap not broadcast"
+    print("  EVENT_TX {0}".format(device.Events))
+
+    requested = len(device.Broadcasts)
+    device.Reply(0x4f, [ant.clsAntDongle.channel_FE, 70, 0xff, 0xff, 0xff, 0xff, 4, 80, 1])  # page 80, 4 times
+    time.sleep(5.0)
+    after = [frame[4] for _t, frame in list(device.Broadcasts)[requested:requested + 16]]
+    assert len(after) == 16 and after.count(80) >= 4, after  # without the request at most 2 in 16 slots
+    print("  page 80 requested 4 times: {0} of the next 16 pages".format(after.count(80)))
+
+    fuzzer = threading.Thread(target=noise, args=(device, stop))
+    fuzzer.daemon = True
+    fuzzer.start()
+    time.sleep(SECONDS)
+    fuzzed = list(device.Broadcasts)[len(clean):]
+    assert fuzzed, "broadcast stopped while fuzzing"
+    assert all(valid(frame) for _t, frame in fuzzed), "invalid broadcast frame while fuzzing"
+    intervals = report("fuzzed", fuzzed)
+    assert max(intervals) < 0.5, "broadcast stalled while fuzzing"
+    stop.set()
+    device.Close()
+
+    throughput()
+    print("all checks passed")
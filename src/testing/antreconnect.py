@@ -0,0 +1,105 @@
+"""
+Check the ANT session recovers from a dongle that drops out, without a USB stick.
+
+Runs the broadcast loop of waterrowerant.main against a FakeAntDongle, disconnects the dongle, reconnects it and checks:
+- the producer side (the deque) is never blocked
+- after the reconnect the network key and the FE channel are configured again
+- broadcasting resumes and the outage is recorded
+
+python3 antreconnect.py
+"""
+
+import pathlib
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.ant import antdongle as ant
+from adapters.ant import antfe as fe
+from adapters.ant import antsession
+from adapters.ant import fakeantdongle
+
+DISCONNECT_AT = 2.0
+RECONNECT_AT = 4.0
+RUN_FOR = 8.0
+
+WRValues = {
+    'stroke_rate': 24,
+    'total_strokes': 0,
+    'total_distance_m': 0,
+    'speed': 350,
+    'watts': 150,
+    'heart_rate': 0,
+    'elapsedtime': 0,
+}
+
+
+def producer(ant_q, stop, worst):
+    # the rower side, appends every 100 ms like wrtobleant
+    while not stop.is_set():
+        start = time.perf_counter()
+        values = dict(WRValues)
+        values['total_strokes'] += 1
+        ant_q.append(values)
+        worst[0] = max(worst[0], time.perf_counter() - start)
+        time.sleep(0.1)
+
+
+def configured(writes, id):
+    return sum(1 for w in writes if w[2] == id)
+
+
+if __name__ == '__main__':
+    device = fakeantdongle.FakeAntDongle()
+    Antdongle = ant.clsAntDongle(Device=device)
+    assert Antdongle.OK, Antdongle.Message
+    Antdongle.StartReader()
+    Session = antsession.clsAntSession(Antdongle)
+    Session.Configure()
+    Waterrower = fe.antFE(Antdongle)
+
+    ant_q = deque(maxlen=1)
+    stop = threading.Event()
+    worst = [0.0]
+    t = threading.Thread(target=producer, args=(ant_q, stop, worst))
+    t.daemon = True
+    t.start()
+
+    sent = []  # (time, ready)
+    values = None
+    start = time.time()
+    while time.time() - start < RUN_FOR:
+        now = time.time() - start
+        if device.Connected and DISCONNECT_AT <= now < RECONNECT_AT:
+            print("{0:4.1f} s disconnect".format(now))
+            device.Disconnect()
+        elif not device.Connected and now >= RECONNECT_AT:
+            print("{0:4.1f} s reconnect".format(now))
+            device.Reconnect()
+
+        if len(ant_q) != 0:
+            values = ant_q.pop()
+        ready = Session.Supervise()
+        if ready and values is not None:
+            Waterrower.BroadcastTrainerDataMessage(values)
+            Antdongle.Write([Waterrower.fedata], False)
+            sent.append((now, device.Connected))
+        time.sleep(0.25)
+    stop.set()
+    Antdongle.StopReader()
+
+    writes = list(device.Writes)
+    print("network key set {0} times, FE channel opened {1} times".format(configured(writes, 0x46), configured(writes, 0x4b)))
+    print("outages: {0}".format(["{0:.1f} s".format(seconds) for _lost, seconds in Session.Outages]))
+    print("slowest producer append: {0:.3f} ms".format(worst[0] * 1000))
+
+    assert configured(writes, 0x46) == 2, "network key not set again after the reconnect"
+    assert configured(writes, 0x4b) == 2, "FE channel not opened again after the reconnect"
+    assert Session.Outages, "outage not recorded"
+    assert Session.Outages[0][1] >= RECONNECT_AT - DISCONNECT_AT - 0.5, "outage too short"
+    assert any(when > RECONNECT_AT for when, connected in sent if connected), "broadcast did not resume"
+    assert worst[0] < 0.01, "producer was blocked"
+    print("all checks passed")
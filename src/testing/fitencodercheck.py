@@ -0,0 +1,137 @@
+"""
+Check of the FIT encoder and the FIT export.
+
+- CrcCombine gives the CRC of the concatenation for random pieces
+- a four hour session at 10 Hz (144000 snapshots, one record a second) is exported: CPU for the session, the memory
+  allocated while it is written stays flat, the file CRC and header CRC are valid
+- the file is decoded again by its definition messages: records, lap, session and activity hold what was rowed
+- a monitor reset and an idle pause end a session, the next strokes start a new file
+
+python3 fitencodercheck.py
+"""
+
+import os
+import pathlib
+import random
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.fit import fitencoder, fitexporter
+
+SNAPSHOTS = 4 * 3600 * 10
+START = 1600000000
+
+
+def snapshot(i):
+    # 24 strokes per minute, published as half strokes per minute like the S4 and SmartRow interfaces do
+    return {'stroke_rate': 48, 'total_strokes': i // 25, 'total_distance_m': i // 4, 'instantaneous pace': 120.5,
+            'speed': 415, 'watts': 100 + i % 50, 'total_kcal': i // 100, 'total_kcal_hour': 0, 'total_kcal_min': 0,
+            'heart_rate': 130 + i % 20, 'elapsedtime': i // 10}
+
+
+def decode(path):
+    # messages of the file as (global number, {field number: value}), invalid values left out
+    with open(path, 'rb') as f:
+        data = f.read()
+    size, protocol, profile, data_size, magic, header_crc = struct.unpack_from('<BBHI4sH', data, 0)
+    assert size == 14 and magic == b'.FIT' and data_size == len(data) - 16
+    assert fitencoder.Crc(data[:12]) == header_crc, "header CRC"
+    assert fitencoder.Crc(data) == 0, "file CRC"
+    definitions = {}
+    messages = []
+    offset = 14
+    while offset < 14 + data_size:
+        header = data[offset]
+        offset += 1
+        local = header & 0x0F
+        if header & 0x40:
+            _, arch, number, count = struct.unpack_from('<BBHB', data, offset)
+            offset += 5
+            fields = [struct.unpack_from('<BBB', data, offset + 3 * i) for i in range(count)]
+            offset += 3 * count
+            formats = {0x00: 'B', 0x02: 'B', 0x84: 'H', 0x86: 'I', 0x8C: 'I'}
+            invalid = {0x00: 0xFF, 0x02: 0xFF, 0x84: 0xFFFF, 0x86: 0xFFFFFFFF, 0x8C: 0}
+            unpack = struct.Struct('<' + ''.join(formats[base] for _, _, base in fields))
+            definitions[local] = (number, [(n, invalid[base]) for n, _, base in fields], unpack)
+        else:
+            number, fields, unpack = definitions[local]
+            values = unpack.unpack_from(data, offset)
+            offset += unpack.size
+            messages.append((number, {n: v for (n, bad), v in zip(fields, values) if v != bad}))
+    return messages
+
+
+if __name__ == '__main__':
+    for _ in range(200):
+        a = os.urandom(random.randrange(0, 300))
+        b = os.urandom(random.randrange(0, 300))
+        assert fitencoder.CrcCombine(fitencoder.Crc(a), fitencoder.Crc(b), len(b)) == fitencoder.Crc(a + b)
+    print("CrcCombine matches the CRC of the concatenation")
+
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = fitexporter.FitExporter(directory)
+        tracemalloc.start()
+        start = time.process_time()
+        for i in range(SNAPSHOTS):
+            exporter.Update(snapshot(i), At=START + i / 10)
+            if i == SNAPSHOTS // 10:
+                tracemalloc.reset_peak()
+                early = tracemalloc.get_traced_memory()[0]
+        late, peak = tracemalloc.get_traced_memory()
+        exporter.Close()
+        cpu = time.process_time() - start
+        tracemalloc.stop()
+        path = os.path.join(directory, os.listdir(directory)[0])
+        print("{0} snapshots: {1:.1f} us CPU each, {2:.2f} s CPU for four hours, file {3:.2f} MB".format(
+            SNAPSHOTS, cpu / SNAPSHOTS * 1e6, cpu, os.path.getsize(path) / 1e6))
+        print("memory after 24 min {0} bytes, after 4 h {1} bytes, peak in between {2} bytes".format(
+            early, late, peak))
+        assert late - early < 4096 and peak - early < 16384, "memory grows with the session"
+
+        messages = decode(path)
+        records = [fields for number, fields in messages if number == 20]
+        assert len(records) == SNAPSHOTS // 10, len(records)  # from the first second on the monitor, and the last snapshot
+        last = snapshot(SNAPSHOTS - 1)
+        assert records[-1][5] == last['total_distance_m'] * 100 and records[-1][6] == 4150
+        assert records[-1][253] - records[0][253] == len(records) - 1 - 1  # the last snapshot within the second
+        lap, = [fields for number, fields in messages if number == 19]
+        session, = [fields for number, fields in messages if number == 18]
+        activity, = [fields for number, fields in messages if number == 34]
+        assert session[5] == fitencoder.SPORT_ROWING and session[6] == fitencoder.SUB_SPORT_INDOOR_ROWING
+        assert session[9] == last['total_distance_m'] * 100 and session[10] == last['total_strokes']
+        assert session[8] == last['elapsedtime'] * 1000 == lap[8] == activity[0]
+        assert session[21] == 149 and 120 <= session[20] <= 130 and session[17] == 149
+        assert records[-1][4] == 24 and session[18] == session[19] == 24 and lap[17] == lap[18] == 24, "cadence in spm"
+        print("decoded {0} messages, {1} records, session {2} m in {3} s".format(
+            len(messages), len(records), session[9] // 100, session[8] // 1000))
+
+    with tempfile.TemporaryDirectory() as directory:
+        exporter = fitexporter.FitExporter(directory)
+        at = START
+        for i in range(3000):  # 5 minutes
+            exporter.Update(snapshot(i), At=at)
+            at += 0.1
+        for i in range(1, 600):  # reset, 1 minute
+            exporter.Update(snapshot(i), At=at)
+            at += 0.1
+        for _ in range(150):  # 150 s without a snapshot
+            exporter.Update(None, At=at)
+            at += 1
+        exporter.Update(snapshot(599), At=at)  # monitor still shows the last values
+        assert exporter.Writer is None
+        for i in range(600, 900):  # rowing again
+            at += 0.1
+            exporter.Update(snapshot(i), At=at)
+        exporter.Close()
+        files = sorted(os.listdir(directory))
+        assert len(files) == 3, files
+        sessions = [[fields for number, fields in decode(os.path.join(directory, name)) if number == 18][0]
+                    for name in files]
+        assert [session[8] // 1000 for session in sessions] == [299, 59, 29], sessions
+        print("reset and idle pause: {0} files".format(len(files)))
+    print("all checks passed")
@@ -0,0 +1,162 @@
+"""
+Latency benchmark of the hub mode, several S4 monitors on one Pi.
+
+Every S4 is simulated on a pseudo terminal: it answers the memory requests of waterrowerinterface.Rower with
+changing values and sends a pulse every 25 ms, like a machine being rowed. For 1, 2, 4 and 8 rowers the whole
+pipeline runs in one process like waterrowerthreads --hub: a Rower/DataLogger per S4 publishing on its own bus, the
+Ant+ sender with a channel per rower on a FakeAntDongle, and a consumer per rower standing in for the network
+outputs. Reported per rower:
+
+- the latency of the values from the S4 event to the consumer and to the Ant+ broadcast (p50, p99)
+- the memory requests the S4 got per second, the polling of one machine must not slow down with more machines
+
+and the CPU of the process. Checks every rower is broadcast on its own channel with its own device number and that
+the values of a rower reach only its own bus.
+
+PYTHONPATH=<pyusb> python3 hubbenchmark.py [seconds]
+"""
+
+import multiprocessing
+import os
+import pathlib
+import sys
+import threading
+import time
+from queue import Queue
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.ant import antdongle as ant
+from adapters.ant import fakeantdongle
+from adapters.ant import waterrowerant
+from adapters.bus import latencytrace
+from adapters.bus import snapshotbus
+from adapters.s4 import wrtobleant
+
+STEPS = (1, 2, 4, 8)
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+REPLY = {'IRS': ('IDS', 2), 'IRD': ('IDD', 4), 'IRT': ('IDT', 6)}
+
+
+class FakeS4(object):
+    # the S4 side of a pseudo terminal, rower number Number rows at 100 + 10 * Number watts
+    def __init__(self, Number):
+        self.Number = Number
+        self.Requests = 0
+        self._master, slave = os.openpty()
+        self.Port = os.ttyname(slave)
+        self._start = time.monotonic()
+        threading.Thread(target=self.__Answer, daemon=True).start()
+        threading.Thread(target=self.__Pulse, daemon=True).start()
+
+    def Memory(self, address):
+        elapsed = time.monotonic() - self._start
+        return {'055': int(elapsed * 4), '140': int(elapsed / 2.5), '088': 100 + 10 * self.Number,
+                '08A': int(elapsed * 100), '14A': 400, '1E1': int(elapsed) % 60, '1E2': int(elapsed) // 60,
+                '1A9': 12}.get(address, 0)
+
+    def __Write(self, line):
+        os.write(self._master, line.encode() + b'\r\n')
+
+    def __Answer(self):
+        data = b''
+        while True:
+            data += os.read(self._master, 1024)
+            while b'\n' in data:
+                line, _, data = data.partition(b'\n')
+                cmd = line.strip().decode()
+                if cmd == 'USB':
+                    self.__Write('_WR_')
+                elif cmd[:3] in REPLY:
+                    self.Requests += 1
+                    prefix, digits = REPLY[cmd[:3]]
+                    value = self.Memory(cmd[3:6])
+                    base = 10 if cmd[3:6] in ('1E1', '1E2') else 16
+                    text = ('%0*d' if base == 10 else '%0*X') % (digits, value)
+                    self.__Write(prefix + cmd[3:6] + text[-digits:])
+                else:
+                    self.__Write('OK')
+
+    def __Pulse(self):
+        stroke = 0
+        while True:
+            time.sleep(0.025)
+            self.__Write('P1')
+            stroke += 1
+            if stroke % 40 == 0:
+                self.__Write('SS')
+            elif stroke % 40 == 20:
+                self.__Write('SE')
+
+
+def consume(bus, tracer, values):
+    # a network output of one rower
+    subscription = bus.subscribe()
+    while True:
+        latest = subscription.wait_next(timeout=1.0)
+        if latest is not None:
+            tracer.Observe(latest)
+            values.append(latest['watts'])
+
+
+def hop(tracer, name):
+    histogram = tracer.Hops.get(name)
+    if histogram is None or histogram.Count == 0:
+        return None
+    return histogram.Percentile(50) * 1000, histogram.Percentile(99) * 1000, histogram.Count
+
+
+def step(count, queue):
+    s4s = [FakeS4(i) for i in range(count)]
+    buses = [snapshotbus.SnapshotBus() for _ in range(count)]
+    tracers = [latencytrace.LatencyTracer("out%d" % i) for i in range(count)]
+    watts = [[] for _ in range(count)]
+    for s4, bus in zip(s4s, buses):
+        threading.Thread(target=wrtobleant.main, args=(Queue(), bus, None, s4.Port), daemon=True).start()
+    for bus, tracer, values in zip(buses, tracers, watts):
+        threading.Thread(target=consume, args=(bus, tracer, values), daemon=True).start()
+    dongle = fakeantdongle.FakeAntDongle()
+    threading.Thread(target=waterrowerant.main, args=(buses, None, dongle), daemon=True).start()
+
+    time.sleep(3.0)  # the Rowers open their ports, the Ant+ channels are configured
+    requests = [s4.Requests for s4 in s4s]
+    broadcasts = len(dongle.Broadcasts)
+    cpu = time.process_time()
+    time.sleep(SECONDS)
+    cpu = time.process_time() - cpu
+    requests = [(s4.Requests - r) / SECONDS for s4, r in zip(s4s, requests)]
+
+    channels = {}
+    for message in dongle.Writes:
+        if message[2] == 0x51:  # ChannelID
+            channels[message[3]] = message[4] | message[5] << 8
+    sent = {}
+    for _, message in dongle.Broadcasts[broadcasts:]:
+        sent[message[3]] = sent.get(message[3], 0) + 1
+    ants = latencytrace.Tracers()
+    result = []
+    for i in range(count):
+        ant_tracer = ants['ant' if i == 0 else 'ant%d' % i]
+        result.append((hop(tracers[i], 'sensor>out%d' % i), hop(ant_tracer, 'sensor>' + ant_tracer.Name),
+                       requests[i], set(watts[i][-10:])))
+    queue.put((result, cpu / SECONDS, channels, sent))
+
+
+if __name__ == '__main__':
+    mp = multiprocessing.get_context('fork')
+    for count in STEPS:
+        queue = mp.Queue()
+        p = mp.Process(target=step, args=(count, queue))
+        p.start()
+        result, cpu, channels, sent = queue.get()
+        p.terminate()
+        p.join()
+        assert sorted(channels.items()) == [(i, ant.clsAntDongle.DeviceNumber_FE + i) for i in range(count)], channels
+        assert sorted(sent) == list(range(count)) and min(sent.values()) >= SECONDS * 3, sent
+        print("{0} rowers, CPU {1:.1f} %".format(count, cpu * 100))
+        for i, (out, antfe, requests, watts) in enumerate(result):
+            assert out is not None and antfe is not None, "rower %d sent nothing" % i
+            assert watts == {100 + 10 * i}, "rower %d got the values of another machine: %s" % (i, watts)
+            print("  rower {0}: S4 event to output p50 <{1[0]:6.2f} ms p99 <{1[1]:6.2f} ms ({1[2]} values), to Ant+ "
+                  "p50 <{2[0]:6.2f} ms p99 <{2[1]:6.2f} ms, {3:.0f} S4 requests/s".format(i, out, antfe, requests))
+    print("all checks passed")
@@ -0,0 +1,108 @@
+"""
+Check of the latency trace and its overhead.
+
+A fake S4 produces an event every 25 ms, the producer loop publishes every 100 ms and a consumer reads every 200 ms
+like the BLE timer, over the SnapshotBus and over the shared memory bus. The traced latencies have to match the
+loop periods: sensor>logger about 0, logger>publish below 100 ms, publish>ble below 200 ms.
+
+Afterwards the cost of the stamps and of Observe() per snapshot is measured, and after SIGUSR1 the report has to be
+logged by the loop, not by the signal handler.
+
+python3 latencytracecheck.py
+"""
+
+import logging
+import os
+import pathlib
+import signal
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.bus import latencytrace
+from adapters.bus import sharedsnapshotbus
+from adapters.bus import snapshotbus
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+SECONDS = 3.0
+
+
+def producer(bus, stop):
+    values = {'stroke_rate': 0, 'total_strokes': 0}
+    next_event = time.monotonic()
+    next_publish = next_event + 0.012  # the loops are not in step
+    while not stop.is_set():
+        now = time.monotonic()
+        if now >= next_event:  # the S4 capture thread: notify_callbacks, DataLogger
+            values['total_strokes'] += 1
+            latencytrace.Stamp(values, 'sensor')
+            latencytrace.Stamp(values, 'logger')
+            next_event += 0.025
+        if now >= next_publish:  # the producer loop
+            snapshot = dict(values)
+            latencytrace.Stamp(snapshot, 'publish')
+            bus.publish(snapshot)
+            next_publish += 0.1
+        time.sleep(0.005)
+
+
+def check(name, bus):
+    stop = threading.Event()
+    t = threading.Thread(target=producer, args=(bus, stop))
+    t.start()
+    tracer = latencytrace.LatencyTracer(name)
+    snapshots = bus.subscribe()
+    end = time.monotonic() + SECONDS
+    while time.monotonic() < end:
+        time.sleep(0.2)
+        values = snapshots.latest()
+        if values is not None:
+            tracer.Observe(values)
+    stop.set()
+    t.join()
+    print(tracer.Report())
+    hops = tracer.Hops
+    assert hops['sensor>logger'].Max < 0.001
+    assert hops['logger>publish'].Max < 0.1 + 0.02
+    assert hops['publish>' + name].Max < 0.2 + 0.02
+    assert hops['sensor>' + name].Count >= SECONDS / 0.2 - 2
+
+
+def overhead():
+    values = {'stroke_rate': 24, 'total_strokes': 10}
+    tracer = latencytrace.LatencyTracer("bench")
+    stamps = timeit.timeit(lambda: (latencytrace.Stamp(values, 'sensor'), latencytrace.Stamp(values, 'logger'),
+                                    latencytrace.Stamp(values, 'publish')), number=100000) / 100000
+    def observe():
+        values['trace_sensor'] += 1e-6  # a new sensor stamp every time, the worst case
+        tracer.Observe(values)
+    observed = timeit.timeit(observe, number=100000) / 100000
+    print("3 stamps {0:.2f} us, Observe {1:.2f} us per snapshot".format(stamps * 1e6, observed * 1e6))
+
+
+if __name__ == '__main__':
+    check("ble", snapshotbus.SnapshotBus())
+    bus = sharedsnapshotbus.SharedSnapshotBus()
+    try:
+        check("shm", bus)
+    finally:
+        bus.close()
+
+    reported = []
+    handler = logging.Handler()
+    handler.emit = reported.append
+    logging.getLogger('adapters.bus.latencytrace').addHandler(handler)
+    latencytrace.InstallDumpSignal()
+    os.kill(os.getpid(), signal.SIGUSR1)
+    time.sleep(0.1)
+    assert not reported, "logged in the signal handler"
+    latencytrace.LogRequested()
+    assert reported and "ble" in reported[0].getMessage()
+    latencytrace.LogRequested()
+    assert len(reported) == 1, "logged once per signal"
+    overhead()
+    print("all checks passed")
@@ -0,0 +1,191 @@
+"""
+Fan-out benchmark and check of the live telemetry server.
+
+The server runs in this process with a producer publishing a snapshot at 10 Hz like the S4 interface. The clients
+run in a second process: 1, 10, 100 and 400 WebSocket clients at 10 messages per second, half binary, half JSON. For
+every step the CPU time of the server process per message sent is measured.
+
+- every client applies the deltas it gets and ends up with the values of the last snapshot
+- a client that connects and never reads is skipped and then closed, the other clients keep their rate and the
+  publish of the producer does not get slower
+- a server-sent events client gets the same values
+- a client asking for the rate nan gets the default rate
+
+python3 livefanoutbenchmark.py
+"""
+
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import pathlib
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.bus import rowingrecord
+from adapters.bus import snapshotbus
+from adapters.live import liveserver
+
+STEPS = (1, 10, 100, 400)
+RATE = 10
+SECONDS = 5
+
+
+def snapshot(i):
+    return {'stroke_rate': 24, 'total_strokes': i // 25, 'total_distance_m': i // 4, 'instantaneous pace': 120.5,
+            'speed': 415, 'watts': 100 + i % 50, 'total_kcal': i // 100, 'total_kcal_hour': 0, 'total_kcal_min': 0,
+            'heart_rate': 130 + i % 20, 'elapsedtime': i // 10}
+
+
+def produce(bus, stop, publishes):
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        bus.publish(snapshot(i))
+        publishes.append(time.perf_counter() - start)
+        i += 1
+        time.sleep(0.1)
+    bus.publish(snapshot(i))  # the last values, unchanged from here on
+    return i
+
+
+async def websocket(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write(b'GET ' + path.encode() + b' HTTP/1.1\r\nHost: pi\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                 b'Sec-WebSocket-Key: ' + key + b'\r\nSec-WebSocket-Version: 13\r\n\r\n')
+    status = await reader.readline()
+    assert b'101' in status, status
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    return reader, writer
+
+
+async def client(port, form, duration, result):
+    reader, writer = await websocket(port, '/ws?rate={0}&format={1}'.format(RATE, form))
+    fields, values, messages = None, {}, 0
+    end = time.monotonic() + duration
+    try:
+        while True:
+            opcode, payload = await asyncio.wait_for(liveserver.ReadWebSocketFrame(reader),
+                                                     max(end - time.monotonic(), 0.01))
+            messages += 1
+            if opcode == liveserver.OP_BINARY:
+                fields = rowingrecord.ApplyDelta(fields, payload)
+            else:
+                values.update(json.loads(payload))
+    except asyncio.TimeoutError:
+        pass
+    writer.close()
+    if form == 'binary':
+        result.append((messages, fields))
+    else:
+        del values['seq']
+        result.append((messages, rowingrecord.Fields(values)))
+
+
+def clients(port, count, duration, queue):
+    async def run():
+        result = []
+        await asyncio.gather(*(client(port, ('binary', 'json')[i % 2], duration, result) for i in range(count)))
+        return result
+    queue.put(asyncio.run(run()))
+
+
+if __name__ == '__main__':
+    bus = snapshotbus.SnapshotBus()
+    server = liveserver.LiveServer(bus, '127.0.0.1:0')
+    server.SendBuffer = 4096
+    server.HighWater = 1024
+    server.Stalled = 2.0
+    threading.Thread(target=server.Run, daemon=True).start()
+    while server._server is None:
+        time.sleep(0.01)
+    mp = multiprocessing.get_context('fork')
+
+    for count in STEPS:
+        stop = threading.Event()
+        publishes = []
+        producer = threading.Thread(target=produce, args=(bus, stop, publishes))
+        queue = mp.Queue()
+        p = mp.Process(target=clients, args=(server.Port, count, SECONDS + 1.5, queue))
+        p.start()
+        producer.start()
+        time.sleep(0.5)  # the clients connect
+        cpu = time.process_time()
+        time.sleep(SECONDS)
+        cpu = time.process_time() - cpu
+        stop.set()
+        producer.join()
+        result = queue.get()
+        p.join()
+        last = rowingrecord.Fields(rowingrecord.Integers(bus.latest()[1]))
+        assert all(fields == last for _, fields in result), "a client missed the last values"
+        messages = sum(m for m, _ in result)
+        per_message = cpu / (messages * SECONDS / (SECONDS + 1.5))
+        print("{0:4d} clients: {1:6d} messages, server CPU {2:5.1f} %, {3:5.1f} us per message, publish max "
+              "{4:.0f} us".format(count, messages, cpu / SECONDS * 100, per_message * 1e6, max(publishes) * 1e6))
+
+    # a client that never reads, next to two that do: the kernel buffers of the slow one take about 25 s to fill
+    # with messages of 150 bytes at 10 per second
+    stop = threading.Event()
+    publishes = []
+    producer = threading.Thread(target=produce, args=(bus, stop, publishes))
+    producer.start()
+    slow = socket.socket()
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    slow.connect(('127.0.0.1', server.Port))
+    slow.sendall(b'GET /ws?rate=25&format=json HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                 b'Sec-WebSocket-Key: ' + base64.b64encode(os.urandom(16)) + b'\r\n\r\n')
+    queue = mp.Queue()
+    p = mp.Process(target=clients, args=(server.Port, 2, 40, queue))
+    p.start()
+    start = time.monotonic()
+    while not any(c.Format == 'json' and c.Rate == 25 for c in server.Clients):
+        time.sleep(0.01)
+    while any(c.Format == 'json' and c.Rate == 25 for c in server.Clients):
+        time.sleep(0.1)
+    closed = time.monotonic() - start
+    result = queue.get()
+    p.join()
+    stop.set()
+    producer.join()
+    assert closed < 40, "the slow client is still connected"
+    assert all(messages >= 6 * 40 for messages, _ in result), result
+    assert max(publishes) < 0.01
+    print("slow client closed after {0:.0f} s, {1} messages skipped; the others got {2} messages in 40 s, publish "
+          "max {3:.0f} us".format(closed, liveserver.SKIPPED.Values.get((), 0), [messages for messages, _ in result],
+                                  max(publishes) * 1e6))
+    slow.close()
+
+    sse = socket.create_connection(('127.0.0.1', server.Port))
+    sse.sendall(b'GET /events?rate=5 HTTP/1.1\r\n\r\n')
+    data = b''
+    while b'\n\n' not in data.partition(b'\r\n\r\n')[2]:
+        data += sse.recv(4096)
+    event = json.loads(data.partition(b'\r\n\r\n')[2].split(b'\n\n')[0][len(b'data: '):])
+    assert rowingrecord.Fields({k: v for k, v in event.items() if k != 'seq'}) == \
+        rowingrecord.Fields(rowingrecord.Integers(bus.latest()[1]))
+    sse.close()
+    print("server-sent events: {0}".format(event))
+
+    # a rate that is not a number: the default rate instead of a sleep for ever
+    async def not_a_number():
+        reader, writer = await websocket(server.Port, '/ws?rate=nan&format=json')
+        await asyncio.wait_for(liveserver.ReadWebSocketFrame(reader), 2.0)
+        rates = [c.Rate for c in server.Clients]
+        writer.write(liveserver.WebSocketFrame(liveserver.OP_TEXT, b'{"rate": NaN}'))
+        await asyncio.sleep(0.2)
+        rates += [c.Rate for c in server.Clients]
+        writer.close()
+        return rates
+    rates = asyncio.run(not_a_number())
+    assert rates == [server.DefaultRate] * 2, rates
+    print("rate nan: {0} messages per second".format(rates[-1]))
+    server.Stop()
+    print("all checks passed")
@@ -0,0 +1,92 @@
+"""
+Check of the local telemetry from the rowing process to the live page of the OLED screen, without the display.
+
+- a sender at 10 snapshots per second like waterrowerthreads --local, the live page drawn like the screen loop does
+  at its frame budget for 5 s: frames sent to the display, CPU of the screen side, no snapshot lost
+- without the live page shown nothing is bound: the sender drops the snapshots and never blocks; shown again, the
+  page gets the newest values and not old ones
+
+python3 livemetricscheck.py
+"""
+
+import pathlib
+import sys
+import threading
+import time
+
+screen = pathlib.Path(__file__).parent.parent.absolute() / 'adapters' / 'screen'
+sys.path.insert(0, str(screen))
+
+from globalParameters import globalParameters
+import screens.livemetrics
+from adapters.local import localtelemetry
+
+SECONDS = 5
+
+
+class FakeDevice(object):
+    mode = '1'
+    size = (128, 64)
+
+    def __init__(self):
+        self.frames = 0
+
+    def display(self, image):
+        self.frames += 1
+
+
+def snapshot(i):
+    return {'stroke_rate': 48, 'total_strokes': i // 25, 'total_distance_m': i // 4, 'instantaneous pace': 125,
+            'speed': 400, 'watts': 150 + i // 20 % 3, 'total_kcal': 0, 'total_kcal_hour': 0, 'total_kcal_min': 0,
+            'heart_rate': 0, 'elapsedtime': i // 10}
+
+
+def produce(sender, stop, count):
+    i = 0
+    while not stop.is_set():
+        sender.Send(snapshot(i))
+        i += 1
+        count[0] = i
+        time.sleep(0.1)
+
+
+if __name__ == '__main__':
+    globalParameters.font_text = str(screen / 'fonts' / 'SF_Pixelate.ttf')
+    globalParameters.font_icons = str(screen / 'fonts' / 'fontawesome-webfont.ttf')
+    device = FakeDevice()
+    sender = localtelemetry.LocalSender()
+    stop = threading.Event()
+    count = [0]
+    producer = threading.Thread(target=produce, args=(sender, stop, count))
+    producer.start()
+
+    screens.livemetrics.draw(device)  # binds the socket
+    loops = 0
+    cpu = time.process_time()
+    end = time.monotonic() + SECONDS
+    while time.monotonic() < end:
+        time.sleep(screens.livemetrics.FRAME)
+        screens.livemetrics.draw(device)
+        loops += 1
+    cpu = time.process_time() - cpu
+    assert screens.livemetrics.rowing()
+    assert screens.livemetrics.receiver.Lost == 0, screens.livemetrics.receiver.Lost
+    print("live page, {0} loops in {1} s: {2} frames sent, screen CPU {3:.2f} ms per loop, {4} snapshots received".format(
+        loops, SECONDS, device.frames, cpu / loops * 1000, screens.livemetrics.receiver.Received))
+
+    screens.livemetrics.stop()
+    dropped = sender.Dropped
+    time.sleep(2.0)
+    assert sender.Dropped - dropped >= 15, "no screen bound, the snapshots must be dropped"
+    screens.livemetrics.draw(device)  # bound again, nothing old queued
+    time.sleep(0.35)
+    screens.livemetrics.draw(device)
+    shown = screens.livemetrics.values['total_distance_m']
+    stop.set()
+    producer.join()
+    assert shown >= snapshot(count[0] - 5)['total_distance_m'], (shown, count[0])
+    print("page not shown: {0} snapshots dropped in 2 s, shown again: the newest values".format(
+        sender.Dropped - dropped))
+    screens.livemetrics.stop()
+    sender.Close()
+    print("all checks passed")
@@ -0,0 +1,119 @@
+"""
+Time an adapter thread is blocked by logging, the synchronous FileHandler of the old logging.conf against the
+AsyncHandler of asynclogging.
+
+The log file sits behind a stream that stalls every flush() like an SD card does (2 ms, every 50th flush 50 ms).
+Four threads log like the adapters do, every millisecond; the time each logger call takes is measured in the thread.
+Afterwards the file has to hold every record, and a burst of the same warning has to be rate limited.
+
+python3 loggingbenchmark.py
+"""
+
+import logging
+import pathlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.logpipeline import asynclogging
+
+THREADS = 4
+RECORDS = 1000  # per thread
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+FLUSHES = {}  # file name: flushes
+
+
+class SDCard(object):
+    # a file whose flush stalls like a slow SD card
+    def __init__(self, stream):
+        self._stream = stream
+
+    def flush(self):
+        flushes = FLUSHES[self._stream.name] = FLUSHES.get(self._stream.name, 0) + 1
+        self._stream.flush()
+        time.sleep(0.05 if flushes % 50 == 0 else 0.002)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class SDFileHandler(logging.FileHandler):
+    def _open(self):
+        return SDCard(logging.FileHandler._open(self))
+
+
+class SDBatchRotatingFileHandler(asynclogging.BatchRotatingFileHandler):
+    def _open(self):
+        return SDCard(asynclogging.BatchRotatingFileHandler._open(self))
+
+
+def adapter(log, durations):
+    for i in range(RECORDS):
+        start = time.perf_counter()
+        log.debug("stroke %d values %s", i, {'watts': 150, 'stroke_rate': 24})
+        durations.append(time.perf_counter() - start)
+        time.sleep(0.001)
+
+
+def run(name, handler):
+    log = logging.getLogger(name)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    log.addHandler(handler)
+    durations = []
+    threads = [threading.Thread(target=adapter, args=(log, durations)) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    handler.close()
+    log.removeHandler(handler)
+    durations.sort()
+    print("{0:6s} per call mean {1:7.1f} us  p99 {2:8.1f} us  max {3:8.1f} us  run {4:.2f} s".format(
+        name, statistics.mean(durations) * 1e6, durations[int(len(durations) * 0.99)] * 1e6, durations[-1] * 1e6,
+        elapsed))
+    return durations
+
+
+def lines(path):
+    with open(path) as f:
+        return f.read().count("\n")
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        sync = SDFileHandler(directory + '/sync.log')
+        sync.setFormatter(logging.Formatter(FORMAT))
+        blocking = run("sync", sync)
+
+        batch = SDBatchRotatingFileHandler(directory + '/async.log', 'a', 10 * 1024 * 1024, 3)
+        batch.setFormatter(logging.Formatter(FORMAT))
+        handler = asynclogging.AsyncHandler([batch])
+        nonblocking = run("async", handler)
+        print("flushes: sync {0}, async {1}".format(FLUSHES[directory + '/sync.log'], FLUSHES[directory + '/async.log']))
+        assert lines(directory + '/async.log') == THREADS * RECORDS, "records lost"
+        print("mean blocking {0:.0f}x lower".format(statistics.mean(blocking) / statistics.mean(nonblocking)))
+
+        rotating = asynclogging.BatchRotatingFileHandler(directory + '/rate.log', 'a', 1024, 2)
+        handler = asynclogging.AsyncHandler([rotating])
+        handler.addFilter(asynclogging.RepeatFilter(Interval=0.2, Burst=5))
+        log = logging.getLogger("rate")
+        log.propagate = False
+        log.addHandler(handler)
+        for i in range(1000):
+            log.warning("no data from s4 interface")
+        time.sleep(0.25)
+        log.warning("no data from s4 interface")
+        handler.close()
+        with open(directory + '/rate.log') as f:
+            text = f.read()
+        assert text.count("no data") == 6 and "995 similar messages suppressed" in text, text
+        print("repeated warning: 1001 calls, 6 lines written")
+    print("all checks passed")
@@ -0,0 +1,112 @@
+"""
+Check of the metrics endpoint, over TCP and over a unix socket, with threads and with processes.
+
+Two fake adapters count events under the supervisor, like the S4 and BLE adapters do; the endpoint has to show their
+counters, with a process label when they run as processes, and the adapter liveness of the supervisor.
+Then 8 threads increment one counter at once, no increment may be lost. Afterwards the cost of Counter.Inc() and of a
+scrape is measured.
+
+python3 metricscheck.py
+"""
+
+import http.client
+import multiprocessing
+import pathlib
+import socket
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.metrics import metrics
+from adapters.metrics import metricsserver
+from adapters.supervisor import adaptersupervisor
+
+EVENTS = metrics.Counter('pirowflo_check_events_total', "Fake events", ('type',))
+
+
+def rower():
+    while True:
+        EVENTS.Inc('stroke_start')
+        time.sleep(0.01)
+
+
+def notifier():
+    while True:
+        EVENTS.Inc('notify')
+        time.sleep(0.2)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        http.client.HTTPConnection.__init__(self, 'localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def scrape(address):
+    if '/' in address:
+        connection = UnixHTTPConnection(address)
+    else:
+        connection = http.client.HTTPConnection('127.0.0.1', int(address))
+    connection.request('GET', '/metrics')
+    response = connection.getresponse()
+    assert response.status == 200
+    return response.read().decode('utf-8')
+
+
+def check(Worker, address, queue=None):
+    server = metricsserver.MetricsServer(address, queue)
+    init = None if queue is None else lambda name: metrics.Forward(name, queue, Interval=0.2)
+    supervisor = adaptersupervisor.AdapterSupervisor(Worker, init)
+    supervisor.Add('s4', rower)
+    supervisor.Add('ble', notifier)
+    metrics.GaugeFunction('pirowflo_check_adapter_up', "1 when the adapter runs",
+                          lambda: {(name,): int(s['running']) for name, s in supervisor.Status().items()}, ('adapter',))
+    server.Start()
+    supervisor.Start()
+    time.sleep(1.0)
+    text = scrape(address)
+    server.Stop()
+    print(text)
+
+    s4, main = ('', '') if queue is None else (',process="s4"', ',process="main"')
+    line = [l for l in text.splitlines() if l.startswith('pirowflo_check_events_total{type="stroke_start"' + s4)]
+    assert line and int(line[0].split()[-1]) > 30, "S4 counter missing"
+    assert 'pirowflo_check_adapter_up{adapter="ble"' + main + '} 1' in text
+    assert "# TYPE pirowflo_check_events_total counter" in text
+    return server
+
+
+if __name__ == '__main__':
+    mp = multiprocessing.get_context('fork')  # first, the processes must not inherit the threads
+    with tempfile.TemporaryDirectory() as directory:
+        check(mp.Process, directory + '/metrics.sock', mp.Queue())
+    server = check(threading.Thread, '9187')
+
+    # counted from several threads at once, like the Ant+ reader and the adapter workers: no increment lost
+    CONTENDED = metrics.Counter('pirowflo_check_contended_total', "Increments from several threads")
+    def count():
+        for _ in range(100000):
+            CONTENDED.Inc()
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    switch = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # a thread switch between the read and the write of an increment
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sys.setswitchinterval(switch)
+    assert CONTENDED.Samples() == [((), 800000)], CONTENDED.Samples()
+    print("8 threads: {0} increments counted".format(CONTENDED.Samples()[0][1]))
+
+    inc = timeit.timeit(lambda: EVENTS.Inc('stroke_start'), number=100000) / 100000
+    exposition = timeit.timeit(server.Exposition, number=1000) / 1000
+    print("Counter.Inc {0:.2f} us, exposition {1:.0f} us".format(inc * 1e6, exposition * 1e6))
+    print("all checks passed")
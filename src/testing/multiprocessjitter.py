@@ -0,0 +1,92 @@
+"""
+Timing jitter of a 200 ms consumer (like the BLE notification timer) next to a busy producer, threads against processes.
+
+threads:   producer and consumer are threads of one interpreter sharing a SnapshotBus, as waterrowerthreads runs them.
+processes: producer and consumer are processes sharing a SharedSnapshotBus, as waterrowerthreads -m runs them.
+
+The producer publishes at 10 Hz and burns CPU in between, like serial capture, D-Bus and gatt callbacks under load.
+The consumer checks every snapshot it reads is consistent: all fields carry the same counter, a torn read of the
+seqlock record would mix two publishes.
+
+python3 multiprocessjitter.py [seconds]
+"""
+
+import multiprocessing
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.bus import jittermeter
+from adapters.bus import sharedsnapshotbus
+from adapters.bus import snapshotbus
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+INTERVAL = 0.2
+BUSY_THREADS = 2
+
+
+def busy(stop):
+    # pure python work holding the GIL
+    while not stop.is_set():
+        sum(i * i for i in range(20000))
+
+
+def producer(bus, stop):
+    workers = [threading.Thread(target=busy, args=(stop,)) for _ in range(BUSY_THREADS)]
+    for t in workers:
+        t.daemon = True
+        t.start()
+    counter = 0
+    while not stop.is_set():
+        counter += 1
+        bus.publish({name: counter for name in sharedsnapshotbus.FIELDS})
+        time.sleep(0.1)
+
+
+def consumer(bus, stop, result):
+    jitter = jittermeter.JitterMeter("consumer", INTERVAL, ReportEvery=SECONDS * 10)
+    snapshots = bus.subscribe()
+    torn = 0
+    next_tick = time.monotonic()
+    while not stop.is_set():
+        jitter.Tick()
+        values = snapshots.latest()
+        if values is not None and len(set(values.values())) != 1:
+            torn += 1
+        next_tick += INTERVAL
+        time.sleep(max(0, next_tick - time.monotonic()))
+    stats = jitter.Stats()
+    stats['torn'] = torn
+    result.put(stats)
+
+
+def run(name, start, bus, stop, result):
+    workers = [start(target=producer, args=(bus, stop)), start(target=consumer, args=(bus, stop, result))]
+    for w in workers:
+        w.start()
+    time.sleep(SECONDS)
+    stop.set()
+    stats = result.get()
+    for w in workers:
+        w.join()
+    print("{0:10s} stdev {1:6.2f} ms  p99 +{2:6.2f} ms  max +{3:6.2f} ms  torn reads {4}".format(
+        name, stats['stdev'] * 1000, stats['p99'] * 1000, stats['max'] * 1000, stats['torn']))
+    return stats
+
+
+if __name__ == '__main__':
+    import queue
+    threaded = run("threads", threading.Thread, snapshotbus.SnapshotBus(), threading.Event(), queue.Queue())
+
+    mp = multiprocessing.get_context('fork')
+    bus = sharedsnapshotbus.SharedSnapshotBus()
+    try:
+        processes = run("processes", mp.Process, bus, mp.Event(), mp.Queue())
+    finally:
+        bus.close()
+
+    assert processes['torn'] == 0, "torn read through the seqlock"
+    print("p99 jitter {0:.1f}x lower with processes".format(threaded['p99'] / max(processes['p99'], 1e-6)))
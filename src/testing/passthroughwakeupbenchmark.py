@@ -0,0 +1,174 @@
+"""
+Benchmark of the SmartRow passthrough wakeup, the 50 ms GLib poll before and the MessageQueue wakeup after.
+
+A producer thread replays the recorded SmartRow stream of decode.txt like the SmartRow sends it: a burst of messages
+a few ms apart every 200 ms. The consumer runs on a small main loop with the idle_add and timeout_add of GLib.
+
+- before: timeout_add(50) pops at most one message per tick from deque(maxlen=1), bursts overwrite each other
+- after: MessageQueue.put wakes the consumer with idle_add, the burst is sent at once and in order
+
+For both: messages sent, lost, in order, latency from put to send, and the wakeups of the main loop while idle. Then
+a stalled consumer: the queue stays bounded and counts the dropped messages.
+
+python3 passthroughwakeupbenchmark.py
+"""
+
+import heapq
+import pathlib
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.bus import messagequeue
+from adapters.fakesmartrow import smartrowtranscoder
+
+BURST = 4
+BURST_SPACING = 0.002
+BURST_PERIOD = 0.2
+IDLE = 2.0
+
+
+class MainLoop(object):
+    # the part of the GLib main loop the passthrough uses: sources called until they return False
+    def __init__(self):
+        self.wakeups = 0
+        self._sources = []  # (due, order, interval, callback)
+        self._order = 0
+        self._changed = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+
+    def _add(self, interval, callback):
+        with self._changed:
+            self._order += 1
+            heapq.heappush(self._sources, (time.monotonic() + interval, self._order, interval, callback))
+            self._changed.notify()
+
+    def idle_add(self, callback):
+        self._add(0, callback)
+
+    def timeout_add(self, milliseconds, callback):
+        self._add(milliseconds / 1000.0, callback)
+
+    def quit(self):
+        with self._changed:
+            self._running = False
+            self._changed.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while self._running and (not self._sources or self._sources[0][0] > time.monotonic()):
+                    self._changed.wait(self._sources[0][0] - time.monotonic() if self._sources else None)
+                if not self._running:
+                    return
+                due, order, interval, callback = heapq.heappop(self._sources)
+            self.wakeups += 1
+            if callback() and interval:
+                self._add(interval, callback)
+
+
+def recording():
+    messages = []
+    with open(pathlib.Path(__file__).parent / 'decode.txt') as f:
+        for line in f:
+            hexbytes = []
+            for h in line.split():
+                if len(h) != 2 or not all(c in '0123456789ABCDEF' for c in h):
+                    break
+                hexbytes.append(h)
+            if len(hexbytes) == 17:  # the complete messages
+                messages.append(bytes(int(h, 16) for h in hexbytes).decode('latin-1'))
+    return messages
+
+
+class Consumer(object):
+    def __init__(self):
+        self.transcoder = smartrowtranscoder.Transcoder()
+        self.sent = []  # (index, latency)
+
+    def send(self, item):
+        index, put, message = item
+        self.transcoder.Transcode(message)
+        self.sent.append((index, time.monotonic() - put))
+
+
+def before(loop, consumer):
+    q = deque(maxlen=1)
+
+    def Waterrower_cb():
+        if q:
+            consumer.send(q.popleft())
+        return True
+
+    loop.timeout_add(50, Waterrower_cb)
+    return q.append
+
+
+def after(loop, consumer):
+    q = messagequeue.MessageQueue()
+
+    def Waterrower_cb():
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            consumer.send(item)
+        return False
+
+    q.on_ready(lambda: loop.idle_add(Waterrower_cb))
+    return q.put
+
+
+def run(setup, messages):
+    loop = MainLoop()
+    consumer = Consumer()
+    put = setup(loop, consumer)
+    start = time.monotonic()
+    for index, message in enumerate(messages):
+        if index % BURST == 0:
+            time.sleep(max(0, start + index // BURST * BURST_PERIOD - time.monotonic()))
+        else:
+            time.sleep(BURST_SPACING)
+        put((index, time.monotonic(), message))
+    time.sleep(0.2)
+    wakeups = loop.wakeups
+    time.sleep(IDLE)
+    idle = (loop.wakeups - wakeups) / IDLE
+    loop.quit()
+    return consumer.sent, idle
+
+
+if __name__ == '__main__':
+    messages = recording()[:120]
+    for name, setup in (('before', before), ('after', after)):
+        sent, idle = run(setup, messages)
+        indexes = [index for index, latency in sent]
+        latencies = sorted(latency for index, latency in sent)
+        print("{0:6}: {1} of {2} sent, {3} lost, in order {4}, latency median {5:.1f} ms p99 {6:.1f} ms, "
+              "{7:.0f} wakeups/s idle".format(name, len(sent), len(messages), len(messages) - len(sent),
+                                              indexes == sorted(indexes), statistics.median(latencies) * 1000,
+                                              latencies[int(len(latencies) * 0.99)] * 1000, idle))
+        if name == 'after':
+            assert indexes == list(range(len(messages))), "every message, in order"
+            assert idle == 0, "no wakeups without messages"
+
+    # the app not reading: the queue stays bounded, the oldest messages are dropped and counted, one wakeup
+    wakeups = []
+    q = messagequeue.MessageQueue(maxlen=32)
+    q.on_ready(lambda: wakeups.append(1))
+    for message in messages:
+        q.put(message)
+    drained = []
+    while len(q):
+        drained.append(q.get())
+    assert drained == messages[-32:] and q.dropped == len(messages) - 32 and len(wakeups) == 1
+    print("consumer stalled: {0} queued, {1} dropped and counted, {2} wakeup".format(
+        len(drained), q.dropped, len(wakeups)))
+    print("all checks passed")
@@ -0,0 +1,110 @@
+"""
+Benchmark of the OLED screen loop of adapters/screen, without the display: a fake sh1106 records the frames sent.
+
+- the main menu drawn 1000 times like the loop does while nothing changes: fonts loaded on every draw and every frame
+  sent (before) against the font cache and the frame cache (now); CPU per loop and frames sent over SPI
+- a changed status and a moved cursor are sent, an unchanged frame is not: a screen whose values did not change does
+  not draw, a frame that looks the same as the one shown is not sent
+- a button callback wakes up the loop through the condition: time from notifyChange to the loop running
+
+python3 screenloopbenchmark.py
+"""
+
+import pathlib
+import statistics
+import sys
+import threading
+import time
+
+screen = pathlib.Path(__file__).parent.parent.absolute() / 'adapters' / 'screen'
+sys.path.insert(0, str(screen))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from globalParameters import globalParameters
+from frameCache import frames
+import screens.mainmenu
+
+LOOPS = 1000
+
+
+class FakeDevice(object):
+    mode = '1'
+    size = (128, 64)
+
+    def __init__(self):
+        self.frames = []
+
+    def display(self, image):
+        self.frames.append(image.tobytes())
+
+
+def draw_before(device):
+    # the main menu like it was drawn before: fonts loaded and the frame sent every time
+    font = ImageFont.truetype(globalParameters.font_text, size=10)
+    fontawesome = ImageFont.truetype(globalParameters.font_icons, size=15)
+    image = Image.new(device.mode, device.size)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((108, 9, 124, 25), outline=255, fill=0)
+    draw.text((0, 2), text="--------PiRowFlo--------", font=font, fill="white")
+    for y in range(10, 70, 10):
+        draw.text((105, y), text="|", font=font, fill="white")
+    draw.text((110, 10), text="", font=fontawesome, fill="white")
+    draw.text((110, 28), text="", font=fontawesome, fill="white")
+    draw.text((110, 48), text="", font=fontawesome, fill="white")
+    draw.text((0, 14), text="Status: " + globalParameters.status, font=font, fill="white")
+    draw.text((0, 26), text="ip: " + globalParameters.ipaddr, font=font, fill="white")
+    device.display(image)
+
+
+def run(draw, device):
+    start = time.process_time()
+    for _ in range(LOOPS):
+        draw(device)
+    return (time.process_time() - start) / LOOPS
+
+
+if __name__ == '__main__':
+    globalParameters.font_text = str(screen / 'fonts' / 'SF_Pixelate.ttf')
+    globalParameters.font_icons = str(screen / 'fonts' / 'fontawesome-webfont.ttf')
+    globalParameters.ipaddr = '192.168.1.20'
+
+    before = FakeDevice()
+    cpu_before = run(draw_before, before)
+    now = FakeDevice()
+    cpu_now = run(screens.mainmenu.draw, now)
+    assert len(now.frames) == 1
+    assert now.frames[0] == before.frames[0], "the cached fonts draw another frame"
+    print("main menu, {0} loops without a change: before {1:.2f} ms CPU and {2} frames sent, now {3:.3f} ms CPU and "
+          "{4} frame sent".format(LOOPS, cpu_before * 1000, len(before.frames), cpu_now * 1000, len(now.frames)))
+
+    globalParameters.status = "running"
+    screens.mainmenu.draw(now)
+    globalParameters.counter = 1
+    screens.mainmenu.draw(now)
+    screens.mainmenu.draw(now)
+    assert len(now.frames) == 3, "a changed status or cursor must be sent once"
+    globalParameters.ipaddr = '192.168.1.20 '  # other values, the same frame
+    screens.mainmenu.draw(now)
+    assert len(now.frames) == 3 and frames.skipped == 1
+    print("changed status and cursor: {0} frames sent; changed values that look the same: drawn, not sent".format(
+        len(now.frames) - 1))
+
+    latencies = []
+    for _ in range(200):
+        woken = threading.Event()
+        def loop():
+            globalParameters.waitForChange(1.0)
+            woken.set()
+        t = threading.Thread(target=loop)
+        t.start()
+        time.sleep(0.002)
+        start = time.perf_counter()
+        globalParameters.notifyChange()
+        woken.wait()
+        latencies.append(time.perf_counter() - start)
+        t.join()
+    assert globalParameters.waitForChange(0.01) == False
+    print("button to screen loop: median {0:.3f} ms, max {1:.3f} ms (the loop slept up to 400 ms before)".format(
+        statistics.median(latencies) * 1000, max(latencies) * 1000))
+    print("all checks passed")
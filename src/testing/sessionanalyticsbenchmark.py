@@ -0,0 +1,163 @@
+"""
+Benchmark and check of the session analytics on a synthetic 2 hour session at 40 Hz (288000 snapshots).
+
+The session: 15 min warm up, 8 x 8 min pieces with 2 min 30 s rest, cool down to 2 h; speed and power vary with the
+piece, the stroke rate around 24 to 30 spm, short stops of 1 s in some pieces (no new interval), the snapshots at
+standstill carry speed, power and stroke rate 0 like DataLogger.WRValuesStandstill.
+
+- the analysis finds the 10 pieces, the splits add up to the time to the last full 500 m, the minute averages match
+- time of the whole analysis, and of the splits, minute averages and intervals against a Python loop per sample
+- time to collect the session live with SessionSeries.Append and to load it from a --record file
+- a session without distance is reported as 0 m
+
+python3 sessionanalyticsbenchmark.py
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.analytics import sessionanalytics
+from adapters.recorder import sessionrecorder
+
+HZ = 40
+DURATION = 2 * 3600
+START = 1600000000.0
+
+
+def synthetic():
+    rng = numpy.random.default_rng(1)
+    t = numpy.arange(DURATION * HZ) / HZ
+    speed = numpy.zeros(len(t))  # cm/s
+    rate = numpy.zeros(len(t))
+    pieces = [(0, 15 * 60, 330, 22)]
+    at = 15 * 60 + 150
+    for i in range(8):
+        pieces.append((at, at + 8 * 60, 420 + 10 * i, 26 + i % 3 * 2))
+        at += 8 * 60 + 150
+    pieces.append((at, DURATION - 60, 300, 20))
+    for start, end, cms, spm in pieces:
+        piece = (t >= start) & (t < end)
+        speed[piece] = cms + rng.normal(0, 8, piece.sum())
+        rate[piece] = spm + rng.normal(0, 0.7, piece.sum())
+    for stop in (20 * 60, 40 * 60, 60 * 60):  # a short stop within a piece
+        speed[(t >= stop) & (t < stop + 1)] = 0
+    moving = speed > 0
+    rate[~moving] = 0
+    watts = numpy.where(moving, 2.8 * (speed / 100) ** 3, 0)
+    distance = numpy.floor(numpy.cumsum(speed / 100 / HZ))
+    strokes = numpy.floor(numpy.cumsum(rate / 60 / HZ))
+    pace = numpy.where(moving, 500 * 100 / numpy.maximum(speed, 1), 0)
+    # stroke_rate in half strokes per minute, as the interfaces publish it
+    values = {'stroke_rate': 2 * numpy.round(rate), 'total_strokes': strokes, 'total_distance_m': distance,
+              'instantaneous pace': pace, 'speed': speed, 'watts': numpy.round(watts), 'total_kcal': distance / 20,
+              'heart_rate': numpy.where(moving, 140, 100), 'elapsedtime': numpy.floor(t)}
+    return START + t, values, len(pieces)
+
+
+def loop_analysis(time_, distance, watts, speed):
+    # the same splits, minute averages and intervals, sample by sample
+    splits, mark, previous = [], sessionanalytics.SPLIT, time_[0]
+    sums, counts = {}, {}
+    intervals, in_piece, still_since = [], False, None
+    for i in range(len(time_)):
+        if distance[i] >= mark:
+            splits.append(time_[i] - previous)
+            previous = time_[i]
+            mark += sessionanalytics.SPLIT
+        minute = int((time_[i] - time_[0]) // 60)
+        sums[minute] = sums.get(minute, 0) + watts[i]
+        counts[minute] = counts.get(minute, 0) + 1
+        if speed[i] > 0:
+            if not in_piece:
+                intervals.append([i, i])
+                in_piece = True
+            intervals[-1][1] = i
+            still_since = None
+        elif in_piece:
+            if still_since is None:
+                still_since = time_[i]
+            elif time_[i] - still_since >= sessionanalytics.MIN_REST:
+                in_piece = False
+    return splits, [sums[m] / counts[m] for m in sorted(sums)], intervals
+
+
+if __name__ == '__main__':
+    times, values, pieces = synthetic()
+    rows = len(times)
+    series = sessionanalytics.SessionSeries.FromArrays(times, values)
+
+    start = time.perf_counter()
+    analysis = sessionanalytics.Analyse(series)
+    vectorized = time.perf_counter() - start
+    print("{0} snapshots analysed in {1:.1f} ms".format(rows, vectorized * 1000))
+
+    intervals = analysis['intervals']
+    assert len(intervals['start']) == pieces, intervals['start']
+    assert numpy.allclose(intervals['duration'][1:-1], 8 * 60, atol=0.1), intervals['duration']
+    assert numpy.allclose(intervals['rest'][:-1], 150, atol=0.1), intervals['rest']
+    assert abs(intervals['stroke_rate'][1] - 26) < 0.5 and abs(intervals['stroke_rate'][2] - 28) < 0.5, \
+        intervals['stroke_rate']  # in spm
+    splits = analysis['splits']
+    distance = series.Column('total_distance_m')
+    full = int(distance[-1] // sessionanalytics.SPLIT)
+    assert len(splits) == full
+    reached = times[numpy.searchsorted(distance, full * sessionanalytics.SPLIT)] - times[0]
+    assert abs(splits.sum() - reached) < 1.0 / HZ
+    minutes = analysis['minutes']['watts']
+    assert len(minutes) == DURATION // 60
+    assert abs(minutes[30] - values['watts'][30 * 60 * HZ:31 * 60 * HZ].mean()) < 1e-3
+    print(sessionanalytics.Report(analysis))
+
+    start = time.perf_counter()
+    sessionanalytics.Splits(series.Time, distance)
+    sessionanalytics.MinuteAverages(series.Time, series.Column('watts'))
+    sessionanalytics.Intervals(series)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop_splits, loop_minutes, loop_intervals = loop_analysis(
+        times.tolist(), distance.tolist(), series.Column('watts').tolist(), series.Column('speed').tolist())
+    looped = time.perf_counter() - start
+    assert len(loop_splits) == len(splits) and len(loop_intervals) == pieces
+    assert numpy.allclose(loop_minutes, minutes, rtol=1e-4)
+    assert numpy.allclose(loop_splits, splits, atol=2.0 / HZ)  # the loop does not interpolate
+    print("splits, minute averages and intervals: vectorized {0:.1f} ms, Python loop {1:.0f} ms, {2:.0f}x".format(
+        vectorized * 1000, looped * 1000, looped / vectorized))
+
+    start = time.perf_counter()
+    live = sessionanalytics.SessionSeries()
+    names = list(values)
+    columns = [values[name].tolist() for name in names]
+    for i, at in enumerate(times.tolist()):
+        live.Append({name: column[i] for name, column in zip(names, columns)}, at)
+    collected = time.perf_counter() - start
+    print("collected live with Append in {0:.2f} s, {1:.1f} us per snapshot".format(collected, collected / rows * 1e6))
+    assert numpy.array_equal(live.Column('watts'), series.Column('watts'))
+    assert numpy.array_equal(live.Column('stroke_rate'), series.Column('stroke_rate'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = sessionrecorder.SessionRecorder(directory + '/session.prs')
+        for i, at in enumerate(times.tolist()):
+            recorder.Append({name: column[i] for name, column in zip(names, columns)}, At=at)
+        recorder.Close()
+        start = time.perf_counter()
+        recorded = sessionanalytics.SessionSeries.FromRecording(directory + '/session.prs')
+        loaded = time.perf_counter() - start
+        assert recorded.Rows == rows
+        assert len(sessionanalytics.Analyse(recorded)['intervals']['start']) == pieces
+        print("loaded from the recording in {0:.1f} ms".format(loaded * 1000))
+
+    # an interface that sends no distance: the report still comes out
+    undistanced = sessionanalytics.SessionSeries()
+    for i in range(50):
+        undistanced.Append({name: values[name][i] for name in names if name != 'total_distance_m'}, times[i])
+    analysis = sessionanalytics.Analyse(undistanced)
+    assert analysis['distance'] == 0.0
+    assert sessionanalytics.Report(analysis).startswith("session 0 m in")
+    print("all checks passed")
@@ -0,0 +1,88 @@
+"""
+Benchmark and check of the session recorder.
+
+- a one hour session at 10 Hz (36000 snapshots) is appended as fast as possible: CPU per snapshot and for the hour,
+  the file size and how often the data was msync'ed
+- the reader returns the columns as numpy arrays equal to what was recorded
+- a recorder process killed with SIGKILL mid-session: the reader finds every row it appended
+
+python3 sessionrecorderbenchmark.py
+"""
+
+import multiprocessing
+import os
+import pathlib
+import signal
+import sys
+import tempfile
+import time
+
+import numpy
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.recorder import sessionrecorder
+
+ROWS = 36000
+
+
+def snapshot(i):
+    return {'stroke_rate': 24, 'total_strokes': i // 25, 'total_distance_m': i // 4, 'instantaneous pace': 120.5,
+            'speed': 415, 'watts': 100 + i % 50, 'total_kcal': i // 100, 'total_kcal_hour': 0, 'total_kcal_min': 0,
+            'heart_rate': 130 + i % 20, 'elapsedtime': i // 10}
+
+
+def record(path, rows, progress=None):
+    recorder = sessionrecorder.SessionRecorder(path)
+    start = time.process_time()
+    for i in range(rows):
+        recorder.Append(snapshot(i), At=1600000000 + i / 10)
+        if progress is not None:
+            progress.value = i + 1
+    cpu = time.process_time() - start
+    recorder.Close()
+    return cpu
+
+
+def killed(path, progress):
+    record(path, 10 ** 9, progress)
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        path = directory + '/hour.prs'
+        cpu = record(path, ROWS)
+        print("{0} snapshots: {1:.1f} us CPU each, {2:.2f} s CPU for the hour, file {3:.2f} MB".format(
+            ROWS, cpu / ROWS * 1e6, cpu, os.path.getsize(path) / 1e6))
+
+        reader = sessionrecorder.SessionReader(path)
+        assert reader.Rows == ROWS and reader.Closed
+        start = time.perf_counter()
+        watts = reader.Column('watts')
+        times = reader.Column('time')
+        print("read watts and time columns in {0:.2f} ms".format((time.perf_counter() - start) * 1000))
+        expected = numpy.array([snapshot(i)['watts'] for i in range(ROWS)], dtype=numpy.float32)
+        assert numpy.array_equal(watts, expected)
+        assert numpy.allclose(times, 1600000000 + numpy.arange(ROWS) / 10)
+        assert numpy.isnan(reader.Column('work')).all(), "a value the S4 does not send"
+        del watts, times
+        reader.Close()
+
+        mp = multiprocessing.get_context('fork')
+        progress = mp.Value('q', 0, lock=False)
+        path = directory + '/killed.prs'
+        p = mp.Process(target=killed, args=(path, progress))
+        p.start()
+        while progress.value < 10000:
+            time.sleep(0.01)
+        os.kill(p.pid, signal.SIGKILL)
+        p.join()
+        reader = sessionrecorder.SessionReader(path)
+        assert not reader.Closed
+        assert reader.Rows >= progress.value - 1, (reader.Rows, progress.value)
+        total_strokes = reader.Column('total_strokes')
+        assert total_strokes[-1] == (reader.Rows - 1) // 25
+        print("killed after {0} appends, {1} rows recovered".format(progress.value, reader.Rows))
+        del total_strokes
+        reader.Close()
+    print("all checks passed")
@@ -0,0 +1,101 @@
+"""
+Check that the session recorder is closed when the program is stopped, as threads and as processes.
+
+A child program runs the recorder adapter under the adapter supervisor like waterrowerthreads --record does, publishes
+a session and waits for SIGTERM; then its main returns with the worker still blocked in wait_next, like the Graceful
+handler of waterrowerthreads. The recording must be closed (header closed flag, every row) and not left for the crash
+recovery of the reader, and the analysis of the session must be logged through the asynchronous logging.
+
+python3 sessionrecordercheck.py
+"""
+
+import logging
+import multiprocessing
+import pathlib
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.bus import sharedsnapshotbus
+from adapters.bus import snapshotbus
+from adapters.logpipeline import asynclogging
+from adapters.recorder import sessionrecorder
+from adapters.supervisor import adaptersupervisor
+from adapters.supervisor import adapterregistry
+
+ROWS = 600
+
+
+def snapshot(i):
+    # 10 Hz, 24 spm (stroke_rate in half strokes per minute), a stroke every 2.5 s
+    return {'stroke_rate': 48, 'total_strokes': i // 25, 'total_distance_m': i // 4, 'instantaneous pace': 120,
+            'speed': 415, 'watts': 150 + i % 20, 'total_kcal': i // 100, 'heart_rate': 130, 'elapsedtime': i // 10}
+
+
+def RecorderService(in_bus, directory):
+    adapterregistry.Load('rec').main(in_bus, directory)
+
+
+def child(mode, directory):
+    # the parts of waterrowerthreads.main the recorder depends on
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(name)s %(levelname)s %(message)s")
+    asynclogging.Install()
+    running = [True]
+    signal.signal(signal.SIGTERM, lambda signum, frame: running.__setitem__(0, False))
+    if mode == 'process':
+        Worker = multiprocessing.get_context('fork').Process
+        bus = sharedsnapshotbus.SharedSnapshotBus()
+    else:
+        Worker = threading.Thread
+        bus = snapshotbus.SnapshotBus()
+    supervisor = adaptersupervisor.AdapterSupervisor(Worker)
+    supervisor.Add('rec', RecorderService, (bus, directory))
+    supervisor.Start()
+    time.sleep(0.5)  # the recorder subscribed
+    for i in range(ROWS):
+        bus.publish(snapshot(i))
+        time.sleep(0.002)
+    print("published", flush=True)
+    try:
+        while running[0]:
+            supervisor.Supervise(timeout=1)
+    finally:
+        if mode == 'process':
+            bus.close()  # the daemon process is terminated on exit
+
+
+def check(mode):
+    with tempfile.TemporaryDirectory() as directory:
+        program = subprocess.Popen([sys.executable, __file__, mode, directory], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True)
+        assert program.stdout.readline().strip() == "published"
+        time.sleep(0.5)  # the last publish appended
+        program.send_signal(signal.SIGTERM)
+        out, log = program.communicate(timeout=30)
+        assert program.returncode == 0, log
+        recordings = list(pathlib.Path(directory).glob('session-*.prs'))
+        assert len(recordings) == 1, recordings
+        reader = sessionrecorder.SessionReader(str(recordings[0]))
+        closed, rows = reader.Closed, reader.Rows
+        last = float(reader.Column('total_distance_m')[-1]) if rows else None
+        reader.Close()
+    assert closed == 1, "recording not closed, left for the crash recovery\n" + log
+    assert rows and last == snapshot(ROWS - 1)['total_distance_m'], "the last snapshot not recorded"
+    assert "session recorded, {0} rows".format(rows) in log, log
+    assert "session {0} m in".format(snapshot(ROWS - 1)['total_distance_m']) in log, "no analysis logged\n" + log
+    print("{0}: closed, {1} rows".format(mode, rows))
+    return log
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        child(sys.argv[1], sys.argv[2])
+        sys.exit(0)
+    for mode in ('thread', 'process'):
+        check(mode)
+    print("all checks passed")
@@ -0,0 +1,153 @@
+"""
+Benchmark of the SmartRow passthrough, before and after smartrowtranscoder.Transcoder.
+
+"before" is the per message path of the old SmartRowData.Waterrower_cb: GetDistance with the character by character
+DecryptDistance, AddTime with a timedelta, AddStrokeCount and the checksum summed over the characters. "after" is
+Transcoder.Transcode. Both get the recorded SmartRow stream of decode.txt, as sent and with the distance obfuscated like
+the SmartRow V3 does, with resets of the app in between. The bytes sent to the app must be the same.
+
+python3 smartrowtranscoderbenchmark.py
+"""
+
+import datetime
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.fakesmartrow import smartrowtranscoder
+
+ROUNDS = 50
+RESET_EVERY = 97
+
+
+class Before(object):
+    def __init__(self):
+        self.DistanceOffset = 0
+        self.CurrentDistance = 0
+        self.StrokeOffset = 0
+        self.CurrentStrokes = 0
+        self.StartTime = None
+        self.PendingReset = False
+
+    def Reset(self):
+        self.PendingReset = True
+        self.DistanceOffset = self.CurrentDistance
+        self.StrokeOffset = self.CurrentStrokes
+        self.StartTime = None
+
+    def DecryptDistance(self, data):
+        s = ''
+        for c in data[1:6]:
+            s += chr(int(ord(c) & 15 | 0x30))
+        return s
+
+    def GetDistance(self, data):
+        d = int(self.DecryptDistance(data))
+        self.CurrentDistance = d
+        d = d - self.DistanceOffset
+        if (d < 0):
+            d = 0
+        strDist = f'{d:05}'
+        s = ''
+        for c in strDist[0:5]:
+            s += chr(int(ord(c) + 0x10))
+        return s
+
+    def AddTime(self, data, now):
+        elapsed = 0
+        if (self.StartTime is not None):
+            elapsed = int(now - self.StartTime)
+        elapsedStr = str(datetime.timedelta(seconds=elapsed)).replace(':', '')
+        return data[:6] + elapsedStr + '   ' + data[14:]
+
+    def AddStrokeCount(self, data):
+        self.CurrentStrokes = int(data[9:13].replace(' ', '0'))
+        c = self.CurrentStrokes - self.StrokeOffset
+        if (c < 0):
+            c = 0
+        strCount = f'{c: 4}'
+        return data[:9] + strCount + data[13:]
+
+    def Transcode(self, smartRowFakeData, now):
+        try:
+            if (not 'V3.00' in smartRowFakeData and not 'V@' in smartRowFakeData):
+                if (self.StartTime is None and smartRowFakeData[0] == 'f' and smartRowFakeData[11] != '!'):
+                    self.StartTime = now
+                distance = self.GetDistance(smartRowFakeData)
+                smartRowFakeData = smartRowFakeData[0] + distance + smartRowFakeData[6:14]
+                if (smartRowFakeData[0] == 'a'):
+                    smartRowFakeData = self.AddTime(smartRowFakeData, now)
+                if (smartRowFakeData[0] == 'd'):
+                    smartRowFakeData = self.AddStrokeCount(smartRowFakeData)
+                cksum = f'{(sum(ord(ch) for ch in smartRowFakeData)):0>4X}'
+                smartRowFakeData = smartRowFakeData + cksum[-2:] + '\r'
+                if self.PendingReset:
+                    smartRowFakeData = '\rV@\r' + smartRowFakeData
+                    self.PendingReset = False
+        except:
+            return None
+        return bytes([ord(b) for b in smartRowFakeData])  # as the dbus.Byte list
+
+
+def recording():
+    # one notification of the SmartRow per line: "61 30 30 ... 0D | a 00012 ..."
+    messages = []
+    with open(pathlib.Path(__file__).parent / 'decode.txt') as f:
+        for line in f:
+            hexbytes = []
+            for h in line.split():
+                if len(h) != 2 or not all(c in '0123456789ABCDEF' for c in h):
+                    break  # the text of the dump
+                hexbytes.append(h)
+            if hexbytes:
+                messages.append(bytes(int(h, 16) for h in hexbytes).decode('latin-1'))
+    return messages
+
+
+def obfuscate(message):
+    # the V3 sends the distance digits with another high nibble
+    if len(message) < 6 or not message[1:6].isdigit():
+        return message
+    return message[0] + ''.join(chr(ord(c) + 0x10) for c in message[1:6]) + message[6:]
+
+
+def run(transcoder, messages, reset):
+    sent = []
+    now = 1000.0
+    for i, message in enumerate(messages):
+        if i % RESET_EVERY == RESET_EVERY - 1:
+            reset(transcoder)
+        now += 0.25
+        sent.append(transcoder.Transcode(message, now))
+    return sent
+
+
+if __name__ == '__main__':
+    recorded = recording()
+    messages = recorded + [obfuscate(message) for message in recorded]
+    # the counters go on from the recording, like a longer session
+    messages += [m[0] + '%05d' % (int(m[1:6]) + 1234) + m[6:9] + '%4d' % (int(m[9:13]) + 321) + m[13:]
+                 if m[0] == 'd' and m[1:6].isdigit() and m[9:13].strip().isdigit() else m for m in recorded]
+
+    before = run(Before(), messages, Before.Reset)
+    after = run(smartrowtranscoder.Transcoder(), messages,
+                lambda transcoder: transcoder.Reset(Announce=True))
+    assert before == after, [(m, b, a) for m, b, a in zip(messages, before, after) if b != a][:5]
+    dropped = before.count(None)
+    print("{0} messages of decode.txt, as sent and V3 obfuscated: the same bytes sent, {1} malformed not sent".format(
+        len(messages), dropped))
+
+    timings = {}
+    for name, make, reset in (('before', Before, Before.Reset),
+                              ('after', smartrowtranscoder.Transcoder,
+                               lambda transcoder: transcoder.Reset(Announce=True))):
+        transcoder = make()
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            run(transcoder, messages, reset)
+        timings[name] = (time.perf_counter() - start) / (ROUNDS * len(messages))
+        print("{0:6}: {1:.2f} us per message".format(name, timings[name] * 1e6))
+    print("speedup {0:.1f}x".format(timings['before'] / timings['after']))
+    print("all checks passed")
@@ -0,0 +1,101 @@
+"""
+Benchmark of publishing rowing snapshots to N consumers, one deque(maxlen=1) per consumer against the SnapshotBus.
+
+"deques" is how waterrowerthreads wired the consumers: the producer appends to one deque per consumer.
+"bus" is one SnapshotBus.publish() with N subscriptions polling the bus, like the BLE and ANT+ timers do.
+"bus waiting" has N threads blocked in wait_next(), the only case where publish does work per reader.
+
+Afterwards a reader thread checks it never sees a seq twice or out of order.
+
+python3 snapshotbusbenchmark.py
+"""
+
+import pathlib
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.bus import snapshotbus
+
+PUBLISHES = 100000
+CONSUMERS = (1, 2, 10, 100)
+VALUES = {'stroke_rate': 24, 'total_strokes': 10, 'total_distance_m': 35, 'instantaneous pace': 140, 'speed': 350,
+          'watts': 150, 'total_kcal': 5, 'total_kcal_hour': 0, 'total_kcal_min': 0, 'heart_rate': 0, 'elapsedtime': 25}
+
+
+def deques(n):
+    queues = [deque(maxlen=1) for _ in range(n)]
+    start = time.perf_counter()
+    for _ in range(PUBLISHES):
+        for q in queues:
+            q.append(VALUES)
+    return time.perf_counter() - start
+
+
+def bus(n):
+    b = snapshotbus.SnapshotBus()
+    subscriptions = [b.subscribe() for _ in range(n)]
+    start = time.perf_counter()
+    for _ in range(PUBLISHES):
+        b.publish(VALUES)
+    duration = time.perf_counter() - start
+    assert all(s.latest() is VALUES for s in subscriptions)
+    return duration
+
+
+def bus_waiting(n):
+    b = snapshotbus.SnapshotBus()
+    stop = threading.Event()
+
+    def reader():
+        s = b.subscribe()
+        while not stop.is_set():
+            s.wait_next(0.1)
+
+    threads = [threading.Thread(target=reader) for _ in range(n)]
+    for t in threads:
+        t.start()
+    publishes = PUBLISHES // 10
+    start = time.perf_counter()
+    for _ in range(publishes):
+        b.publish(VALUES)
+    duration = time.perf_counter() - start
+    stop.set()
+    for t in threads:
+        t.join()
+    return duration * 10
+
+
+def ordering():
+    b = snapshotbus.SnapshotBus()
+    seen = []
+    done = threading.Event()
+
+    def reader():
+        s = b.subscribe()
+        while not done.is_set() or s.changed():
+            value = s.wait_next(0.1)
+            if value is not None:
+                seen.append((s.seq, value))
+
+    t = threading.Thread(target=reader)
+    t.start()
+    for i in range(1, 20001):
+        b.publish(i)
+    done.set()
+    t.join()
+    assert all(seq == value for seq, value in seen), "seq and value do not match"
+    assert all(a[0] < b[0] for a, b in zip(seen, seen[1:])), "seq out of order"
+    assert seen[-1][0] == 20000, "last value missed"
+    print("ordering: ok, reader saw {0} of 20000 publishes, always the latest".format(len(seen)))
+
+
+if __name__ == '__main__':
+    print("{0:>9s} {1:>12s} {2:>12s} {3:>12s}".format("consumers", "deques", "bus", "bus waiting"))
+    for n in CONSUMERS:
+        print("{0:9d} {1:9.0f} ns {2:9.0f} ns {3:9.0f} ns".format(
+            n, deques(n) / PUBLISHES * 1e9, bus(n) / PUBLISHES * 1e9, bus_waiting(n) / PUBLISHES * 1e9))
+    ordering()
@@ -0,0 +1,61 @@
+"""
+Startup time of waterrowerthreads per command line, lazy adapter imports against importing every adapter.
+
+Every run is a fresh interpreter that imports waterrowerthreads and loads the adapters the flags select, like main()
+does before the workers start. "all adapters" loads all of them, which is what the module used to import at load.
+The time is the median wall time of the whole process, interpreter start included.
+
+An adapter whose libraries are not installed (dbus, gatt, pyusb, pyserial, numpy) is reported, not timed.
+
+python3 startupbenchmark.py [runs]
+"""
+
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = str(pathlib.Path(__file__).parent.parent.absolute())
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+COMMAND_LINES = (
+    ("-i s4 -a", ['s4', 'ant']),
+    ("-i s4 -b", ['s4', 'ble']),
+    ("-i sr -b", ['sr', 'ble']),
+    ("-i sr", ['sr', 'srpt']),
+    ("-i s4 -b -a", ['s4', 'ble', 'ant']),
+    ("all adapters", ['s4', 'sr', 'srpt', 'ble', 'ant']),
+)
+
+STARTUP = """
+import sys
+sys.path.insert(0, {src!r})
+import waterrowerthreads
+from adapters.supervisor import adapterregistry
+for name in {adapters!r}:
+    try:
+        adapterregistry.Load(name)
+    except ImportError as e:
+        print("missing", name, e.name)
+"""
+
+
+def startup(adapters):
+    code = STARTUP.format(src=SRC, adapters=adapters)
+    times = []
+    missing = ""
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        times.append(time.perf_counter() - start)
+        missing = result.stdout.strip()
+    return statistics.median(times), missing
+
+
+if __name__ == '__main__':
+    baseline, _ = startup([])
+    print("{0:14s} {1:8.0f} ms".format("no adapters", baseline * 1000))
+    for flags, adapters in COMMAND_LINES:
+        seconds, missing = startup(adapters)
+        print("{0:14s} {1:8.0f} ms  {2}".format(flags, seconds * 1000, missing.replace("\n", ", ")))
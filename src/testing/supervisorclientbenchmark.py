@@ -0,0 +1,126 @@
+"""
+Benchmark of the supervisord client of the OLED screen buttons against a fake supervisord XML-RPC server.
+
+- a button press (start, stop) queues the call: time the callback waits, against launching a Python interpreter like
+  supervisorctl did for every press
+- 50 starts and stops and the refreshes in between go over one HTTP connection; the cached state follows supervisord
+- supervisord restarted: the client reports the programs unknown, connects again and gets the state back
+
+python3 supervisorclientbenchmark.py
+"""
+
+import pathlib
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute() / 'adapters' / 'screen'))
+
+from supervisorClient import supervisorClient
+
+PROGRAM = "pirowflo_S4_Monitor_Bluetooth_AntPlus"
+CALLS = 50
+
+
+class Handler(SimpleXMLRPCRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like supervisord
+    rpc_paths = ('/RPC2',)
+
+    def setup(self):
+        self.server.connections += 1
+        self.server.sockets.append(self.request)
+        SimpleXMLRPCRequestHandler.setup(self)
+
+
+class Server(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeSupervisord(object):
+    def __init__(self, port=0):
+        self.states = {PROGRAM: 'STOPPED', 'update_PiRowFlo': 'STOPPED'}
+        self.server = Server(('127.0.0.1', port), Handler, logRequests=False, allow_none=True)
+        self.server.connections = 0
+        self.server.sockets = []
+        self.server.register_function(self.startProcess, 'supervisor.startProcess')
+        self.server.register_function(self.stopProcess, 'supervisor.stopProcess')
+        self.server.register_function(self.getAllProcessInfo, 'supervisor.getAllProcessInfo')
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def startProcess(self, name, wait):
+        time.sleep(0.01)  # startsecs
+        self.states[name] = 'RUNNING'
+        return True
+
+    def stopProcess(self, name, wait):
+        self.states[name] = 'STOPPED'
+        return True
+
+    def getAllProcessInfo(self):
+        return [{'name': name, 'statename': state} for name, state in self.states.items()]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in self.server.sockets:  # the kept-alive connections
+            connection.shutdown(socket.SHUT_RDWR)
+
+
+if __name__ == '__main__':
+    supervisord = FakeSupervisord()
+    changed = threading.Condition()
+
+    def onchange(states):
+        with changed:
+            changed.notify_all()
+
+    def wait_for(state):
+        with changed:
+            assert changed.wait_for(lambda: client.state(PROGRAM) == state, timeout=5), client.states
+
+    client = supervisorClient("http://127.0.0.1:%d/RPC2" % supervisord.port, onchange, refresh=0.05)
+    wait_for('STOPPED')
+
+    presses = []
+    rounds = []
+    for i in range(CALLS):
+        start = time.perf_counter()
+        if i % 2 == 0:
+            client.start(PROGRAM)
+        else:
+            client.stop(PROGRAM)
+        presses.append(time.perf_counter() - start)
+        wait_for('RUNNING' if i % 2 == 0 else 'STOPPED')
+        rounds.append(time.perf_counter() - start)
+        time.sleep(0.06)  # a refresh in between
+    assert supervisord.server.connections == 1, supervisord.server.connections
+
+    spawns = []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import xmlrpc.client'], check=True)
+        spawns.append(time.perf_counter() - start)
+    print("button press: median {0:.3f} ms, max {1:.3f} ms; state RUNNING/STOPPED cached after median {2:.1f} ms; "
+          "{3} calls and refreshes over {4} connection".format(
+              statistics.median(presses) * 1000, max(presses) * 1000, statistics.median(rounds) * 1000,
+              client.calls, supervisord.server.connections))
+    print("an interpreter launch like supervisorctl blocked the buttons for {0:.0f} ms here (seconds on a Pi "
+          "Zero)".format(statistics.median(spawns) * 1000))
+
+    port = supervisord.port
+    supervisord.close()
+    wait_for('UNKNOWN')
+    supervisord = FakeSupervisord(port)
+    supervisord.states[PROGRAM] = 'RUNNING'
+    wait_for('RUNNING')
+    print("supervisord restarted: unknown after {0} failed refreshes, then RUNNING again".format(client.errors))
+    client.close()
+    supervisord.close()
+    print("all checks passed")
@@ -0,0 +1,98 @@
+"""
+Loss and latency benchmark of the UDP multicast telemetry, over the loopback of this machine.
+
+- the sender publishes at 10, 100 and 1000 snapshots per second for 3 s each; a receiver in another process reports
+  the packets lost and the latency from the snapshot timestamp to the receive; the CPU of the sender per packet
+- a burst of 20000 packets to a receiver that reads slowly, then one more: the kernel drops packets, the sender
+  never blocks and the receiver counts every lost packet (received + lost = sent)
+- heartbeats repeat the last packet, the receiver skips them
+
+python3 udptelemetrybenchmark.py
+"""
+
+import multiprocessing
+import pathlib
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+from adapters.udp import udptelemetry
+
+PORT = 7091
+RATES = (10, 100, 1000)
+SECONDS = 3
+
+
+def snapshot(i):
+    return {'stroke_rate': 24, 'total_strokes': i // 25, 'total_distance_m': i // 4, 'instantaneous pace': 120.5,
+            'speed': 415, 'watts': 100 + i % 50, 'total_kcal': i // 100, 'total_kcal_hour': 0, 'total_kcal_min': 0,
+            'heart_rate': 130 + i % 20, 'elapsedtime': i // 10}
+
+
+def receive(ready, queue, slow):
+    receiver = udptelemetry.UdpReceiver(Port=PORT)
+    ready.set()
+    latencies = []
+    last = None
+    while True:
+        packet = receiver.Receive(timeout=1.0)
+        if packet is None:
+            break
+        latencies.append(packet.latency)
+        last = packet
+        if slow:
+            time.sleep(0.0005)
+    queue.put((latencies, receiver.Received[0], receiver.Lost[0], receiver.Repeated[0], receiver.Late[0],
+               last.values if last else None))
+
+
+def run(rate, count, slow=False, repeats=0):
+    mp = multiprocessing.get_context('fork')
+    ready = mp.Event()
+    queue = mp.Queue()
+    p = mp.Process(target=receive, args=(ready, queue, slow))
+    p.start()
+    ready.wait()
+    sender = udptelemetry.UdpSender(Port=PORT)
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(count):
+        sender.Send(snapshot(i))
+        for _ in range(repeats):
+            sender.Repeat()
+        if rate:
+            time.sleep(max(start + (i + 1) / rate - time.perf_counter(), 0))
+    cpu = time.process_time() - cpu
+    if slow:
+        time.sleep(0.5)  # the receiver catches up, a loss at the end only shows by the seq of a later packet
+        sender.Send(snapshot(count))
+    result = queue.get()
+    p.join()
+    sender.Close()
+    return (cpu, sender.Sent) + result
+
+
+if __name__ == '__main__':
+    for rate in RATES:
+        count = rate * SECONDS
+        cpu, sent, latencies, received, lost, repeated, late, values = run(rate, count)
+        latencies.sort()
+        print("{0:5d}/s: {1} sent, {2} received, {3} lost, latency p50 {4:.0f} us p99 {5:.0f} us max {6:.0f} us, "
+              "sender CPU {7:.1f} us per packet".format(
+                  rate, sent, received, lost, statistics.median(latencies) * 1e6,
+                  latencies[int(len(latencies) * 0.99)] * 1e6, latencies[-1] * 1e6, cpu / sent * 1e6))
+        assert received + lost == count and late == 0
+        assert values['watts'] == snapshot(count - 1)['watts']
+        assert values['total_distance_m'] == snapshot(count - 1)['total_distance_m']
+
+    cpu, sent, latencies, received, lost, repeated, late, values = run(0, 20000, slow=True)
+    print("burst of {0} to a slow receiver: sent in {1:.2f} s CPU, {2} received, {3} lost".format(
+        sent, cpu, received, lost))
+    assert received + lost == 20001
+
+    cpu, sent, latencies, received, lost, repeated, late, values = run(100, 100, repeats=2)
+    assert received == 100 and repeated == 200 and lost == 0
+    print("heartbeats: {0} repeats skipped".format(repeated))
+    print("all checks passed")
@@ -19,20 +19,85 @@ Then select which broadcast methode will be used. Bluetooth low energy or Ant+ o
 e.g. use the S4 connected via USB and broadcast data over bluetooth and Ant+
 
 python3 waterrowerthreads.py -i s4 -b -a
+
+Add -r to also receive the heart rate of an ANT+ heart rate strap on a second channel of the Ant+ dongle (needs -a)
+
+python3 waterrowerthreads.py -i sr -b -a -r
+
+Add -m to run the interface, the BLE server and the Ant+ sender as separate processes instead of threads. They share
+the rowing values through shared memory and do not compete for the GIL, the notification timing is more regular.
+
+python3 waterrowerthreads.py -i s4 -b -a -m
+
+Both modes log the interval jitter of the BLE notifications and the Ant+ broadcast every minute. The latency of the
+values from the S4 or SmartRow to the BLE notification and the Ant+ broadcast is traced per stage, send SIGUSR1 to
+log the histograms (in multi-process mode every process logs its own).
+
+kill -USR1 <pid>
+
+Add --metrics with a port or a unix socket path to serve counters and gauges (S4 events, BLE notifications, Ant+
+frames, reconnects, snapshot age, adapter liveness) in the Prometheus text format, for a scraper or a dashboard.
+
+python3 waterrowerthreads.py -i s4 -b -a --metrics 9101
+curl http://127.0.0.1:9101/metrics
+
+Add -u to send every snapshot as a UDP multicast packet to the LAN (default group 239.255.70.1:7001), for scoreboards
+and loggers; adapters/udp/udptelemetry.py has the packet layout and a receiver.
+
+python3 waterrowerthreads.py -i s4 -b -a -u
+python3 waterrowerthreads.py -i s4 -u 239.255.70.2:7002
+
+Add --record with a directory to record every snapshot of the session to a binary column file in it, see
+adapters/recorder/sessionrecorder.py for the format and the reader.
+
+python3 waterrowerthreads.py -i s4 -b -a --record /home/pi/sessions
+
+Add --fit with a directory to write every rowing session to a FIT activity file in it, for Garmin Connect or Strava.
+A session ends when the monitor is reset or after two minutes without a stroke.
+
+python3 waterrowerthreads.py -i s4 -b -a --fit /home/pi/fit
+
+Add --live with a port to push the rowing values to dashboards on the LAN over WebSocket (binary or JSON deltas) or
+server-sent events, each client at its own rate, see adapters/live/liveserver.py.
+
+python3 waterrowerthreads.py -i s4 -b --live 8080
+
+Add --local to send the rowing values to the OLED screen service on the Pi (adapters/screen), for its live page; over
+a unix socket, by default the abstract address @pirowflo/telemetry.
+
+python3 waterrowerthreads.py -i s4 -b -a --local
+
+Add --hub to serve every S4 monitor connected to the Pi, e.g. a row of machines in a studio. Each one gets its own
+interface pipeline and is broadcast on its own Ant+ channel with its own device number (57591 for the first machine,
+57592 for the second, ...), sent with its number in the UDP packets and served with ?rower=N by --live. BLE, --record
+and --fit stay with the first machine. Give the number of machines to wait for them at start.
+
+python3 waterrowerthreads.py -i s4 -a -u --live 8080 --hub 4
+
+Only the adapters selected by the flags are imported. Add --profile-startup to import them, print the import time
+per module and exit without starting anything.
+
+python3 waterrowerthreads.py -i sr -b --profile-startup
 """
 
 import logging
 import logging.config
 import threading
+import multiprocessing
 import argparse
+import functools
+import time
 from queue import Queue
-from collections import deque
 
-from adapters.ble import waterrowerble
-from adapters.s4 import wrtobleant
-from adapters.ant import waterrowerant
-from adapters.smartrow import smartrowtobleant
-from adapters.fakesmartrow import fakesmartrowble
+from adapters.bus import snapshotbus
+from adapters.bus import sharedsnapshotbus
+from adapters.bus import latencytrace
+from adapters.bus import messagequeue
+from adapters.supervisor import adaptersupervisor
+from adapters.supervisor import adapterregistry
+from adapters.supervisor import importprofiler
+from adapters.metrics import metrics
+from adapters.logpipeline import asynclogging
 
 import pathlib
 import signal
@@ -57,105 +122,246 @@ class Graceful:
 
 def main(args=None):
     logging.config.fileConfig(loggerconfigpath, disable_existing_loggers=False)
+    asynclogging.Install() # the adapters do not wait for the console and the SD card
     grace = Graceful()
+    latencytrace.InstallDumpSignal()
+
+    profiler = None
+    if args.profile_startup == True:
+        profiler = importprofiler.ImportProfiler()
+        profiler.Install()
 
-    def BleService(out_q, ble_in_q):
+    def BleService(out_q, in_bus):
         logger.info("Start BLE Advertise and BLE GATT Server")
-        bleService = waterrowerble.main(out_q, ble_in_q)
-        bleService()
+        adapterregistry.Load('ble').main(out_q, in_bus)
 
 
-    def Waterrower(in_q, ble_out_q, ant_out_q):
+    def Waterrower(in_q, out_bus, hrm_bus, port=None):
         logger.info("Waterrower Interface started")
-        Waterrowerserial = wrtobleant.main(in_q, ble_out_q, ant_out_q)
-        Waterrowerserial()
+        adapterregistry.Load('s4').main(in_q, out_bus, hrm_bus, port)
 
-    def Smartrow(in_q, ble_out_q, ant_out_q, pass_thru_q, fake_sr_event):
+    def Smartrow(in_q, out_bus, pass_thru_q, fake_sr_event, hrm_bus):
         logger.info("Smartrow Interface started")
-        Smartrowconnection = smartrowtobleant.main(in_q, ble_out_q, ant_out_q, pass_thru_q, fake_sr_event)
-        Smartrowconnection()
+        adapterregistry.Load('sr').main(in_q, out_bus, pass_thru_q, fake_sr_event, hrm_bus)
 
     def SmartRowPassthrough(in_q, pass_thru_q, fake_sr_event):
         try:
             logger.info("Start SmartRow Passthrough BLE Advertise and BLE GATT Server")
-            FakeSmartRowBLE = fakesmartrowble.main(in_q, pass_thru_q, fake_sr_event)
+            FakeSmartRowBLE = adapterregistry.Load('srpt').main(in_q, pass_thru_q, fake_sr_event)
             FakeSmartRowBLE()
         except:
             logger.error("SmartRow passthrough exited!")
 
-    def ANTService(ant_in_q):
+    def SmartrowWithPassthrough(in_q, out_bus, pass_thru_q, fake_sr_event, hrm_bus):
+        # multi-process mode: the passthrough shares the message queue with
+        # the SmartRow interface, it runs as a thread in the same process
+        t = threading.Thread(target=SmartRowPassthrough, args=(in_q, pass_thru_q, fake_sr_event), name='srpt')
+        t.daemon = True
+        t.start()
+        Smartrow(in_q, out_bus, pass_thru_q, fake_sr_event, hrm_bus)
+
+    def ANTService(in_bus, hrm_bus):
         logger.info("Start Ant and start broadcast data")
-        antService = waterrowerant.main(ant_in_q)
-        antService()
+        adapterregistry.Load('ant').main(in_bus, hrm_bus)
+
+    def UdpService(in_bus, address, rower=0):
+        logger.info("Start the UDP multicast telemetry")
+        adapterregistry.Load('udp').main(in_bus, address, rower)
+
+    def RecorderService(in_bus, directory):
+        logger.info("Start recording the session")
+        adapterregistry.Load('rec').main(in_bus, directory)
 
+    def FitService(in_bus, directory):
+        logger.info("Start the FIT export of the sessions")
+        adapterregistry.Load('fit').main(in_bus, directory)
 
-    # TODO: Switch from queue to deque
-    q = Queue()
-    ble_q = deque(maxlen=1)
-    ant_q = deque(maxlen=1)
-    passthru_q = None
+    def LiveService(in_bus, address):
+        logger.info("Start the live telemetry server")
+        adapterregistry.Load('live').main(in_bus, address)
+
+    def LocalService(in_bus, address):
+        logger.info("Start the local telemetry to the screen")
+        adapterregistry.Load('local').main(in_bus, address)
+
+
+    # The interface publishes the rowing values on the snapshot bus, every
+    # broadcaster subscribes to it and reads the latest values. The resets
+    # requested by the broadcasters go back through the queue q.
+    # In multi-process mode the workers are processes, the bus lives in
+    # shared memory and q is a multiprocessing queue
+    if args.multiprocess == True:
+        logger.info("multi-process mode: interface, BLE and Ant+ run as separate processes")
+        mp = multiprocessing.get_context('fork')  # the workers are local functions
+        Worker = mp.Process
+        q = mp.Queue()
+        snapshots = sharedsnapshotbus.SharedSnapshotBus()
+    else:
+        Worker = threading.Thread
+        q = Queue()
+        snapshots = snapshotbus.SnapshotBus()
+    buses = [snapshots]
+
+    # Hub mode: one interface pipeline per S4 monitor, each with its own bus
+    # and reset queue. The first one is the rower of the single rower outputs
+    ports = [None]
+    if args.hub is not None:
+        if args.interface == "s4":
+            from adapters.s4 import waterrowerinterface
+            ports = waterrowerinterface.find_ports(args.hub)
+            logger.info("hub mode: %d rowers on %s", len(ports), ", ".join(ports))
+        else:
+            logger.warning("hub mode needs the S4 interface (-i s4), ignored")
+    rowers = [snapshots]
+    queues = [q]
+    for port in ports[1:]:
+        if args.multiprocess == True:
+            rowers.append(sharedsnapshotbus.SharedSnapshotBus())
+            queues.append(mp.Queue())
+        else:
+            rowers.append(snapshotbus.SnapshotBus())
+            queues.append(Queue())
+    buses.extend(rowers[1:])
+    passthru_q = None  # the raw SmartRow messages for the passthrough, a stream and not a snapshot
+    hrm_bus = None
     fake_sr_event = None
-    threads = []
     passthru = False
 
     # Turn on SmartRow passthrough if the interface is
     #  SmartRow and BLE-FE is not selected
     if args.interface == 'sr' and args.blue == False:
         fake_sr_event = threading.Event()
-        passthru_q = deque(maxlen=1)
+        passthru_q = messagequeue.MessageQueue()
         passthru = True
 
+    # The heart rate strap is received by the Ant+ dongle
+    if args.hrm == True:
+        if args.antfe == True:
+            logger.info("ANT+ heart rate strap will be used for the heart rate")
+            if args.multiprocess == True:
+                hrm_bus = sharedsnapshotbus.SharedSnapshotBus(Fields=None)
+            else:
+                hrm_bus = snapshotbus.SnapshotBus()
+            buses.append(hrm_bus)
+        else:
+            logger.warning("ANT+ heart rate strap needs the Ant+ service (-a), ignored")
+
+    # The metrics endpoint is opt-in, the worker processes forward theirs
+    metrics_server = None
+    WorkerInit = None
+    if args.metrics is not None:
+        from adapters.metrics import metricsserver
+        if args.multiprocess == True:
+            metrics_q = mp.Queue()  # the worker processes forward their metrics on it
+            WorkerInit = functools.partial(metrics.Forward, Queue=metrics_q)
+        else:
+            metrics_q = None
+        metrics_server = metricsserver.MetricsServer(args.metrics, metrics_q)
+
+    # Every adapter is restarted when it ends, with a backoff, the others
+    # keep running. The passthrough is not restarted, the program runs on
+    # without it like before
+    supervisor = adaptersupervisor.AdapterSupervisor(Worker, WorkerInit)
+
+    if metrics_server is not None:
+        ages = snapshots.subscribe()
+        def SnapshotAge():
+            values = ages.latest()
+            if values is None or 'trace_publish' not in values:
+                return None
+            return round(time.monotonic() - values['trace_publish'], 3)
+        metrics.GaugeFunction('pirowflo_snapshot_age_seconds', "Age of the latest published rowing values", SnapshotAge)
+        metrics.GaugeFunction('pirowflo_adapter_up', "1 when the adapter runs",
+                              lambda: {(name,): int(s['running']) for name, s in supervisor.Status().items()}, ('adapter',))
+        metrics.GaugeFunction('pirowflo_adapter_restarts', "Restarts of the adapter by the supervisor",
+                              lambda: {(name,): s['restarts'] for name, s in supervisor.Status().items()}, ('adapter',))
+        metrics.GaugeFunction('pirowflo_adapter_uptime_seconds', "Seconds the adapter has been running",
+                              lambda: {(name,): round(s['uptime'], 1) for name, s in supervisor.Status().items()}, ('adapter',))
+        metrics.GaugeFunction('pirowflo_threads', "Threads of the main process", threading.active_count)
+
     if args.interface == "s4":
         logger.info("inferface S4 monitor will be used for data input")
-        t = threading.Thread(target=Waterrower, args=(q, ble_q, ant_q))
-        t.daemon = True
-        t.start()
-        threads.append(t)
+        supervisor.Add('s4', Waterrower, (q, snapshots, hrm_bus, ports[0]))
+        for i in range(1, len(ports)):
+            supervisor.Add('s4-%d' % i, Waterrower, (queues[i], rowers[i], None, ports[i]))
     else:
         logger.info("S4 not selected")
 
-    if args.interface == "sr":    
+    if args.interface == "sr":
         logger.info("interface smartrow will be used for data input")
-        t = threading.Thread(target=Smartrow, args=(q, ble_q, ant_q, passthru_q, fake_sr_event))
-        t.daemon = True
-        t.start()
-        threads.append(t)
+        if passthru == True and args.multiprocess == True:
+            supervisor.Add('sr', SmartrowWithPassthrough, (q, snapshots, passthru_q, fake_sr_event, hrm_bus))
+        else:
+            supervisor.Add('sr', Smartrow, (q, snapshots, passthru_q, fake_sr_event, hrm_bus))
     else:
         logger.info("SmartRow interface not selected")
 
-    if passthru == True:
+    if passthru == True and args.multiprocess == True:
+        logger.info("SmartRow passthrough is enabled, in the SmartRow process")
+    elif passthru == True:
         logger.info("SmartRow passthrough is enabled")
-        t = threading.Thread(target=SmartRowPassthrough, args=(q, passthru_q, fake_sr_event), name='srpt')
-        t.daemon = True
-        t.start()
-        threads.append(t)
+        supervisor.Add('srpt', SmartRowPassthrough, (q, passthru_q, fake_sr_event), adaptersupervisor.IGNORE)
     else:
         logger.info("SmartRow passthrough is disabled")
 
     if args.blue == True:
-        t = threading.Thread(target=BleService, args=(q, ble_q))
-        t.daemon = True
-        t.start()
-        threads.append(t)
+        supervisor.Add('ble', BleService, (q, snapshots))
     else:
         logger.info("Bluetooth service not used")
 
     if args.antfe == True:
-        t = threading.Thread(target=ANTService, args=(
-        [ant_q]))  # [] are needed to tell threading that the list "deque" is one args and not a list of arguement !
-        t.daemon = True
-        t.start()
-        threads.append(t)
+        supervisor.Add('ant', ANTService, (rowers if len(rowers) > 1 else snapshots, hrm_bus))
     else:
         logger.info("Ant service not used")
 
-    while grace.run:
-        for thread in threads:
-            if grace.run == True:
-                thread.join(timeout=10)
-                if not (thread.is_alive() or thread.getName() == 'srpt'):
-                    logger.info("Thread died - exiting")
+    if args.udp is not None:
+        supervisor.Add('udp', UdpService, (snapshots, args.udp))
+        for i in range(1, len(rowers)):
+            supervisor.Add('udp-%d' % i, UdpService, (rowers[i], args.udp, i))
+
+    if args.record is not None:
+        supervisor.Add('rec', RecorderService, (snapshots, args.record))
+
+    if args.fit is not None:
+        supervisor.Add('fit', FitService, (snapshots, args.fit))
+
+    if args.live is not None:
+        supervisor.Add('live', LiveService, (rowers, args.live))
+
+    if args.local is not None:
+        supervisor.Add('local', LocalService, (snapshots, args.local))
+
+    # The selected adapters are imported before the workers start: an import
+    # error stops the program here instead of failing every restart, and the
+    # processes of the multi-process mode inherit the modules
+    adapters = list(dict.fromkeys(name.split('-')[0] for name in supervisor.Adapters))  # s4-1: the s4 adapter of rower 1
+    if passthru == True and 'srpt' not in adapters:
+        adapters.append('srpt')
+    try:
+        for name in adapters:
+            adapterregistry.Load(name)
+        if profiler is not None:
+            profiler.Remove()
+            logger.info("startup profile of the adapters %s\n%s", ", ".join(adapters), profiler.Report())
+            return
+
+        if metrics_server is not None:
+            metrics_server.Start()
+        supervisor.Start()
+        try:
+            while grace.run:
+                if not supervisor.Supervise(timeout=1):
                     return
+                latencytrace.LogRequested()  # after SIGUSR1
+        finally:
+            supervisor.LogStatus()
+            logger.info(latencytrace.Report())
+    finally:
+        if metrics_server is not None:
+            metrics_server.Stop()
+        if args.multiprocess == True:
+            for bus in buses:
+                bus.close()  # the daemon processes are terminated on exit
 
 if __name__ == '__main__':
     try:
@@ -163,6 +369,16 @@ if __name__ == '__main__':
         parser.add_argument("-i", "--interface", choices=["s4","sr"], default="s4", help="choose  Waterrower interface S4 monitor: s4 or Smartrow: sr")
         parser.add_argument("-b", "--blue", action='store_true', default=False,help="Broadcast Waterrower data over bluetooth low energy")
         parser.add_argument("-a", "--antfe", action='store_true', default=False,help="Broadcast Waterrower data over Ant+")
+        parser.add_argument("-u", "--udp", metavar="GROUP:PORT", nargs='?', const='', default=None, help="Send the rowing data as UDP multicast packets, to 239.255.70.1:7001 or GROUP:PORT")
+        parser.add_argument("-r", "--hrm", action='store_true', default=False,help="Receive the heart rate of an Ant+ heart rate strap (needs -a)")
+        parser.add_argument("-m", "--multiprocess", action='store_true', default=False,help="Run interface, BLE and Ant+ as separate processes sharing memory")
+        parser.add_argument("--record", metavar="DIR", default=None, help="Record the session to a binary column file in DIR")
+        parser.add_argument("--fit", metavar="DIR", default=None, help="Write every rowing session to a FIT activity file in DIR")
+        parser.add_argument("--live", metavar="PORT", default=None, help="Serve the rowing values over WebSocket and server-sent events on PORT or host:port")
+        parser.add_argument("--local", metavar="ADDRESS", nargs='?', const='', default=None, help="Send the rowing data to the OLED screen over the unix socket @pirowflo/telemetry or ADDRESS")
+        parser.add_argument("--hub", metavar="N", type=int, nargs='?', const=0, default=None, help="Serve every S4 monitor connected, wait for N of them")
+        parser.add_argument("--metrics", metavar="PORT|PATH", default=None, help="Serve metrics on 127.0.0.1:PORT or on the unix socket PATH")
+        parser.add_argument("--profile-startup", action='store_true', default=False,help="Print the import time per module of the selected adapters and exit")
         args = parser.parse_args()
         logger.info(args)
         main(args)